@@ -1,17 +1,49 @@
 # __init__.py for avm_app package
+#
+# Public names are re-exported lazily: a submodule (and pandas, numpy or the
+# plotting stack behind it) is imported the first time one of its names is
+# used, so "import avm_app" itself stays cheap.
 
-from .avm_utils import (
-    read_benchmark_file,
-    read_cascade_file,
-    get_avm_model_files,
-    get_keyword_from_model,
-    find_file_with_keyword
-)
-from .data_processing import (
-    find_avm_score_parallel,
-    column_phrases
-)
-from .file_operations import (
-    read_files_once,
-    write_results_to_excel
-)
+import importlib
+
+_EXPORTS = {
+    'read_benchmark_file': 'avm_utils',
+    'read_cascade_file': 'avm_utils',
+    'get_avm_model_files': 'avm_utils',
+    'get_keyword_from_model': 'avm_utils',
+    'find_file_with_keyword': 'avm_utils',
+    'find_avm_score_parallel': 'data_processing',
+    'match_batch': 'data_processing',
+    'column_phrases': 'data_processing',
+    'read_files_once': 'file_operations',
+    'write_results_to_excel': 'file_operations',
+    'SharedVendorStore': 'vendor_store',
+    'process_benchmark': 'simulation',
+    'ProcessingCancelled': 'simulation',
+    'GroupedStats': 'aggregates',
+    'QuantileSketch': 'aggregates',
+    'ResultAggregates': 'aggregates',
+    'run_sharded': 'sharding',
+    'run_pipeline': 'pipeline',
+    'run_coverage_spec': 'coverage',
+    'run_calibration': 'calibration',
+    'serve': 'service',
+    'expand_jobs': 'scheduler',
+    'run_jobs': 'scheduler',
+    'run_job_spec': 'scheduler',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
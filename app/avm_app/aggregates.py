@@ -0,0 +1,312 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from avm_app.bootstrap import add_interval_columns, sketch_median_intervals
+from avm_app.file_operations import (
+    LOCATION_STATS_PERCENT_COLUMNS, MODEL_STATS_PERCENT_COLUMNS, PPE10_PERCENT_COLUMNS,
+    conf_fsd_summary, finish_location_stats, finish_model_stats, finish_ppe10_table, ppe10_overall
+)
+
+DIFF_COLUMN = '% Diff between AVM and Benchmark'
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (the DDSketch
+    scheme): values are counted in logarithmic buckets, so any quantile is
+    returned within relative_accuracy of a value at that rank. Sketches with
+    the same relative_accuracy merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.005, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add(self, store, magnitudes):
+        indexes, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype('int64'), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            store[index] = store.get(index, 0) + count
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        small = np.abs(values) < self.min_value
+        self.zero_count += int(small.sum())
+        self._add(self.positive, values[~small & (values > 0)])
+        self._add(self.negative, -values[~small & (values < 0)])
+        self.count += len(values)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge quantile sketches with different relative accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def _bucket_value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile (0 <= q <= 1), or NaN when empty.
+        """
+        if not self.count:
+            return float('nan')
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._bucket_value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self.positive)) if self.positive else 0.0
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def buckets(self):
+        """
+        Returns (values, counts) arrays of the non-empty buckets, ascending.
+        """
+        negative = sorted(self.negative, reverse=True)
+        positive = sorted(self.positive)
+        values = [-self._bucket_value(index) for index in negative] + [0.0] * bool(self.zero_count) + [self._bucket_value(index) for index in positive]
+        counts = [self.negative[index] for index in negative] + [self.zero_count] * bool(self.zero_count) + [self.positive[index] for index in positive]
+        return np.array(values, dtype='float64'), np.array(counts, dtype='int64')
+
+
+def _combine_tables(left, right):
+    """
+    Merges two GroupedStats tables group by group: counts and sums add,
+    minima and maxima combine, and mean / M2 follow Chan et al.'s parallel
+    form of Welford's update, so variance stays accurate for any split.
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    combined = pd.concat([left, right])
+    levels = list(range(combined.index.nlevels))
+    grouped = combined.groupby(level=levels, observed=True)
+    table = grouped.agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+    weighted = (combined['mean'] * combined['count']).groupby(level=levels, observed=True).sum()
+    table['mean'] = (weighted / table['count'].where(table['count'] > 0)).fillna(0.0)
+    spread = combined['count'] * (combined['mean'] - table['mean'].reindex(combined.index).to_numpy()) ** 2
+    table['m2'] = grouped['m2'].sum() + spread.groupby(level=levels, observed=True).sum()
+    return table
+
+
+class GroupedStats:
+    """
+    Streaming statistics of one value column per group.
+
+    keys is a column name, a list of column names (e.g. ['State', 'County'])
+    or None for a single 'Overall' group. For every group it keeps the exact
+    count, sum, min and max, Welford's mean and M2 (sum of squared deviations)
+    and, when relative_accuracy is given, a QuantileSketch for the median.
+
+        stats = GroupedStats('Model Position', relative_accuracy=0.005)
+        for chunk in chunks:
+            stats.update(chunk, chunk['% Diff between AVM and Benchmark'])
+        stats.merge(stats_from_another_worker)
+        stats.result()      # count, sum, min, max, mean, std[, median]
+    """
+
+    def __init__(self, keys=None, relative_accuracy=None):
+        self.keys = keys
+        self.relative_accuracy = relative_accuracy
+        self.table = None
+        self.sketches = {}
+
+    def _group_by(self, frame):
+        if self.keys is None:
+            return pd.Series('Overall', index=frame.index)
+        if isinstance(self.keys, list):
+            return [frame[key] for key in self.keys]
+        return frame[self.keys]
+
+    def update(self, frame, values):
+        """
+        Adds the values (a Series aligned with frame, NaN ignored) of one
+        chunk of rows, grouped by the key columns of frame.
+        """
+        values = pd.to_numeric(values, errors='coerce').astype('float64')
+        grouped = values.groupby(self._group_by(frame), observed=True)
+        count = grouped.count()
+        chunk = pd.DataFrame({
+            'count': count,
+            'sum': grouped.sum(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+            'mean': grouped.mean().fillna(0.0),
+            'm2': (grouped.var(ddof=0) * count).fillna(0.0),
+        })
+        self.table = _combine_tables(self.table, chunk)
+        if self.relative_accuracy is not None:
+            for key, group_values in grouped:
+                sketch = self.sketches.setdefault(key, QuantileSketch(self.relative_accuracy))
+                sketch.update(group_values.to_numpy())
+        return self
+
+    def merge(self, other):
+        self.table = _combine_tables(self.table, other.table)
+        for key, sketch in other.sketches.items():
+            self.sketches.setdefault(key, QuantileSketch(self.relative_accuracy)).merge(sketch)
+        return self
+
+    def result(self):
+        """
+        Returns a DataFrame indexed by group with count, sum, min, max, mean
+        and std (sample, NaN below two values), plus median when sketched.
+        """
+        if self.table is None:
+            return pd.DataFrame(columns=['count', 'sum', 'min', 'max', 'mean', 'std'])
+        table = self.table
+        count = table['count']
+        result = pd.DataFrame({
+            'count': count,
+            'sum': table['sum'],
+            'min': table['min'],
+            'max': table['max'],
+            'mean': table['mean'].where(count > 0),
+            'std': np.sqrt(table['m2'] / (count - 1).where(count > 1)),
+        })
+        if self.relative_accuracy is not None:
+            result['median'] = [self.sketches[key].median() if key in self.sketches else np.nan for key in table.index]
+        return result
+
+
+class ResultAggregates:
+    """
+    Partial statistics of a results DataFrame that can be merged across shards
+    or fed chunk by chunk as batches come out of the matcher.
+
+    One GroupedStats per statistics sheet grouping: % diff per Model Position
+    and overall (with median sketches) and per (State, County) over matched
+    rows (also with median sketches); row counts per (State, County), Model Position and AVM Name; and
+    PPE10 hits per (State, County), State, Model Position and overall.
+
+        aggregates = ResultAggregates()
+        aggregates.update(results_df)          # any number of chunks
+        aggregates.merge(other_shard_aggregates)
+        tables = aggregates.summary_tables(min_conf_scores, max_fsd_values)
+    """
+
+    def __init__(self, relative_accuracy=0.005):
+        self.relative_accuracy = relative_accuracy
+        self.position_error = GroupedStats('Model Position', relative_accuracy)
+        self.overall_error = GroupedStats(None, relative_accuracy)
+        self.location_error = GroupedStats(['State', 'County'], relative_accuracy)
+        self.location_rows = GroupedStats(['State', 'County'])
+        self.position_rows = GroupedStats('Model Position')
+        self.name_rows = GroupedStats('AVM Name')
+        self.ppe10_overall = GroupedStats()
+        self.ppe10_county = GroupedStats(['State', 'County'])
+        self.ppe10_state = GroupedStats('State')
+        self.ppe10_model = GroupedStats('Model Position')
+
+    def _accumulators(self):
+        return [name for name, value in vars(self).items() if isinstance(value, GroupedStats)]
+
+    def update(self, results_df):
+        """
+        Adds one chunk of result rows (columns as produced by process_benchmark).
+        """
+        diff = pd.to_numeric(results_df[DIFF_COLUMN], errors='coerce')
+        rows = pd.Series(1.0, index=results_df.index)
+        self.position_error.update(results_df, diff)
+        self.overall_error.update(results_df, diff)
+
+        matched = results_df['AVM Value'].notna()
+        self.location_error.update(results_df[matched], diff[matched])
+        self.location_rows.update(results_df, rows)
+        self.position_rows.update(results_df, rows)
+        self.name_rows.update(results_df, rows)
+
+        valid = results_df[results_df['Benchmark Value'].notna() & matched & (results_df['Benchmark Value'] != 0)]
+        within_10 = (((valid['AVM Value'] - valid['Benchmark Value']).abs() / valid['Benchmark Value'].abs()) * 100.0 <= 10).astype('float64')
+        for accumulator in (self.ppe10_overall, self.ppe10_county, self.ppe10_state, self.ppe10_model):
+            accumulator.update(valid, within_10)
+        return self
+
+    def merge(self, other):
+        """
+        Folds another ResultAggregates (e.g. from another shard) into this one.
+        """
+        for name in self._accumulators():
+            getattr(self, name).merge(getattr(other, name))
+        return self
+
+    @staticmethod
+    def _median_intervals(accumulator):
+        """
+        Bootstrap intervals of the median of every group of a sketched
+        GroupedStats, in the order of its result() rows.
+        """
+        index = accumulator.result().index
+        return sketch_median_intervals([accumulator.sketches.get(key) for key in index])
+
+    def summary_tables(self, min_conf_scores, max_fsd_values):
+        """
+        Returns the same (sheet name, DataFrame, index, formats) tuples as
+        file_operations.summary_tables, computed from the aggregates.
+        """
+        tables = []
+
+        position_error = self.position_error.result()
+        overall_error = self.overall_error.result().iloc[0]
+        model_stats_df = pd.DataFrame({
+            'Model Position': position_error.index,
+            'Average Error': position_error['mean'].to_numpy(),
+            'Median Error': position_error['median'].to_numpy(),
+            'Standard Deviation': position_error['std'].to_numpy(),
+        })
+        position_low, position_high = self._median_intervals(self.position_error)
+        overall_low, overall_high = self._median_intervals(self.overall_error)
+        model_stats_df = finish_model_stats(model_stats_df, overall_error['mean'], overall_error['median'], overall_error['std'],
+                                            median_intervals=(np.append(position_low, overall_low), np.append(position_high, overall_high)))
+        tables.append(('Model Specific Statistics', model_stats_df, False, dict.fromkeys(MODEL_STATS_PERCENT_COLUMNS, '0.00%')))
+
+        location_error = self.location_error.result()
+        loc_stats = location_error[['count', 'mean', 'min', 'max']].reset_index()
+        location_medians = location_error[['median']].rename(columns={'median': 'Median Error'})
+        add_interval_columns(location_medians, 'Median Error', *self._median_intervals(self.location_error))
+        total_records = self.location_rows.result()['count'].rename('Total Number of Records').reset_index()
+        tables.append(('Statistics by Location', finish_location_stats(loc_stats, total_records, location_medians.reset_index()), False,
+                       dict.fromkeys(LOCATION_STATS_PERCENT_COLUMNS, '0.00%')))
+
+        usage = self.position_rows.result()['count'].sort_values(ascending=False)
+        model_usage_df = (usage / usage.sum()).reset_index()
+        model_usage_df.columns = ['Model Position', 'Usage Percentage']
+        tables.append(('Model Usage', model_usage_df, False, {'Usage Percentage': '0.0%'}))
+
+        model_name_counts_df = self.name_rows.result()['count'].sort_values(ascending=False).reset_index()
+        model_name_counts_df.columns = ['AVM Name', 'Count']
+        tables.append(('Model Name Counts', model_name_counts_df, False, {}))
+
+        tables.append(('Conf & FSD Summary', conf_fsd_summary(min_conf_scores, max_fsd_values), False, {}))
+
+        overall = self.ppe10_overall.result()
+        tables.append(('PPE10 Stats', ppe10_overall(int(overall['count'].sum()), int(overall['sum'].sum())), False, dict.fromkeys(PPE10_PERCENT_COLUMNS, '0.00%')))
+        for sheet_name, accumulator in [('PPE10 by County', self.ppe10_county), ('PPE10 by State', self.ppe10_state), ('PPE10 by Model', self.ppe10_model)]:
+            tables.append((sheet_name, finish_ppe10_table(accumulator.result()[['count', 'sum']].astype('int64')), True, {}))
+        return tables
@@ -2,106 +2,97 @@ import pandas as pd
 import csv
 import os
 
+from avm_app.cascade_index import CascadeIndex
+from avm_app.compressed import data_format, inner_name
+from avm_app.compact import BENCHMARK_COLUMNS, BENCHMARK_CATEGORIES, compact_benchmark
+from avm_app.data_processing import column_phrases
+from avm_app.dedup import dedup_benchmark, dedup_vendor_frame
+from avm_app.vendor_registry import VENDORS, csv_read_options
+
 def read_benchmark_file(file_path, desired_forms):
-    df = pd.read_csv(file_path, quoting=csv.QUOTE_ALL, low_memory=False)
-    return df[df['FormName'].isin(desired_forms)]
+    """
+    Reads the benchmark columns the simulation needs (from a plain or a
+    .gz / .zip / .zst compressed CSV, decompressed as it is parsed), keeps the desired forms
+    and returns them in compact dtypes (see compact_benchmark), with one row
+    per Ref ID (see dedup_benchmark).
+    """
+    df = pd.read_csv(file_path, quoting=csv.QUOTE_ALL, low_memory=False,
+                     usecols=lambda col: col in BENCHMARK_COLUMNS,
+                     dtype={col: 'category' for col in BENCHMARK_CATEGORIES})
+    return dedup_benchmark(compact_benchmark(df[df['FormName'].isin(desired_forms)]))[0]
 
 def read_cascade_file(file_path):
     """
-    Reads the cascade file and replaces "Clear Capital" with "ClearAVMv3".
+    Reads the cascade file and replaces model aliases (e.g. "Clear Capital")
+    with their vendor registry names ("ClearAVMv3").
+    Optional Zip and CBSA columns are read as text to keep leading zeros.
     """
-    df = pd.read_csv(file_path)
-    df.replace('Clear Capital', 'ClearAVMv3', inplace=True)
-    return df
+    df = pd.read_csv(file_path, dtype={'Zip': str, 'CBSA': str})
+    return VENDORS.canonical_names(df)
 
-def get_avm_model_files(cascade_df, state, county):
+def get_avm_model_files(cascade_df, state, county, zip_code=None, cbsa=None):
     """
-    Retrieves AVM model files based on state and county from the cascade DataFrame.
+    Retrieves AVM model files based on location from the cascade DataFrame.
     Adjusted to handle "ClearAVMv3" as "Clear Capital" as well as variable model columns.
-    
-    - Handles cases where some cascades may have empty counties or states (NaN or missing).
-    - If a particular cascade row has a NaN in County, we allow a fallback to the row that has County == NaN.
-    """
-
-    # Safely lowercase the incoming state and county, handling None
-    state = str(state).lower() if state else ""
-    county = str(county).lower() if county else ""
 
-    # Replace "Clear Capital" -> "ClearAVMv3" for consistency
-    cascade_df = cascade_df.replace({'Clear Capital': 'ClearAVMv3'})
+    - Resolves ZIP -> CBSA -> (State, County) -> State -> national default
+      (the row with State '*'), using whichever of those levels the cascade
+      defines (see CascadeIndex).
+    - If a particular cascade row has a NaN in County, it is the fallback for
+      every county of its state without a row of its own.
 
-    # Identify all cascade columns that start with "Model"
-    model_columns = [col for col in cascade_df.columns if col.startswith('Model')]
-
-    # 1) Try to match rows where State matches and County matches (case-insensitive)
-    county_filtered = cascade_df[
-        (cascade_df['State'].fillna("").astype(str).str.lower() == state) &
-        (cascade_df['County'].fillna("").astype(str).str.lower() == county)
-    ]
-    if not county_filtered.empty:
-        # Found a row for specific county
-        models = {col: county_filtered.iloc[0][col] for col in model_columns}
-        return models
-
-    # 2) Otherwise, try to match rows where State matches and County is NaN
-    #    (i.e., a default row for that state but no specific county)
-    state_filtered = cascade_df[
-        (cascade_df['State'].fillna("").astype(str).str.lower() == state) &
-        (cascade_df['County'].isna())
-    ]
-    if not state_filtered.empty:
-        # Found a row for that state with no county
-        models = {col: state_filtered.iloc[0][col] for col in model_columns}
-        return models
-
-    # 3) If nothing matched, return all model columns as None
-    return {col: None for col in model_columns}
+    For whole benchmarks, build one CascadeIndex and call resolve() instead.
+    """
+    location = pd.DataFrame({'State': [state], 'County': [county], 'Zip': [zip_code], 'CBSA': [cbsa]})
+    index = CascadeIndex(cascade_df)
+    return index.models_for_row(index.resolve(location)[0])
 
 def get_keyword_from_model(model):
+    """
+    Returns the first file keyword of a model's vendor registry entry (the
+    model name itself for unregistered models), or None for non-strings.
+    """
     if isinstance(model, str):
-        keywords = {
-            'VeroVALUE': 'VeroValue',
-            'VeroValue Pref': 'VeroValue',
-            'Total Home ValueX Risk Management': 'THVx RM',
-            'Quantarium': 'QM1',
-            'CA Value MC': 'CA Value MC',
-            'HouseCanary Value Report': 'HouseCanary',  # Alternate for HouseCanary
-            'HouseCanary': 'HouseCanary',  # Alternate for HouseCanary
-            'CA Value': 'CA Value',
-            'Total Home ValueX Originations': 'THVx Orig',
-            'Freddie Mac Home Value Explorer': 'Freddie',  # HVE
-            'HVE': 'Freddie',
-            'Freddie Mac Home Value Explorer': 'HVE',      # Alternate for Freddie Mac
-            'iAVM': 'iAVM',
-            'SiteXValue': 'SiteXValue',
-            'RVM': 'RVM',
-            'ValueSure': 'ValueSure',
-            'FiveBridges': 'FiveBridges',
-            'ClearAVMv3': 'ClearAVMv3',
-        }
-        return keywords.get(model, model)
+        return VENDORS.rule(model).keywords[0]
     else:
         return None
 
 def find_file_with_keyword(folder_path, keyword):
+    """
+    Returns the first file in folder_path whose name contains keyword
+    (case-insensitive). Compressed files are matched on the name of the
+    file inside them (see inner_name).
+    """
     if not keyword:
         return None
     for file in os.listdir(folder_path):
-        if keyword.lower() in file.lower():
+        if keyword.lower() in inner_name(os.path.join(folder_path, file)).lower():
             return file
     return None
 
+def find_vendor_file(folder_path, model):
+    """
+    Finds a model's vendor file in folder_path, trying the file keywords of
+    its registry entry in order. Returns the file name or None.
+    """
+    if not isinstance(model, str):
+        return None
+    for keyword in VENDORS.rule(model).keywords:
+        file_name = find_file_with_keyword(folder_path, keyword)
+        if file_name:
+            return file_name
+    return None
+
 def read_files_once(unique_models, avm_folder):
     model_file_data = {}
     for model in unique_models:
-        keyword = get_keyword_from_model(model)
-        if keyword:
-            file_name = find_file_with_keyword(avm_folder, keyword)
+        if isinstance(model, str):
+            file_name = find_vendor_file(avm_folder, model)
             if file_name:
                 file_path = os.path.join(avm_folder, file_name)
-                if file_path.endswith('.csv'):
-                    model_df = pd.read_csv(file_path, low_memory=False)
-                elif file_path.endswith('.xlsx'):
+                if data_format(file_path) == '.csv':
+                    model_df = pd.read_csv(file_path, low_memory=False, **csv_read_options(file_path, model))
+                elif data_format(file_path) == '.xlsx':
                     model_df = pd.read_excel(file_path)
                 else:
                     continue  # Skip unsupported file formats
@@ -110,5 +101,5 @@ def read_files_once(unique_models, avm_folder):
                 # if model in ['SiteXValue', 'RVM', 'ValueSure']:
                 #     model_df = model_df[model_df['AVM Model Name'] == model]
 
-                model_file_data[model] = model_df
+                model_file_data[model] = dedup_vendor_frame(model_df, model, column_phrases)[0]
     return model_file_data
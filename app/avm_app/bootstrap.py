@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Resamples per interval and two-sided confidence level of the intervals
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE_LEVEL = 0.95
+
+# Fixed seed, so a workbook's intervals do not change from run to run
+BOOTSTRAP_SEED = 20240101
+
+# Groups resampled together, bounding each (groups x resamples) matrix
+GROUP_BLOCK = 4096
+
+
+def _percentiles(draws, confidence):
+    alpha = (1 - confidence) / 2
+    return np.quantile(draws, [alpha, 1 - alpha], axis=1)
+
+
+def proportion_intervals(successes, totals, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL, seed=BOOTSTRAP_SEED):
+    """
+    Percentile bootstrap intervals of per-group proportions (hit rate, PPE10).
+
+    Resampling a group's n rows with replacement gives a success count that
+    is Binomial(n, successes / n), so the whole (groups x resamples) matrix
+    is drawn in one call per block instead of materializing resampled rows.
+    Returns (low, high) arrays, NaN for groups without rows.
+    """
+    successes = np.nan_to_num(np.asarray(successes, dtype='float64'))
+    totals = np.nan_to_num(np.asarray(totals, dtype='float64')).astype('int64')
+    rng = np.random.default_rng(seed)
+    low = np.full(len(totals), np.nan)
+    high = np.full(len(totals), np.nan)
+    for start in range(0, len(totals), GROUP_BLOCK):
+        block = slice(start, start + GROUP_BLOCK)
+        n = totals[block]
+        present = n > 0
+        n_safe = np.where(present, n, 1)[:, None]
+        p = np.clip(successes[block][:, None] / n_safe, 0, 1)
+        draws = rng.binomial(n_safe, p, size=(len(n), resamples)) / n_safe
+        block_low, block_high = _percentiles(draws, confidence)
+        low[block] = np.where(present, block_low, np.nan)
+        high[block] = np.where(present, block_high, np.nan)
+    return low, high
+
+
+def median_intervals(group_codes, values, group_count, weights=None, resamples=BOOTSTRAP_RESAMPLES,
+                     confidence=CONFIDENCE_LEVEL, seed=BOOTSTRAP_SEED):
+    """
+    Percentile bootstrap intervals of per-group medians.
+
+    group_codes (0..group_count-1, -1 to skip) assigns each value to a group;
+    weights, if given, are integer repeat counts (e.g. quantile sketch
+    buckets). The median of a resample of n sorted values is its k-th order
+    statistic, whose position is floor(n * U) with U ~ Beta(k, n - k + 1);
+    for even n the (k+1)-th follows from a second Beta draw. Only these
+    positions are drawn, so the cost is groups x resamples whatever the
+    group sizes. Returns (low, high) arrays, NaN for empty groups.
+    """
+    group_codes = np.asarray(group_codes, dtype='int64')
+    values = np.asarray(values, dtype='float64')
+    weights = np.ones(len(values), dtype='int64') if weights is None else np.asarray(weights, dtype='int64')
+    keep = (group_codes >= 0) & ~np.isnan(values) & (weights > 0)
+    group_codes, values, weights = group_codes[keep], values[keep], weights[keep]
+
+    low = np.full(group_count, np.nan)
+    high = np.full(group_count, np.nan)
+    if not len(values):
+        return low, high
+
+    order = np.lexsort((values, group_codes))
+    group_codes, values, weights = group_codes[order], values[order], weights[order]
+    cumulative = np.cumsum(weights)
+    sizes = np.bincount(group_codes, weights=weights, minlength=group_count).astype('int64')
+    bases = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, group_count, GROUP_BLOCK):
+        block = slice(start, start + GROUP_BLOCK)
+        n = sizes[block]
+        present = n > 0
+        n_safe = np.where(present, n, 1)[:, None]
+        even = n_safe % 2 == 0
+        k = np.where(even, n_safe // 2, (n_safe + 1) // 2)
+        first = rng.beta(k, n_safe - k + 1, size=(len(n), resamples))
+        second = first + (1 - first) * rng.beta(1, np.maximum(n_safe - k, 1), size=(len(n), resamples))
+
+        def value_at(u):
+            ranks = np.minimum((u * n_safe).astype('int64'), n_safe - 1)
+            positions = np.searchsorted(cumulative, bases[block][:, None] + ranks, side='right')
+            return values[np.minimum(positions, len(values) - 1)]
+
+        lower_value = value_at(first)
+        draws = np.where(even, (lower_value + value_at(second)) / 2, lower_value)
+        block_low, block_high = _percentiles(draws, confidence)
+        low[block] = np.where(present, block_low, np.nan)
+        high[block] = np.where(present, block_high, np.nan)
+    return low, high
+
+
+def grouped_median_intervals(values, by, **kwargs):
+    """
+    median_intervals for a Series grouped like values.groupby(by,
+    observed=True); the intervals are in the groupby's (sorted) group order.
+    """
+    grouped = values.groupby(by, observed=True)
+    codes = grouped.ngroup().fillna(-1).astype('int64')
+    return median_intervals(codes.to_numpy(), values.to_numpy(dtype='float64', na_value=np.nan), grouped.ngroups, **kwargs)
+
+
+def sketch_median_intervals(sketches, **kwargs):
+    """
+    median_intervals from a list of QuantileSketch objects (None for an empty
+    group), resampling each sketch's buckets by their counts. The intervals
+    carry the sketch's relative error on top of the resampling error.
+    """
+    codes, values, weights = [], [], []
+    for code, sketch in enumerate(sketches):
+        if sketch is None:
+            continue
+        bucket_values, bucket_counts = sketch.buckets()
+        codes.append(np.full(len(bucket_values), code))
+        values.append(bucket_values)
+        weights.append(bucket_counts)
+    if not codes:
+        return np.full(len(sketches), np.nan), np.full(len(sketches), np.nan)
+    return median_intervals(np.concatenate(codes), np.concatenate(values), len(sketches), np.concatenate(weights), **kwargs)
+
+
+def add_interval_columns(table, name, low, high, digits=None):
+    """
+    Adds '<name> CI Low' and '<name> CI High' columns to table (in place),
+    rounded to digits when given.
+    """
+    low, high = pd.Series(low, index=table.index), pd.Series(high, index=table.index)
+    if digits is not None:
+        low, high = low.round(digits), high.round(digits)
+    table[f'{name} CI Low'] = low
+    table[f'{name} CI High'] = high
+    return table
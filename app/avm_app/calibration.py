@@ -0,0 +1,280 @@
+import io
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from avm_app.avm_utils import find_vendor_file, read_benchmark_file
+from avm_app.compressed import data_format
+from avm_app.data_processing import column_phrases
+from avm_app.file_operations import read_files_once, write_summary_sheets
+from avm_app.profiles import load_profile
+from avm_app.simulation import benchmark_values_for, numeric_ref_ids
+from avm_app.vendor_registry import VENDORS
+from avm_app.vendor_store import SharedVendorStore, canonical_vendor_arrays
+
+# Most cutoffs listed per curve; vendors with more distinct scores are
+# sampled at evenly spaced ranks
+CURVE_POINTS = 101
+
+# PPE10 the recommended cutoff must reach unless another target is given
+DEFAULT_TARGET_PPE10 = 0.70
+
+# Cutoffs passing fewer hits are never recommended, their PPE10 being noise
+MIN_RECOMMENDED_HITS = 30
+
+CURVE_PERCENT_COLUMNS = ['Hit Rate', 'PPE10', 'Median Error']
+HIGHLIGHT_COLOR = 'FFF2CC'
+
+
+def cutoff_curve(scores, pct_diff, row_count, descending):
+    """
+    Hit rate, PPE10 and median error of one vendor's hits as a function of a
+    score cutoff, from a single sort of its scores.
+
+    - scores: confidence or FSD of each hit, NaN where the vendor gave none
+    - pct_diff: (AVM - benchmark) / benchmark of each hit
+    - descending: True for confidence (rows with score >= cutoff pass, NaN
+      never does), False for FSD (rows with score <= cutoff pass, NaN always
+      does, as in match_batch)
+
+    Hit and within-10% counts come from cumulative sums over the sorted hits,
+    so every cutoff is exact; the median is taken over each listed prefix.
+    Returns a DataFrame of Cutoff, Hits, Hit Rate, Within 10%, PPE10 and
+    Median Error, strictest cutoff first.
+    """
+    scores = np.asarray(scores, dtype='float64')
+    pct_diff = np.asarray(pct_diff, dtype='float64')
+    if descending:
+        keep = ~np.isnan(scores)
+        scores, pct_diff = scores[keep], pct_diff[keep]
+        order = np.argsort(-scores, kind='stable')
+    else:
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        order = np.argsort(scores, kind='stable')
+    sorted_scores = scores[order]
+    sorted_diff = pct_diff[order]
+    within = np.cumsum(np.abs(sorted_diff) <= 0.10)
+
+    # Last row of each run of equal scores: the prefix a cutoff at that score passes
+    ends = np.flatnonzero(np.append(sorted_scores[1:] != sorted_scores[:-1], True)) if len(sorted_scores) else np.empty(0, dtype='int64')
+    ends = ends[np.isfinite(sorted_scores[ends])]
+    if len(ends) > CURVE_POINTS:
+        ends = ends[np.unique(np.linspace(0, len(ends) - 1, CURVE_POINTS).round().astype('int64'))]
+    hits = ends + 1
+
+    return pd.DataFrame({
+        'Cutoff': sorted_scores[ends],
+        'Hits': hits,
+        'Hit Rate': hits / row_count if row_count else np.nan,
+        'Within 10%': within[ends],
+        'PPE10': within[ends] / hits,
+        'Median Error': [np.median(sorted_diff[:count]) for count in hits],
+    })
+
+
+def recommended_cutoffs(curve, target_ppe10=None, target_hit_rate=None):
+    """
+    Positions in curve of the recommended cutoffs, as {target label: row}:
+
+    - 'PPE10 >= target': the loosest cutoff (most hits) whose PPE10 reaches
+      target_ppe10 over at least MIN_RECOMMENDED_HITS hits
+    - 'Hit Rate >= target': the strictest cutoff whose hit rate reaches
+      target_hit_rate
+
+    Targets no cutoff reaches are left out.
+    """
+    recommended = {}
+    if target_ppe10 is not None:
+        reaching = np.flatnonzero((curve['PPE10'].to_numpy() >= target_ppe10) & (curve['Hits'].to_numpy() >= MIN_RECOMMENDED_HITS))
+        if len(reaching):
+            recommended[f"PPE10 >= {target_ppe10:.0%}"] = int(reaching[-1])
+    if target_hit_rate is not None:
+        reaching = np.flatnonzero(curve['Hit Rate'].to_numpy() >= target_hit_rate)
+        if len(reaching):
+            recommended[f"Hit Rate >= {target_hit_rate:.0%}"] = int(reaching[0])
+    return recommended
+
+
+def calibration_curves(benchmark_df, model_file_data, column_phrases):
+    """
+    Joins every vendor in model_file_data with the benchmark once and builds
+    its confidence and FSD curves (see cutoff_curve), with scores brought to
+    the registry's scales. Curves are skipped for scores a vendor has none of
+    or is exempt from filtering on.
+
+    Returns {model: {'Confidence': curve, 'FSD': curve}}.
+    """
+    ref_ids, valid = numeric_ref_ids(benchmark_df)
+    benchmark_values = np.asarray(benchmark_values_for(benchmark_df), dtype='float64')
+    row_count = len(benchmark_df)
+
+    curves = {}
+    for model, model_df in model_file_data.items():
+        arrays = canonical_vendor_arrays(model_df, column_phrases)
+        if arrays is None:
+            continue
+        found, avm, conf, fsd = SharedVendorStore(None, {model: arrays}).lookup(model, ref_ids)
+        hit = valid & found & ~np.isnan(avm) & np.isfinite(benchmark_values) & (benchmark_values != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_diff = (avm[hit] - benchmark_values[hit]) / benchmark_values[hit]
+
+        rule = VENDORS.rule(model)
+        curves[model] = {}
+        if rule.filters_confidence and not np.isnan(conf[hit]).all():
+            curves[model]['Confidence'] = cutoff_curve(rule.confidence(conf[hit]), pct_diff, row_count, descending=True)
+        if rule.filters_fsd and not np.isnan(fsd[hit]).all():
+            curves[model]['FSD'] = cutoff_curve(rule.fsd(fsd[hit]), pct_diff, row_count, descending=False)
+    return curves
+
+
+def _curve_table(curves, curve_name, cutoff_column, target_ppe10, target_hit_rate):
+    frames = []
+    for model, model_curves in curves.items():
+        if curve_name not in model_curves:
+            continue
+        curve = model_curves[curve_name].rename(columns={'Cutoff': cutoff_column})
+        curve.insert(0, 'Model', model)
+        curve['Recommended'] = ''
+        for label, row in recommended_cutoffs(model_curves[curve_name], target_ppe10, target_hit_rate).items():
+            current = curve.at[row, 'Recommended']
+            curve.at[row, 'Recommended'] = f"{current}, {label}" if current else label
+        frames.append(curve)
+    columns = ['Model', cutoff_column, 'Hits', 'Hit Rate', 'Within 10%', 'PPE10', 'Median Error', 'Recommended']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def calibration_summary(curves, min_conf_scores, max_fsd_values, target_ppe10=None, target_hit_rate=None):
+    """
+    One row per vendor, curve and reached target: the recommended cutoff and
+    its hits, hit rate, PPE10 and median error, next to the profile's
+    current cutoff.
+    """
+    rows = []
+    for model, model_curves in curves.items():
+        for curve_name, curve in model_curves.items():
+            current = min_conf_scores.get(model) if curve_name == 'Confidence' else max_fsd_values.get(model)
+            for label, row in recommended_cutoffs(curve, target_ppe10, target_hit_rate).items():
+                point = curve.iloc[row]
+                rows.append({
+                    'Model': model,
+                    'Curve': curve_name,
+                    'Target': label,
+                    'Recommended Cutoff': point['Cutoff'],
+                    'Profile Cutoff': current,
+                    'Hits': int(point['Hits']),
+                    'Hit Rate': point['Hit Rate'],
+                    'PPE10': point['PPE10'],
+                    'Median Error': point['Median Error'],
+                })
+    return pd.DataFrame(rows, columns=['Model', 'Curve', 'Target', 'Recommended Cutoff', 'Profile Cutoff',
+                                       'Hits', 'Hit Rate', 'PPE10', 'Median Error'])
+
+
+def _highlight_recommended(worksheet, table_df):
+    from openpyxl.styles import PatternFill
+
+    fill = PatternFill(start_color=HIGHLIGHT_COLOR, end_color=HIGHLIGHT_COLOR, fill_type='solid')
+    for position in np.flatnonzero(table_df['Recommended'].to_numpy() != ''):
+        for cell in worksheet[int(position) + 2]:
+            cell.fill = fill
+
+
+def _curve_chart(curves, target_ppe10, target_hit_rate):
+    """
+    PNG of every vendor's PPE10 and hit rate against its confidence and FSD
+    cutoffs, with the recommended cutoffs marked.
+    """
+    import matplotlib.pyplot as plt
+
+    models = [model for model, model_curves in curves.items() if model_curves]
+    figure, axes = plt.subplots(max(len(models), 1), 2, figsize=(14, 3.5 * max(len(models), 1)), squeeze=False)
+    for row, model in enumerate(models):
+        for column, (curve_name, x_label) in enumerate([('Confidence', 'Min Conf Score'), ('FSD', 'Max FSD Value')]):
+            ax = axes[row][column]
+            curve = curves[model].get(curve_name)
+            if curve is None or curve.empty:
+                ax.annotate('No scores available', xy=(0.5, 0.5), xycoords='axes fraction',
+                            horizontalalignment='center', verticalalignment='center', fontsize=9)
+            else:
+                ax.plot(curve['Cutoff'], curve['PPE10'], label='PPE10')
+                ax.plot(curve['Cutoff'], curve['Hit Rate'], label='Hit Rate')
+                for label, position in recommended_cutoffs(curve, target_ppe10, target_hit_rate).items():
+                    ax.axvline(curve['Cutoff'].iloc[position], color='tab:red', linestyle='--', linewidth=1)
+                    ax.annotate(label, xy=(curve['Cutoff'].iloc[position], 0.02), fontsize=8, rotation=90,
+                                verticalalignment='bottom', color='tab:red')
+                ax.set_ylim(0, 1)
+                ax.legend(loc='lower right', fontsize=8)
+            ax.set_title(f'{model} ({curve_name})')
+            ax.set_xlabel(x_label)
+    plt.tight_layout()
+
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', bbox_inches='tight')
+    buffer.seek(0)
+    plt.close(figure)
+    return buffer
+
+
+def write_calibration_to_excel(curves, output_file, min_conf_scores, max_fsd_values,
+                               target_ppe10=DEFAULT_TARGET_PPE10, target_hit_rate=None):
+    """
+    Writes the calibration workbook: "Calibration Summary", the
+    "Confidence Curves" and "FSD Curves" tables with the recommended cutoffs
+    highlighted, and a "Calibration Charts" sheet.
+    """
+    from openpyxl import load_workbook
+    from openpyxl.drawing.image import Image
+
+    summary_df = calibration_summary(curves, min_conf_scores, max_fsd_values, target_ppe10, target_hit_rate)
+    confidence_df = _curve_table(curves, 'Confidence', 'Min Conf Score', target_ppe10, target_hit_rate)
+    fsd_df = _curve_table(curves, 'FSD', 'Max FSD Value', target_ppe10, target_hit_rate)
+    percent_formats = dict.fromkeys(CURVE_PERCENT_COLUMNS, '0.00%')
+
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        write_summary_sheets(writer, [
+            ('Calibration Summary', summary_df, False, percent_formats),
+            ('Confidence Curves', confidence_df, False, percent_formats),
+            ('FSD Curves', fsd_df, False, percent_formats),
+        ])
+        for sheet_name, table_df in [('Confidence Curves', confidence_df), ('FSD Curves', fsd_df)]:
+            _highlight_recommended(writer.sheets[sheet_name], table_df)
+
+    workbook = load_workbook(output_file)
+    workbook.create_sheet('Calibration Charts').add_image(Image(_curve_chart(curves, target_ppe10, target_hit_rate)), 'A1')
+    workbook.save(output_file)
+
+
+def vendor_models(avm_folder, models):
+    """
+    The models of models (in order) that have a vendor file in avm_folder,
+    keeping only the first model per file.
+    """
+    chosen = {}
+    for model in models:
+        file_name = find_vendor_file(avm_folder, model)
+        if file_name and data_format(os.path.join(avm_folder, file_name)) in ('.csv', '.xlsx') and file_name not in chosen:
+            chosen[file_name] = model
+    return list(chosen.values())
+
+
+def run_calibration(benchmark_file, avm_folder, output_file, profiles_data, profile='Default',
+                    target_ppe10=DEFAULT_TARGET_PPE10, target_hit_rate=None):
+    """
+    Builds accuracy-vs-cutoff curves for every vendor file in avm_folder
+    against a benchmark (filtered to the profile's forms) and writes them
+    with write_calibration_to_excel. Vendors are named after the profile's
+    models first, then the vendor registry. Returns the curves.
+    """
+    min_conf_scores, desired_forms, max_fsd_values, _ = load_profile(profiles_data, profile)
+    benchmark_df = read_benchmark_file(benchmark_file, desired_forms)
+    if benchmark_df.empty:
+        raise ValueError(f"{benchmark_file} has no rows of the profile's forms")
+
+    models = vendor_models(avm_folder, list(dict.fromkeys(list(min_conf_scores) + list(VENDORS.rules))))
+    curves = calibration_curves(benchmark_df, read_files_once(models, avm_folder), column_phrases)
+    for model, model_curves in curves.items():
+        logging.info(f"{model}: {', '.join(f'{name} curve of {len(curve)} cutoffs' for name, curve in model_curves.items()) or 'no scores'}")
+    write_calibration_to_excel(curves, output_file, min_conf_scores, max_fsd_values, target_ppe10, target_hit_rate)
+    return curves
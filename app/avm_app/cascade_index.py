@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from avm_app.vendor_registry import VENDORS
+
+# Cascade levels from most to least specific. A cascade row belongs to the
+# most specific level whose key columns it fills in:
+#   Zip     - 'Zip' set (State / County ignored)
+#   CBSA    - 'CBSA' set, no Zip
+#   County  - 'State' and 'County' set, no Zip / CBSA
+#   State   - only 'State' set
+#   Default - State is DEFAULT_STATE ('*'), no Zip / CBSA; applies nationwide
+# Rows with no key column set belong to no level and never match, as in the
+# original two-level resolver, so the nationwide default is always explicit.
+CASCADE_LEVELS = ['Zip', 'CBSA', 'County', 'State', 'Default']
+
+# State of the nationwide default row (its County is left empty or also '*')
+DEFAULT_STATE = '*'
+
+# Location columns a cascade or benchmark may carry
+LOCATION_COLUMNS = ['State', 'County', 'Zip', 'CBSA']
+
+
+def _normalize_text(value):
+    return str(value).strip().lower()
+
+
+def _normalize_code(value):
+    """
+    Normalizes a ZIP / CBSA code: '02134-1234', '2134', 2134.0 -> '02134'
+    for ZIPs (and the same digits-only form for CBSA codes).
+    """
+    text = str(value).strip().split('-')[0]
+    if text.endswith('.0') and text[:-2].isdigit():
+        text = text[:-2]
+    return text.zfill(5) if text.isdigit() else text.lower()
+
+
+def normalized_keys(values, normalize=_normalize_text):
+    """
+    Normalizes a column of location values to lower-case stripped strings
+    ('' where missing). Only the distinct values are normalized, so a whole
+    benchmark column costs one factorize plus a take.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    normalized = np.array([normalize(value) for value in uniques] + [''], dtype=object)
+    return normalized[codes]
+
+
+def _location_keys(frame, length):
+    keys = {}
+    for col in LOCATION_COLUMNS:
+        if col in frame.columns:
+            keys[col] = normalized_keys(frame[col], _normalize_code if col in ('Zip', 'CBSA') else _normalize_text)
+        else:
+            keys[col] = np.full(length, '', dtype=object)
+    return keys
+
+
+class CascadeIndex:
+    """
+    Precompiled multi-level lookup over a cascade DataFrame.
+
+    Each level (see CASCADE_LEVELS) is a pandas Index of normalized keys
+    pointing at the first cascade row of that level with that key, the row
+    get_avm_model_files has always picked. resolve() looks whole benchmark
+    columns up level by level with get_indexer, falling back to the next
+    level only for rows still unresolved, so there is no per-row scanning.
+
+    Cascades with only State / County columns resolve exactly as before:
+    (State, County) rows first, then the State row with an empty County.
+    """
+
+    def __init__(self, cascade_df):
+        cascade_df = VENDORS.canonical_names(cascade_df)
+        self.model_positions = [col for col in cascade_df.columns if col.startswith('Model')]
+        self.models = cascade_df[self.model_positions].to_numpy(dtype=object)
+
+        keys = _location_keys(cascade_df, len(cascade_df))
+        has_zip = keys['Zip'] != ''
+        has_cbsa = ~has_zip & (keys['CBSA'] != '')
+        is_default = ~has_zip & ~has_cbsa & (keys['State'] == DEFAULT_STATE) & np.isin(keys['County'], ['', DEFAULT_STATE])
+        area = ~has_zip & ~has_cbsa & (keys['State'] != DEFAULT_STATE)
+        has_county = area & (keys['State'] != '') & (keys['County'] != '')
+        has_state = area & (keys['State'] != '') & (keys['County'] == '')
+
+        self.levels = {
+            'Zip': self._level([keys['Zip']], has_zip),
+            'CBSA': self._level([keys['CBSA']], has_cbsa),
+            'County': self._level([keys['State'], keys['County']], has_county),
+            'State': self._level([keys['State']], has_state),
+        }
+        default_rows = np.flatnonzero(is_default)
+        self.default_row = int(default_rows[0]) if len(default_rows) else -1
+
+    @staticmethod
+    def _level(key_columns, mask):
+        rows = np.flatnonzero(mask)
+        if len(key_columns) == 1:
+            index = pd.Index(key_columns[0][rows])
+        else:
+            index = pd.MultiIndex.from_arrays([column[rows] for column in key_columns])
+        first = ~index.duplicated(keep='first')
+        return index[first], rows[first]
+
+    def resolve(self, benchmark_df):
+        """
+        Returns, for every benchmark row, the position of the cascade row that
+        applies to it (-1 when none does). Uses the benchmark's State, County
+        and, when present, Zip and CBSA columns.
+        """
+        keys = _location_keys(benchmark_df, len(benchmark_df))
+        resolved = np.full(len(benchmark_df), -1, dtype=np.int64)
+        lookups = {
+            'Zip': [keys['Zip']],
+            'CBSA': [keys['CBSA']],
+            'County': [keys['State'], keys['County']],
+            'State': [keys['State']],
+        }
+        for level, (index, rows) in self.levels.items():
+            pending = np.flatnonzero(resolved < 0)
+            if not len(pending) or not len(index):
+                continue
+            columns = [column[pending] for column in lookups[level]]
+            if len(columns) == 1:
+                positions = index.get_indexer(pd.Index(columns[0]))
+            else:
+                positions = index.get_indexer(pd.MultiIndex.from_arrays(columns))
+            found = positions >= 0
+            resolved[pending[found]] = rows[positions[found]]
+        resolved[resolved < 0] = self.default_row
+        return resolved
+
+    def models_for_row(self, cascade_row):
+        """
+        Returns the {model column: model} dict of one resolved cascade row,
+        with every model None when cascade_row is -1.
+        """
+        if cascade_row < 0:
+            return {position: None for position in self.model_positions}
+        return dict(zip(self.model_positions, self.models[cascade_row]))
+
+    def model_codes(self, resolved, model_names):
+        """
+        Returns an int16 array of shape (positions, rows) with the index in
+        model_names of each resolved row's model per position, -1 for none.
+        """
+        name_codes = {name: code for code, name in enumerate(model_names)}
+        row_codes = np.array([[name_codes.get(model, -1) if isinstance(model, str) else -1 for model in row] for row in self.models],
+                             dtype=np.int16).reshape(len(self.models), len(self.model_positions))
+        # Extra all -1 row, picked by the -1 of unresolved rows
+        row_codes = np.vstack([row_codes, np.full((1, len(self.model_positions)), -1, dtype=np.int16)])
+        return row_codes[resolved].T
@@ -2,9 +2,19 @@ import os
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 import logging
+
+from avm_app.compressed import data_format, inner_name
+from avm_app.external_sort import DEFAULT_MEMORY_LIMIT_MB, external_sort_dedup
+from avm_app.vendor_registry import csv_read_options
+from avm_app.xlsx_reader import read_xlsx
+
 def read_file(file_path):
     """
-    Reads a file into a DataFrame. Applies special logic for files with "Freddie" in the name.
+    Reads a file into a DataFrame. CSVs are read with the vendor registry's
+    options for the vendor named in the file name (e.g. the header offset of
+    Freddie exports), with '|' or ',' detected from the first line otherwise.
+    CSVs may be .gz / .zip / .zst compressed and are decompressed as they are
+    parsed.
 
     Parameters:
     - file_path (str): The path to the file to be read.
@@ -17,19 +27,12 @@ def read_file(file_path):
         return pd.DataFrame()
 
     try:
-        # Check if the file name contains "Freddie"
-        if 'Freddie' in os.path.basename(file_path):
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                first_line = f.readline().strip()
-            if not first_line.startswith('RefNum'):
-                return pd.read_csv(file_path, skiprows=26)
-            else:
-                return pd.read_csv(file_path)
-        elif file_path.endswith('.csv'):  # Handle CSV files
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                first_line = f.readline().strip()
-            return pd.read_csv(file_path, delimiter='|' if '|' in first_line else ',')
-        elif file_path.endswith(('.xlsx', '.xls')):  # Handle Excel files
+        file_format = data_format(file_path)
+        if file_format == '.csv':  # Handle CSV files, compressed or not
+            return pd.read_csv(file_path, **csv_read_options(file_path))
+        elif file_format == '.xlsx':  # Stream .xlsx sheets without openpyxl
+            return read_xlsx(file_path)
+        elif file_format == '.xls':  # Handle legacy Excel files
             return pd.read_excel(file_path)
         else:
             logging.warning(f"Unsupported file format: {file_path}")
@@ -39,7 +42,8 @@ def read_file(file_path):
         return pd.DataFrame()
 
 
-def combine_files(folder_path, start_num, end_num, output_folder):
+def combine_files(folder_path, start_num, end_num, output_folder, sort_by_ref_id=False,
+                  memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, keep='first'):
     """
     Combines multiple CSV and Excel files into a single CSV file.
 
@@ -48,6 +52,12 @@ def combine_files(folder_path, start_num, end_num, output_folder):
     - start_num (int): The start number for filtering files by name.
     - end_num (int): The end number for filtering files by name.
     - output_folder (str): The path to the folder where the combined file will be saved.
+    - sort_by_ref_id (bool): Sort the output by Ref ID and keep one row per Ref ID,
+      with an external merge sort that holds about memory_limit_mb of rows in
+      memory whatever the size of the inputs (see external_sort_dedup).
+    - memory_limit_mb (int): Memory budget of the sorted combine.
+    - keep (str): 'first' or 'last': which of several rows with one Ref ID is kept,
+      in file name order then row order.
 
     Returns:
     - None
@@ -55,16 +65,12 @@ def combine_files(folder_path, start_num, end_num, output_folder):
     files_to_process = []
     # Iterate through files in the folder
     for file in os.listdir(folder_path):
-        # Filter files by extension and name containing numbers in the specified range
-        if file.endswith(('.csv', '.xlsx', '.xls')) and any(str(num) in file for num in range(start_num, end_num + 1)):
-            files_to_process.append(os.path.join(folder_path, file))
-
-    combined_df = pd.DataFrame()
-    # Use ThreadPoolExecutor to read files in parallel
-    with ThreadPoolExecutor() as executor:
-        # Read each file and concatenate the resulting DataFrames
-        for df in executor.map(read_file, files_to_process):
-            combined_df = pd.concat([combined_df, df])
+        # Filter files by extension and name containing numbers in the specified range,
+        # looking at the file inside compressed ones
+        file_path = os.path.join(folder_path, file)
+        name = inner_name(file_path)
+        if data_format(file_path) in ('.csv', '.xlsx', '.xls') and any(str(num) in name for num in range(start_num, end_num + 1)):
+            files_to_process.append(file_path)
 
     # Create the output folder if it doesn't exist
     if not os.path.exists(output_folder):
@@ -73,6 +79,19 @@ def combine_files(folder_path, start_num, end_num, output_folder):
     # Construct the output file name and path
     output_file_name = f"{os.path.basename(folder_path)}_{start_num}-{end_num}.csv"
     output_file_path = os.path.join(output_folder, output_file_name)
+
+    if sort_by_ref_id:
+        external_sort_dedup(sorted(files_to_process), output_file_path, memory_limit_mb=memory_limit_mb, keep=keep)
+        print(f"Combined file created: {output_file_path}")
+        return
+
+    combined_df = pd.DataFrame()
+    # Use ThreadPoolExecutor to read files in parallel
+    with ThreadPoolExecutor() as executor:
+        # Read each file and concatenate the resulting DataFrames
+        for df in executor.map(read_file, files_to_process):
+            combined_df = pd.concat([combined_df, df])
+
     # Save the combined DataFrame to a CSV file
     combined_df.to_csv(output_file_path, index=False)
     print(f"Combined file created: {output_file_path}")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from avm_app.data_processing import resolve_model_columns, resolve_vendor_columns
+from avm_app.vendor_registry import VENDORS
+
+# Benchmark columns the simulation reads; everything else is dropped at load.
+# Zip and CBSA are optional and used by ZIP- / CBSA-level cascades.
+BENCHMARK_COLUMNS = ['Ref ID', 'State', 'County', 'Zip', 'CBSA', 'FormName', 'ContractPrice', 'AppraisedValue']
+
+# Low-cardinality benchmark strings stored as categoricals
+BENCHMARK_CATEGORIES = ['State', 'County', 'Zip', 'CBSA', 'FormName']
+
+
+def compact_float(series):
+    """
+    Converts a column to float32 when every value survives the round trip
+    exactly (whole-dollar values, integer confidence scores), otherwise float64.
+    Non-numeric values become NaN.
+    """
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    narrowed = values.astype('float32')
+    if np.array_equal(narrowed.astype('float64').to_numpy(), values.to_numpy(), equal_nan=True):
+        return narrowed
+    return values
+
+
+def widen_floats(frame):
+    """
+    Returns frame with its float32 columns as float64 holding the shortest
+    decimal of each value (0.07678 rather than 0.0767800212...), for writing
+    to workbooks and JSON. Frames without float32 columns are returned as is.
+    """
+    float32_columns = [col for col in frame.columns if frame[col].dtype == np.float32]
+    if not float32_columns:
+        return frame
+    frame = frame.copy()
+    for col in float32_columns:
+        # astype(str) gives the shortest repr that round-trips the float32
+        frame[col] = frame[col].to_numpy().astype(str).astype('float64')
+    return frame
+
+
+def compact_ref_id(series):
+    """
+    Converts Ref IDs to nullable Int64 (truncating '123.0' to 123, like the
+    matcher does). Columns holding any non-numeric ID are returned unchanged.
+    """
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.isna().sum() > series.isna().sum():
+        return series
+    return np.trunc(numeric).astype('Int64')
+
+
+def compact_benchmark(benchmark_df):
+    """
+    Returns the benchmark with integer Ref IDs, categorical State / County /
+    FormName and compact numeric value columns.
+    """
+    benchmark_df = benchmark_df.copy()
+    if 'Ref ID' in benchmark_df.columns:
+        benchmark_df['Ref ID'] = compact_ref_id(benchmark_df['Ref ID'])
+    for col in BENCHMARK_CATEGORIES:
+        if col in benchmark_df.columns:
+            benchmark_df[col] = benchmark_df[col].astype('category').cat.remove_unused_categories()
+    for col in ['ContractPrice', 'AppraisedValue']:
+        if col in benchmark_df.columns:
+            benchmark_df[col] = compact_float(benchmark_df[col])
+    return benchmark_df
+
+
+def vendor_column_names(columns, column_phrases, model=None):
+    """
+    Returns, in file order, the columns that resolve_vendor_columns (or, for
+    a model, resolve_model_columns) picks for Ref ID, AVM value, confidence
+    score and FSD.
+    """
+    if model is None:
+        resolved = set(resolve_vendor_columns(columns, column_phrases).values())
+    else:
+        resolved = set(resolve_model_columns(model, columns, column_phrases).values())
+    return [col for col in columns if col in resolved]
+
+
+def compact_vendor_frame(model_df, column_phrases, model=None):
+    """
+    Reduces a vendor DataFrame to the columns resolved through column_phrases
+    (Ref ID, AVM value, confidence score, FSD), keeping their original names and
+    order so the matcher resolves them the same way. Ref IDs become Int64 and
+    the numeric columns are narrowed with compact_float.
+
+    When model's registry entry maps columns explicitly, the resolved columns
+    are renamed to the field names instead, which column_phrases resolve
+    back to themselves.
+    """
+    resolved = resolve_model_columns(model, model_df.columns, column_phrases)
+    compact_df = model_df[vendor_column_names(model_df.columns, column_phrases, model)].copy()
+    for field, col in resolved.items():
+        if col is None:
+            continue
+        if field == 'Ref ID':
+            compact_df[col] = pd.to_numeric(compact_df[col], errors='coerce').astype('Int64')
+        else:
+            compact_df[col] = compact_float(compact_df[col])
+    if model is not None and VENDORS.rule(model).columns:
+        compact_df = compact_df.rename(columns={col: field for field, col in resolved.items() if col is not None})
+    return compact_df
@@ -0,0 +1,140 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from avm_app.compact import compact_benchmark
+from avm_app.compressed import inner_name
+from avm_app.file_operations import write_summary_sheets
+from avm_app.simulation import benchmark_values_for
+
+# Columns that decide a row's match: its Ref ID and the location the cascade
+# resolves. Rows agreeing on all of them are matched once for all benchmarks.
+MATCH_KEY_COLUMNS = ['Ref ID', 'State', 'County', 'Zip', 'CBSA']
+
+COMPARISON_COLUMNS = ['Cascade', 'Benchmark', 'Benchmark Rows', 'Hits', 'Hit Rate', 'PPE10',
+                      'Average Error', 'Median Error', 'Standard Deviation']
+COMPARISON_PERCENT_COLUMNS = ['Hit Rate', 'PPE10', 'Average Error', 'Median Error', 'Standard Deviation']
+
+
+def benchmark_names(benchmark_files):
+    """
+    Short names of benchmark files (file name without extensions, looking
+    inside compressed files), numbered when two files share a name.
+    """
+    names = [os.path.splitext(inner_name(path))[0] for path in benchmark_files]
+    counts = pd.Series(names).value_counts()
+    seen = {}
+    unique_names = []
+    for name in names:
+        if counts[name] > 1:
+            seen[name] = seen.get(name, 0) + 1
+            name = f"{name} ({seen[name]})"
+        unique_names.append(name)
+    return unique_names
+
+
+def union_benchmark(benchmark_dfs):
+    """
+    Merges several benchmarks into one frame holding each distinct match key
+    (MATCH_KEY_COLUMNS) once, so a Ref ID shared by several benchmarks is
+    probed in the vendor data only once.
+
+    Returns (union_df, union_rows): union_rows[i] gives, for every row of
+    benchmark_dfs[i], its row position in union_df (see split_results).
+    """
+    frames = [df.reset_index(drop=True) for df in benchmark_dfs]
+    combined = pd.concat(frames, ignore_index=True)
+    key_columns = [col for col in MATCH_KEY_COLUMNS if col in combined.columns]
+    codes = combined[key_columns].astype(str).groupby(key_columns, sort=False).ngroup().to_numpy()
+    # ngroup numbers keys in order of first appearance, so union row i is key i
+    _, first_rows = np.unique(codes, return_index=True)
+    union_df = compact_benchmark(combined.iloc[first_rows].reset_index(drop=True))
+
+    bounds = np.cumsum([0] + [len(df) for df in frames])
+    union_rows = [codes[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    logging.info(f"Benchmarks of {len(combined)} rows share {len(combined) - len(union_df)} match keys; matching {len(union_df)} rows")
+    return union_df, union_rows
+
+
+def split_results(union_results, benchmark_df, union_rows):
+    """
+    The results frame of one benchmark, taken from the results of its union
+    (see union_benchmark): the match columns come from the union rows, the
+    Ref ID, location, benchmark value and % diff from the benchmark itself.
+    """
+    benchmark_df = benchmark_df.reset_index(drop=True)
+    results_df = union_results.iloc[union_rows].reset_index(drop=True)
+    benchmark_values = np.asarray(benchmark_values_for(benchmark_df), dtype='float64')
+    for col in ['Ref ID', 'State', 'County']:
+        results_df[col] = benchmark_df[col]
+    results_df['Benchmark Value'] = benchmark_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results_df['% Diff between AVM and Benchmark'] = (
+            (results_df['AVM Value'].to_numpy(dtype='float64') - benchmark_values) / benchmark_values
+        ).astype(np.float32)
+    return results_df
+
+
+def comparison_entry(cascade_name, benchmark_name, results_df):
+    """
+    Headline metrics of one benchmark's results for the comparison workbook:
+    rows, hits, hit rate, PPE10 (over hits with a non-zero benchmark value)
+    and the average / median / standard deviation of the % diff, plus hits
+    per AVM under 'vendor_hits'.
+    """
+    hits = results_df['AVM Value'].notna()
+    benchmark_values = results_df['Benchmark Value']
+    valid = hits & benchmark_values.notna() & (benchmark_values != 0)
+    within_10 = ((results_df['AVM Value'][valid] - benchmark_values[valid]).abs() / benchmark_values[valid].abs()) <= 0.10
+    diff = results_df['% Diff between AVM and Benchmark'][hits].astype('float64')
+    row_count = len(results_df)
+    return {
+        'Cascade': cascade_name,
+        'Benchmark': benchmark_name,
+        'Benchmark Rows': row_count,
+        'Hits': int(hits.sum()),
+        'Hit Rate': hits.sum() / row_count if row_count else np.nan,
+        'PPE10': within_10.sum() / valid.sum() if valid.any() else np.nan,
+        'Average Error': diff.mean(),
+        'Median Error': diff.median(),
+        'Standard Deviation': diff.std(),
+        'vendor_hits': results_df['AVM Name'][hits].value_counts().to_dict(),
+    }
+
+
+def comparison_tables(entries):
+    """
+    Tables of the comparison workbook from comparison_entry dicts, in the
+    (sheet name, DataFrame, write index, formats) form of summary_tables:
+    the metrics of every cascade and benchmark, and the hits of each AVM with
+    one column per benchmark.
+    """
+    metrics_df = pd.DataFrame([{col: entry[col] for col in COMPARISON_COLUMNS} for entry in entries], columns=COMPARISON_COLUMNS)
+
+    benchmarks = list(dict.fromkeys(entry['Benchmark'] for entry in entries))
+    vendor_rows = {}
+    for entry in entries:
+        for avm_name, count in entry['vendor_hits'].items():
+            row = vendor_rows.setdefault((entry['Cascade'], avm_name), {'Cascade': entry['Cascade'], 'AVM Name': avm_name})
+            row[entry['Benchmark']] = count
+    vendor_df = pd.DataFrame(list(vendor_rows.values()), columns=['Cascade', 'AVM Name'] + benchmarks)
+    vendor_df[benchmarks] = vendor_df[benchmarks].fillna(0).astype('int64')
+
+    return [
+        ('Benchmark Comparison', metrics_df, False, dict.fromkeys(COMPARISON_PERCENT_COLUMNS, '0.00%')),
+        ('AVM Hits by Benchmark', vendor_df, False, {}),
+    ]
+
+
+def write_comparison_to_excel(entries, output_file):
+    """
+    Writes the comparison workbook of a multi-benchmark run.
+    """
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        write_summary_sheets(writer, comparison_tables(entries))
+
+
+def comparison_output_file(output_directory, avm_folder):
+    return os.path.join(output_directory, f"{os.path.basename(os.path.normpath(avm_folder))}_benchmark_comparison.xlsx")
@@ -0,0 +1,111 @@
+import gzip
+import io
+import os
+import struct
+import zipfile
+from contextlib import contextmanager
+
+# Compressed containers read as streams, by file name suffix, with the
+# compression names pandas.read_csv infers for them
+COMPRESSIONS = {'.gz': 'gzip', '.zip': 'zip', '.zst': 'zstd'}
+
+
+def compression_of(path):
+    """The compression of path from its suffix ('gzip', 'zip', 'zstd'), or None."""
+    return COMPRESSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def _zip_member(archive, path):
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    if len(members) != 1:
+        raise ValueError(f"{path} must hold exactly one file, not {len(members)}")
+    return members[0]
+
+
+def inner_name(path):
+    """
+    Name of the data file behind path: 'VeroValue.csv.gz' -> 'VeroValue.csv',
+    'drop.zip' -> the base name of its single member. Uncompressed paths give
+    their own base name. Keyword matching and format checks use this name.
+    """
+    base_name = os.path.basename(path)
+    compression = compression_of(base_name)
+    if compression is None:
+        return base_name
+    if compression == 'zip':
+        try:
+            with zipfile.ZipFile(path) as archive:
+                return os.path.basename(_zip_member(archive, path).filename)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            pass
+    return os.path.splitext(base_name)[0]
+
+
+def data_format(path):
+    """
+    Lower-case suffix of inner_name(path), e.g. '.csv' for 'x.csv.gz'. None
+    for workbooks inside a compressed container: .xlsx files are zip
+    archives already and are only read as they are.
+    """
+    suffix = os.path.splitext(inner_name(path))[1].lower()
+    if compression_of(path) is not None and suffix != '.csv':
+        return None
+    return suffix
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading .zst files needs the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+@contextmanager
+def open_text(path, encoding='utf-8', errors='replace'):
+    """
+    Opens a plain or compressed text file for reading, decompressing as it
+    is read.
+    """
+    compression = compression_of(path)
+    if compression is None:
+        with open(path, 'r', encoding=encoding, errors=errors) as f:
+            yield f
+    elif compression == 'gzip':
+        with gzip.open(path, 'rt', encoding=encoding, errors=errors) as f:
+            yield f
+    elif compression == 'zip':
+        with zipfile.ZipFile(path) as archive, archive.open(_zip_member(archive, path)) as member:
+            yield io.TextIOWrapper(member, encoding=encoding, errors=errors)
+    else:
+        with open(path, 'rb') as raw, _zstandard().ZstdDecompressor().stream_reader(raw) as reader:
+            yield io.TextIOWrapper(reader, encoding=encoding, errors=errors)
+
+
+def uncompressed_size(path):
+    """
+    Best estimate of path's decompressed size in bytes, read from the
+    container's metadata: the zip member size, the gzip trailer (exact up to
+    4 GiB) or the zstd frame header when it records one. Falls back to the
+    size on disk.
+    """
+    size = os.path.getsize(path)
+    compression = compression_of(path)
+    try:
+        if compression == 'zip':
+            with zipfile.ZipFile(path) as archive:
+                return _zip_member(archive, path).file_size
+        if compression == 'gzip' and size >= 4:
+            with open(path, 'rb') as f:
+                f.seek(-4, os.SEEK_END)
+                trailer_size = struct.unpack('<I', f.read(4))[0]
+            # The trailer holds the size modulo 2**32
+            return max(trailer_size, size)
+        if compression == 'zstd':
+            with open(path, 'rb') as f:
+                content_size = _zstandard().frame_content_size(f.read(18))
+            if content_size > 0:
+                return content_size
+    except (OSError, ValueError, ImportError, zipfile.BadZipFile):
+        pass
+    return size
@@ -0,0 +1,160 @@
+import logging
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from avm_app.avm_utils import find_vendor_file, read_benchmark_file, read_cascade_file
+from avm_app.cascade_index import CascadeIndex
+from avm_app.compressed import data_format
+from avm_app.data_processing import column_phrases, resolve_model_columns
+from avm_app.profiles import load_profile
+from avm_app.scheduler import expand_jobs, load_job_spec
+from avm_app.simulation import cascade_models, numeric_ref_ids
+from avm_app.sqlite_store import INGEST_CHUNK_ROWS, iter_vendor_chunks, read_vendor_header
+
+# Vendor file states reported by scan_vendor; anything but 'ok' is flagged
+VENDOR_OK = 'ok'
+VENDOR_MISSING = 'missing file'
+VENDOR_UNSUPPORTED = 'unsupported format'
+VENDOR_NO_REF_ID = 'no Ref ID column'
+VENDOR_UNREADABLE = 'unreadable'
+VENDOR_NO_OVERLAP = 'no benchmark Ref IDs'
+
+
+def vendor_ref_ids(model, file_path, column_phrases, chunksize=INGEST_CHUNK_ROWS):
+    """
+    Reads only the Ref ID column of a model's vendor file and returns its
+    distinct numeric Ref IDs as a sorted int64 array (truncated like the
+    vendor stores do), or None when no Ref ID column is found.
+    """
+    ref_id_column = resolve_model_columns(model, read_vendor_header(file_path, model), column_phrases)['Ref ID']
+    if ref_id_column is None:
+        return None
+    chunks = []
+    for chunk in iter_vendor_chunks(file_path, {ref_id_column}, chunksize, model):
+        ids = pd.to_numeric(chunk[ref_id_column], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        chunks.append(np.unique(np.trunc(ids[~np.isnan(ids)]).astype('int64')))
+    return np.unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype='int64')
+
+
+def scan_vendor(model, avm_folder, column_phrases):
+    """
+    Locates a model's vendor file the way read_files_once does and reads its
+    Ref IDs. Returns a dict of model, file, status (VENDOR_*) and ref_ids
+    (None unless the file could be read).
+    """
+    file_name = find_vendor_file(avm_folder, model)
+    scan = {'model': model, 'file': file_name, 'status': VENDOR_OK, 'ref_ids': None}
+    if not file_name:
+        scan['status'] = VENDOR_MISSING
+        return scan
+    file_path = os.path.join(avm_folder, file_name)
+    if data_format(file_path) not in ('.csv', '.xlsx'):
+        scan['status'] = VENDOR_UNSUPPORTED
+        return scan
+    try:
+        scan['ref_ids'] = vendor_ref_ids(model, file_path, column_phrases)
+    except Exception as e:
+        logging.warning(f"Could not read Ref IDs from {file_path}: {e}")
+        scan['status'] = VENDOR_UNREADABLE
+        return scan
+    if scan['ref_ids'] is None:
+        scan['status'] = VENDOR_NO_REF_ID
+    return scan
+
+
+def coverage_tables(benchmark_df, cascades, vendor_scans):
+    """
+    Builds the dry-run coverage report of one benchmark.
+
+    - cascades: {cascade name: cascade DataFrame}
+    - vendor_scans: {model: scan_vendor result} covering every cascade model
+
+    Returns (vendor_table, cascade_table). The vendor table gives, per model,
+    how many benchmark rows its file has a Ref ID for. The cascade table gives
+    the best-case hit rate of each cascade: the share of benchmark rows for
+    which at least one of the models the row resolves to has its Ref ID,
+    i.e. the hit rate if no confidence or FSD threshold rejected anything.
+    """
+    benchmark_df = benchmark_df.reset_index(drop=True)
+    ref_ids, valid = numeric_ref_ids(benchmark_df)
+    row_count = len(benchmark_df)
+
+    covered = {}
+    statuses = {}
+    vendor_rows = []
+    for model, scan in vendor_scans.items():
+        status = scan['status']
+        if scan['ref_ids'] is not None:
+            covered[model] = valid & np.isin(ref_ids, scan['ref_ids'])
+            if row_count and not covered[model].any():
+                status = VENDOR_NO_OVERLAP
+        statuses[model] = status
+        rows_covered = int(covered[model].sum()) if model in covered else 0
+        vendor_rows.append({
+            'Model': model,
+            'File': scan['file'],
+            'Status': status,
+            'Vendor Ref IDs': len(scan['ref_ids']) if scan['ref_ids'] is not None else 0,
+            'Benchmark Rows Covered': rows_covered,
+            'Coverage': rows_covered / row_count if row_count else np.nan,
+        })
+    vendor_table = pd.DataFrame(vendor_rows, columns=['Model', 'File', 'Status', 'Vendor Ref IDs',
+                                                      'Benchmark Rows Covered', 'Coverage'])
+
+    cascade_rows = []
+    for cascade_name, cascade_df in cascades.items():
+        model_names = [model for model in cascade_models(cascade_df) if isinstance(model, str)]
+        cascade_index = CascadeIndex(cascade_df)
+        codes = cascade_index.model_codes(cascade_index.resolve(benchmark_df), model_names)
+        # One coverage row per model plus an all-False row picked by code -1
+        masks = np.vstack([covered.get(model, np.zeros(row_count, dtype=bool)) for model in model_names]
+                          + [np.zeros(row_count, dtype=bool)])
+        reachable = np.zeros(row_count, dtype=bool)
+        for position_codes in codes:
+            reachable |= masks[position_codes, np.arange(row_count)]
+        max_hits = int(reachable.sum())
+        cascade_rows.append({
+            'Cascade': cascade_name,
+            'Benchmark Rows': row_count,
+            'Max Hits': max_hits,
+            'Max Hit Rate': max_hits / row_count if row_count else np.nan,
+            'Flagged Models': ', '.join(f"{model} ({statuses[model]})" for model in model_names if statuses[model] != VENDOR_OK),
+        })
+    cascade_table = pd.DataFrame(cascade_rows, columns=['Cascade', 'Benchmark Rows', 'Max Hits', 'Max Hit Rate', 'Flagged Models'])
+    return vendor_table, cascade_table
+
+
+def run_coverage_spec(spec, profiles_data):
+    """
+    Dry run of a job specification (see load_job_spec): for every benchmark
+    file x AVM folder pair, reads the form-filtered benchmark, the cascades
+    and only the Ref ID column of each referenced vendor file, and returns a
+    list of {'benchmark_file', 'avm_folder', 'vendors', 'cascades'} reports
+    (see coverage_tables). Each vendor file is scanned once however many
+    benchmarks use it. Nothing is matched or written.
+    """
+    if isinstance(spec, str):
+        spec = load_job_spec(spec)
+    _, desired_forms, _, _ = load_profile(profiles_data, spec.get('profile', 'Default'))
+
+    cascade_files = defaultdict(list)
+    for job in expand_jobs(spec):
+        cascade_files[(job['benchmark_file'], job['avm_folder'])].append(job['cascade_file'])
+
+    vendor_scans = {}
+    reports = []
+    for (benchmark_file, avm_folder), cascade_paths in cascade_files.items():
+        benchmark_df = read_benchmark_file(benchmark_file, desired_forms)
+        cascades = {os.path.basename(path): read_cascade_file(path) for path in cascade_paths}
+        models = sorted({model for cascade_df in cascades.values() for model in cascade_models(cascade_df) if isinstance(model, str)})
+        for model in models:
+            if (avm_folder, model) not in vendor_scans:
+                vendor_scans[(avm_folder, model)] = scan_vendor(model, avm_folder, column_phrases)
+        vendor_table, cascade_table = coverage_tables(benchmark_df, cascades,
+                                                      {model: vendor_scans[(avm_folder, model)] for model in models})
+        reports.append({'benchmark_file': benchmark_file, 'avm_folder': avm_folder,
+                        'vendors': vendor_table, 'cascades': cascade_table})
+    return reports
@@ -23,29 +23,45 @@ import pandas as pd
 import numpy as np
 import logging
 
+from avm_app.vendor_registry import VENDORS
+
 logging.basicConfig(level=logging.DEBUG)
 
+def resolve_vendor_columns(columns, column_phrases):
+    """
+    Resolves the vendor columns holding each canonical field ('AVM Value',
+    'Conf Score', 'Ref ID', 'FSD'). For each field the first column (in file
+    order) matching any of its phrases wins; unmatched fields map to None.
+    """
+    resolved = {}
+    for field, phrases in column_phrases.items():
+        resolved[field] = next(
+            (col for col in columns if any((phrase(col) if callable(phrase) else phrase.lower() in col.lower()) for phrase in phrases)),
+            None
+        )
+    return resolved
+
+def resolve_model_columns(model, columns, column_phrases):
+    """
+    resolve_vendor_columns for one model's file: columns named in the model's
+    registry entry take precedence over column_phrases.
+    """
+    resolved = resolve_vendor_columns(columns, column_phrases)
+    for field, col in VENDORS.rule(model).columns.items():
+        if col in columns:
+            resolved[field] = col
+    return resolved
+
 def find_avm_score_parallel(model_files, ref_id, model_file_data, column_phrases, min_conf_scores, max_fsd_values):
     for model_num, model_name in model_files.items():
         if model_name in model_file_data:
             model_df = model_file_data[model_name]
 
-            avm_column_name = next(
-                (col for col in model_df.columns if any((phrase(col) if callable(phrase) else phrase.lower() in col.lower()) for phrase in column_phrases['AVM Value'])),
-                None
-            )
-            conf_column_name = next(
-                (col for col in model_df.columns if any(phrase.lower() in col.lower() for phrase in column_phrases['Conf Score'])),
-                None
-            )
-            ref_id_column_name = next(
-                (col for col in model_df.columns if any(phrase.lower() in col.lower() for phrase in column_phrases['Ref ID'])),
-                None
-            )
-            fsd_column_name = next(
-                (col for col in model_df.columns if any(phrase.lower() in col.lower() for phrase in column_phrases['FSD'])),
-                None
-            )
+            resolved = resolve_vendor_columns(model_df.columns, column_phrases)
+            avm_column_name = resolved['AVM Value']
+            conf_column_name = resolved['Conf Score']
+            ref_id_column_name = resolved['Ref ID']
+            fsd_column_name = resolved['FSD']
             logging.debug(f"Model: {model_name}, AVM Column: {avm_column_name}, Conf Column: {conf_column_name}, Ref ID Column: {ref_id_column_name}, FSD Column: {fsd_column_name}")
 
             # Normalize Ref ID types for matching
@@ -54,7 +70,8 @@ def find_avm_score_parallel(model_files, ref_id, model_file_data, column_phrases
             except:
                 ref_id_numeric = ref_id
 
-            model_df[ref_id_column_name] = pd.to_numeric(model_df[ref_id_column_name], errors='coerce').astype('Int64')
+            if ref_id_column_name and model_df[ref_id_column_name].dtype != 'Int64':
+                model_df[ref_id_column_name] = pd.to_numeric(model_df[ref_id_column_name], errors='coerce').astype('Int64')
 
             if ref_id_column_name and avm_column_name:
                 avm_value = model_df[model_df[ref_id_column_name] == ref_id_numeric][avm_column_name]
@@ -74,19 +91,18 @@ def find_avm_score_parallel(model_files, ref_id, model_file_data, column_phrases
                             if pd.notna(fsd_value_numeric):
                                 use_fsd_filtering = True
 
+                    rule = VENDORS.rule(model_name)
                     if use_fsd_filtering:
-                        if fsd_value_numeric > 1:
-                            fsd_value_numeric /= 100
+                        fsd_value_numeric = float(rule.fsd(fsd_value_numeric))
+                    if use_fsd_filtering and rule.filters_fsd:
                         max_fsd_value = max_fsd_values.get(model_name, float('inf'))
                         if fsd_value_numeric > max_fsd_value:
                             continue  # Skip due to FSD filter
 
                     # Confidence score filtering
-                    if model_name not in ['ClearAVMv3', 'Freddie Mac Home Value Explorer']:
+                    if rule.filters_confidence:
                         if conf_score is not None and not conf_score.empty and not pd.isna(conf_score.iloc[0]):
-                            conf_score_numeric = pd.to_numeric(conf_score.iloc[0], errors='coerce')
-                            if model_name == 'iAVM':
-                                conf_score_numeric *= 100
+                            conf_score_numeric = rule.confidence(pd.to_numeric(conf_score.iloc[0], errors='coerce'))
                             min_conf_score = min_conf_scores.get(model_name, 0)
                             if conf_score_numeric >= min_conf_score:
                                 return avm_val, conf_score_numeric, fsd_value_numeric, model_num, model_name
@@ -94,3 +110,60 @@ def find_avm_score_parallel(model_files, ref_id, model_file_data, column_phrases
                         return avm_val, None, fsd_value_numeric, model_num, model_name
     return None, None, None, None, None
 
+
+def match_batch(ref_ids, row_models, store, min_conf_scores, max_fsd_values):
+    """
+    Vectorized counterpart of find_avm_score_parallel for a whole batch.
+
+    - ref_ids: int64 array of benchmark Ref IDs (rows whose ID is not numeric
+      should be masked out by the caller through row_models).
+    - row_models: list of (model position, object array of model names per row)
+      in cascade order; None or names missing from the store are skipped.
+    - store: anything with `model in store` and store.lookup(model, ref_ids)
+      returning (found, avm, conf, fsd) arrays.
+
+    Applies the same registry FSD and confidence rules as find_avm_score_parallel and
+    returns a dict of arrays: avm, conf, fsd, model_name, model_position.
+    """
+    row_count = len(ref_ids)
+    avm_values = np.full(row_count, np.nan)
+    conf_scores = np.full(row_count, np.nan)
+    fsd_values = np.full(row_count, np.nan)
+    model_names = np.full(row_count, None, dtype=object)
+    model_positions = np.full(row_count, None, dtype=object)
+    pending = np.ones(row_count, dtype=bool)
+
+    for model_num, models in row_models:
+        for model_name in pd.unique(models[pending]):
+            if not isinstance(model_name, str) or model_name not in store:
+                continue
+            rows = np.flatnonzero(pending & (models == model_name))
+            found, avm, conf, fsd = store.lookup(model_name, ref_ids[rows])
+            accepted = found & ~np.isnan(avm)
+
+            # Units, scales and filter exemptions come from the vendor registry
+            rule = VENDORS.rule(model_name)
+            fsd = rule.fsd(fsd)
+            if rule.filters_fsd:
+                accepted &= ~(~np.isnan(fsd) & (fsd > max_fsd_values.get(model_name, float('inf'))))
+            if rule.filters_confidence:
+                conf = rule.confidence(conf)
+                accepted &= ~np.isnan(conf) & (conf >= min_conf_scores.get(model_name, 0))
+            else:
+                conf = np.full(len(rows), np.nan)
+
+            hit_rows = rows[accepted]
+            avm_values[hit_rows] = avm[accepted]
+            conf_scores[hit_rows] = conf[accepted]
+            fsd_values[hit_rows] = fsd[accepted]
+            model_names[hit_rows] = model_name
+            model_positions[hit_rows] = model_num
+            pending[hit_rows] = False
+
+    return {
+        'avm': avm_values,
+        'conf': conf_scores,
+        'fsd': fsd_values,
+        'model_name': model_names,
+        'model_position': model_positions,
+    }
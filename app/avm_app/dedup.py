@@ -0,0 +1,113 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from avm_app.data_processing import resolve_model_columns
+from avm_app.vendor_registry import VENDORS
+
+# Valuation date column names tried, in order, when a vendor's registry entry
+# does not name its date_column
+DATE_PHRASES = ['Valuation Date', 'ValuationDate', 'Valuation_Date', 'AVM Date', 'Value Date', 'Run Date', 'Date']
+
+
+def date_column(model, columns):
+    """
+    The valuation date column of a model's file: the registry's date_column
+    when present, otherwise the first column containing one of DATE_PHRASES
+    (phrases tried in order, case-insensitive). None when there is none.
+    """
+    rule = VENDORS.rule(model)
+    if rule.date_column:
+        return rule.date_column if rule.date_column in columns else None
+    for phrase in DATE_PHRASES:
+        for col in columns:
+            if phrase.lower() in str(col).lower():
+                return col
+    return None
+
+
+def dedup_columns(model, columns):
+    """
+    Columns besides the resolved vendor fields that dedup_vendor_frame needs
+    for model's dedup rule (the valuation date for 'latest').
+    """
+    if VENDORS.rule(model).dedup != 'latest':
+        return []
+    col = date_column(model, columns)
+    return [col] if col is not None else []
+
+
+def dedup_sort_key(model, frame, resolved):
+    """
+    Float64 ranking of frame's rows under model's dedup rule: the row with the
+    smallest key wins each Ref ID, NaN ranks last and ties keep file order.
+    Returns None for 'first' (file order alone decides) and when the column
+    the rule ranks on is missing.
+
+    - resolved: resolve_model_columns of frame's columns
+    """
+    rule = VENDORS.rule(model)
+
+    def numeric(col):
+        return pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+    if rule.dedup == 'highest_confidence' and resolved['Conf Score']:
+        return -numeric(resolved['Conf Score'])
+    if rule.dedup == 'lowest_fsd' and resolved['FSD']:
+        return np.asarray(rule.fsd(numeric(resolved['FSD'])), dtype='float64')
+    if rule.dedup == 'latest':
+        col = date_column(model, frame.columns)
+        if col is not None:
+            dates = pd.to_datetime(frame[col], errors='coerce')
+            stamps = dates.to_numpy(dtype='datetime64[ns]').astype('int64').astype('float64')
+            stamps[dates.isna().to_numpy()] = np.nan
+            return -stamps
+    return None
+
+
+def dedup_vendor_frame(model_df, model, column_phrases):
+    """
+    Collapses the rows of a vendor DataFrame that share a Ref ID to the one
+    model's registry dedup rule picks: the latest valuation date, the highest
+    confidence, the lowest FSD or the first row. Surviving rows keep their
+    file order; rows without a numeric Ref ID are left alone.
+
+    Returns (deduplicated frame, number of rows collapsed).
+    """
+    resolved = resolve_model_columns(model, model_df.columns, column_phrases)
+    if not resolved['Ref ID']:
+        return model_df, 0
+
+    ref_ids = np.trunc(pd.to_numeric(model_df[resolved['Ref ID']], errors='coerce').to_numpy(dtype='float64', na_value=np.nan))
+    keys = pd.DataFrame({'ref_id': ref_ids})
+    sort_key = dedup_sort_key(model, model_df, resolved)
+    if sort_key is None:
+        if VENDORS.rule(model).dedup != 'first':
+            logging.warning(f"{model}: no column for dedup rule {VENDORS.rule(model).dedup!r}, keeping the first row per Ref ID")
+    else:
+        keys['key'] = sort_key
+        keys = keys.sort_values('key', kind='stable', na_position='last')
+    duplicated = (keys['ref_id'].duplicated() & keys['ref_id'].notna()).sort_index().to_numpy()
+
+    collapsed = int(duplicated.sum())
+    if not collapsed:
+        return model_df, 0
+    logging.info(f"{model}: collapsed {collapsed} duplicate Ref ID rows of {len(model_df)} ({VENDORS.rule(model).dedup})")
+    return model_df[~duplicated], collapsed
+
+
+def dedup_benchmark(benchmark_df):
+    """
+    Keeps the first benchmark row of each Ref ID, so every property is
+    simulated once. Rows without a Ref ID are kept. Returns (benchmark,
+    number of rows collapsed).
+    """
+    if 'Ref ID' not in benchmark_df.columns:
+        return benchmark_df, 0
+    duplicated = (benchmark_df['Ref ID'].duplicated() & benchmark_df['Ref ID'].notna()).to_numpy()
+    collapsed = int(duplicated.sum())
+    if not collapsed:
+        return benchmark_df, 0
+    logging.info(f"Benchmark: collapsed {collapsed} duplicate Ref ID rows of {len(benchmark_df)}")
+    return benchmark_df[~duplicated], collapsed
@@ -0,0 +1,290 @@
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from avm_app.compressed import data_format
+from avm_app.data_processing import column_phrases, resolve_vendor_columns
+from avm_app.limits import DEFAULT_MEMORY_LIMIT_MB
+from avm_app.vendor_registry import csv_read_options
+from avm_app.xlsx_reader import iter_xlsx_chunks, read_xlsx_header
+
+# Rows of the first chunk read, before the size of a row is known
+INITIAL_READ_ROWS = 1000
+
+# A read chunk takes at most this share of the budget
+READ_CHUNKS_PER_BUDGET = 4
+
+# Fewest rows read at a time, whatever the budget
+MIN_READ_ROWS = 100
+
+# A sorted batch briefly exists twice (frame and sorted copy) plus the keys
+SORT_OVERHEAD = 3
+
+# Most runs merged at once; more runs are first merged in groups. Tight
+# budgets merge fewer at once (see _merge_fanin).
+MAX_MERGE_FANIN = 64
+
+# Fewest rows buffered per run while merging, whatever the budget
+MIN_MERGE_ROWS = 100
+
+# Helper columns carried through the runs: sort key (numeric Ref ID) and
+# input sequence (order of the row across all inputs)
+KEY_COLUMN = '__ref_key'
+SEQ_COLUMN = '__seq'
+
+
+def _header(file_path):
+    file_format = data_format(file_path)
+    if file_format == '.csv':
+        columns = pd.read_csv(file_path, nrows=0, **csv_read_options(file_path)).columns
+    elif file_format == '.xlsx':
+        columns = read_xlsx_header(file_path)
+    else:
+        columns = pd.read_excel(file_path, nrows=0).columns
+    return [str(col).strip() for col in columns]
+
+
+def _as_text(chunk):
+    """Cells as strings, '' where empty, so runs round-trip exactly."""
+    chunk = chunk.astype(object)
+    return chunk.where(chunk.notna(), '').astype(str)
+
+
+def _iter_file_chunks(file_path, chunk_rows):
+    """
+    Yields a file's rows as string DataFrames, streaming CSVs (plain or
+    compressed) and XLSX sheets. chunk_rows() gives the size of the next
+    chunk, so it can follow the row size measured so far; XLSX sheets keep
+    the size given when they are opened. Legacy .xls files are read whole.
+    """
+    file_format = data_format(file_path)
+    if file_format == '.csv':
+        with pd.read_csv(file_path, iterator=True, dtype=str, keep_default_na=False,
+                         **csv_read_options(file_path)) as reader:
+            while True:
+                try:
+                    yield reader.get_chunk(chunk_rows())
+                except StopIteration:
+                    return
+    elif file_format == '.xlsx':
+        for chunk in iter_xlsx_chunks(file_path, chunksize=chunk_rows()):
+            yield _as_text(chunk)
+    else:
+        sheet = _as_text(pd.read_excel(file_path))
+        start = 0
+        while start < len(sheet):
+            stop = start + chunk_rows()
+            yield sheet.iloc[start:stop]
+            start = stop
+
+
+def ref_id_keys(ref_ids):
+    """Float64 sort keys of Ref IDs: the truncated number, +inf when not numeric."""
+    keys = np.trunc(pd.to_numeric(pd.Series(ref_ids), errors='coerce').to_numpy(dtype='float64', na_value=np.nan))
+    return np.where(np.isnan(keys), np.inf, keys)
+
+
+def _sort_dedup(frame, keep):
+    """
+    Sorts by key then input sequence and keeps one row (the first or last
+    by sequence) per Ref ID.
+    """
+    frame = frame.sort_values([KEY_COLUMN, SEQ_COLUMN], kind='stable')
+    return frame[~frame[KEY_COLUMN].duplicated(keep=keep).to_numpy()]
+
+
+class _RunReader:
+    """
+    Reads one sorted run back in chunks, holding the rows not yet merged.
+    """
+
+    def __init__(self, path, chunksize):
+        self._reader = pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False)
+        self.exhausted = False
+        self.buffer = None
+        self.read_more()
+
+    def read_more(self):
+        try:
+            chunk = next(self._reader)
+        except StopIteration:
+            self.exhausted = True
+            self._reader.close()
+            return
+        chunk[KEY_COLUMN] = chunk[KEY_COLUMN].astype('float64')
+        chunk[SEQ_COLUMN] = chunk[SEQ_COLUMN].astype('int64')
+        self.buffer = chunk if self.buffer is None or self.buffer.empty else pd.concat([self.buffer, chunk], ignore_index=True)
+
+    @property
+    def last_key(self):
+        return self.buffer[KEY_COLUMN].iloc[-1]
+
+    def take(self, mask):
+        taken = self.buffer[mask]
+        self.buffer = self.buffer[~mask]
+        return taken
+
+
+def _merge_runs(run_paths, columns, output_path, keep, merge_rows, keep_helpers):
+    """
+    k-way merge of sorted runs into output_path, deduplicating as it goes.
+
+    Each round takes, from every run's buffer, the rows whose key is below
+    the smallest last buffered key of the runs not yet fully read: no run
+    can still hold rows with those keys, so they are final.
+    """
+    readers = [_RunReader(path, merge_rows) for path in run_paths]
+    written = 0
+    header = True
+    output_columns = columns + [KEY_COLUMN, SEQ_COLUMN] if keep_helpers else columns
+    while True:
+        readers = [reader for reader in readers if not (reader.exhausted and (reader.buffer is None or reader.buffer.empty))]
+        if not readers:
+            break
+        for reader in readers:
+            if (reader.buffer is None or reader.buffer.empty) and not reader.exhausted:
+                reader.read_more()
+        open_keys = [reader.last_key for reader in readers if not reader.exhausted and reader.buffer is not None and not reader.buffer.empty]
+        bound = min(open_keys) if open_keys else None
+
+        batches = []
+        for reader in readers:
+            if reader.buffer is None or reader.buffer.empty:
+                continue
+            keys = reader.buffer[KEY_COLUMN].to_numpy()
+            if bound is None:
+                mask = np.ones(len(keys), dtype=bool)
+            else:
+                mask = keys < bound
+            batches.append(reader.take(mask))
+        batch = pd.concat(batches, ignore_index=True) if batches else None
+
+        if batch is None or batch.empty:
+            # Every open run's buffer holds only the bound key: read further
+            for reader in readers:
+                if not reader.exhausted and reader.buffer is not None and not reader.buffer.empty and reader.last_key == bound:
+                    reader.read_more()
+            continue
+
+        batch = _sort_dedup(batch, keep)
+        batch[output_columns].to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        written += len(batch)
+
+    if header:
+        pd.DataFrame(columns=output_columns).to_csv(output_path, index=False)
+    return written
+
+
+def external_sort_dedup(file_paths, output_path, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, keep='first'):
+    """
+    Combines file_paths into one CSV at output_path sorted by Ref ID with
+    one row per Ref ID, holding about memory_limit_mb of rows at a time.
+
+    Files are read in chunks sized from the budget and the largest row size
+    measured so far (the Ref ID column of each file found through
+    column_phrases) into sorted, deduplicated runs that are spilled to a
+    temporary directory whenever the buffered rows reach the budget; the
+    runs are then k-way merged, in several passes when there are more runs
+    than the budget lets one pass buffer (at most MAX_MERGE_FANIN). Columns
+    are the union of the files' columns in first-seen order, and cells are
+    copied as text. Of several rows with one Ref ID the first or last (keep)
+    in input order survives, files counting in the order given. Rows without a numeric Ref ID are never sorted or deduplicated:
+    they are set aside as they are read and written after the sorted rows,
+    in input order.
+
+    Returns the number of rows written.
+    """
+    budget_bytes = memory_limit_mb * 1024 * 1024 / SORT_OVERHEAD
+    headers = {file_path: _header(file_path) for file_path in file_paths if os.stat(file_path).st_size}
+    columns = list(dict.fromkeys(col for header in headers.values() for col in header))
+    spill_directory = tempfile.mkdtemp(prefix="avm_combine_")
+    try:
+        runs = []
+        buffered = []
+        buffered_bytes = 0
+        bytes_per_row = 0.0
+        sequence = 0
+        input_rows = 0
+        unkeyed_path = os.path.join(spill_directory, "unkeyed.csv")
+        unkeyed_rows = 0
+
+        def chunk_rows():
+            if not bytes_per_row:
+                return INITIAL_READ_ROWS
+            return max(MIN_READ_ROWS, int(budget_bytes / (READ_CHUNKS_PER_BUDGET * bytes_per_row)))
+
+        def spill():
+            run_path = os.path.join(spill_directory, f"run_{len(runs)}.csv")
+            _sort_dedup(pd.concat(buffered, ignore_index=True), keep).to_csv(run_path, index=False)
+            runs.append(run_path)
+
+        for file_path in file_paths:
+            if os.stat(file_path).st_size == 0:
+                logging.warning(f"Skipping empty file: {file_path}")
+                continue
+            ref_id_column = resolve_vendor_columns(headers[file_path], column_phrases)['Ref ID']
+            if ref_id_column is None:
+                logging.warning(f"{file_path} has no Ref ID column; its rows are kept unsorted at the end")
+            for chunk in _iter_file_chunks(file_path, chunk_rows):
+                chunk.columns = [str(col).strip() for col in chunk.columns]
+                chunk = chunk.reindex(columns=columns, fill_value='')
+                chunk[KEY_COLUMN] = ref_id_keys(chunk[ref_id_column]) if ref_id_column else np.inf
+                chunk[SEQ_COLUMN] = np.arange(sequence, sequence + len(chunk), dtype='int64')
+                sequence += len(chunk)
+                input_rows += len(chunk)
+
+                unkeyed = ~np.isfinite(chunk[KEY_COLUMN].to_numpy())
+                if unkeyed.any():
+                    chunk[unkeyed][columns].to_csv(unkeyed_path, mode='a', header=False, index=False)
+                    unkeyed_rows += int(unkeyed.sum())
+                    chunk = chunk[~unkeyed]
+
+                chunk_bytes = chunk.memory_usage(deep=True).sum()
+                bytes_per_row = max(bytes_per_row, chunk_bytes / max(len(chunk), 1))
+                buffered.append(chunk)
+                buffered_bytes += chunk_bytes
+                if buffered_bytes >= budget_bytes:
+                    spill()
+                    buffered, buffered_bytes = [], 0
+        if buffered or not runs:
+            buffered = buffered or [pd.DataFrame(columns=columns + [KEY_COLUMN, SEQ_COLUMN])]
+            spill()
+
+        # Merge in passes until one pass can merge every run
+        fanin = _merge_fanin(budget_bytes, bytes_per_row)
+        while len(runs) > fanin:
+            merged = []
+            for start in range(0, len(runs), fanin):
+                group = runs[start:start + fanin]
+                merged_path = os.path.join(spill_directory, f"merged_{len(runs)}_{start}.csv")
+                _merge_runs(group, columns, merged_path, keep, _merge_rows(budget_bytes, bytes_per_row, len(group)), keep_helpers=True)
+                for run_path in group:
+                    os.remove(run_path)
+                merged.append(merged_path)
+            runs = merged
+
+        written = _merge_runs(runs, columns, output_path, keep, _merge_rows(budget_bytes, bytes_per_row, len(runs)), keep_helpers=False)
+        if unkeyed_rows:
+            with open(unkeyed_path, 'rb') as unkeyed_file, open(output_path, 'ab') as output_file:
+                shutil.copyfileobj(unkeyed_file, output_file)
+            written += unkeyed_rows
+    finally:
+        shutil.rmtree(spill_directory, ignore_errors=True)
+
+    logging.info(f"Sorted {input_rows} rows into {output_path}: {input_rows - written} duplicate Ref ID rows dropped")
+    return written
+
+
+def _merge_fanin(budget_bytes, bytes_per_row):
+    """Runs merged at once so that each can buffer at least MIN_MERGE_ROWS rows."""
+    return max(2, min(MAX_MERGE_FANIN, int(budget_bytes / (max(bytes_per_row, 1.0) * MIN_MERGE_ROWS))))
+
+
+def _merge_rows(budget_bytes, bytes_per_row, run_count):
+    """Rows buffered per run so that all runs' buffers fit the budget."""
+    return max(MIN_MERGE_ROWS, int(budget_bytes / (max(bytes_per_row, 1.0) * run_count)))
@@ -1,38 +1,60 @@
+import logging
 import os
 import pandas as pd
-from openpyxl import Workbook, load_workbook
-from openpyxl.drawing.image import Image
-import matplotlib.pyplot as plt
 import io
 import numpy as np
-import seaborn as sns
 
-from avm_app.avm_utils import get_keyword_from_model, find_file_with_keyword
-
-def read_files_once(unique_models, avm_folder):
+from avm_app.avm_utils import find_vendor_file
+from avm_app.bootstrap import add_interval_columns, grouped_median_intervals, proportion_intervals
+from avm_app.compact import compact_vendor_frame, vendor_column_names, widen_floats
+from avm_app.compressed import data_format
+from avm_app.data_processing import column_phrases
+from avm_app.dedup import dedup_columns, dedup_vendor_frame
+from avm_app.vendor_registry import csv_read_options
+from avm_app.xlsx_reader import read_xlsx
+
+# Percentage-formatted columns of the statistics sheets
+MODEL_STATS_PERCENT_COLUMNS = ['Average Error', 'Median Error', 'Standard Deviation', 'Median Error CI Low', 'Median Error CI High']
+LOCATION_STATS_PERCENT_COLUMNS = ['Hit Rate', 'Hit Rate CI Low', 'Hit Rate CI High', 'Average Error', 'Median Error',
+                                  'Median Error CI Low', 'Median Error CI High', 'Minimum Error', 'Maximum Error']
+PPE10_PERCENT_COLUMNS = ['PPE10', 'PPE10 CI Low', 'PPE10 CI High']
+
+def read_files_once(unique_models, avm_folder, xlsx_sidecars=False):
     """
-    Reads CSV/XLSX files only once per model, using a keyword
-    extracted from the model name, and returns a dict of {model: dataframe}.
+    Reads CSV/XLSX files only once per model, located and read as the
+    model's vendor registry entry describes (file keywords, CSV header offset
+    and delimiter, column mapping), and returns a dict of {model: dataframe}.
+    CSVs may be .gz / .zip / .zst compressed and are decompressed as they are
+    parsed.
+    Duplicated Ref IDs are collapsed to one row by the model's dedup rule
+    (see dedup_vendor_frame), then each DataFrame is reduced to its Ref ID /
+    AVM / confidence / FSD columns in compact dtypes (see compact_vendor_frame).
+
+    XLSX files are streamed with read_xlsx, converting only those columns.
+    With xlsx_sidecars=True each workbook is also saved as a CSV sidecar on
+    first read, and later runs read the sidecar instead.
     """
     model_file_data = {}
     for model in unique_models:
-        keyword = get_keyword_from_model(model)
-        print(f"[DEBUG] Model: {model}, Keyword: {keyword}")
-        if keyword:
-            file_name = find_file_with_keyword(avm_folder, keyword)
-            print(f"[DEBUG] Found file for {model}: {file_name}")
+        if isinstance(model, str):
+            file_name = find_vendor_file(avm_folder, model)
+            logging.debug(f"Found file for {model}: {file_name}")
             if file_name:
                 file_path = os.path.join(avm_folder, file_name)
                 # Read either CSV or Excel
-                if file_path.endswith('.csv'):
-                    model_df = pd.read_csv(file_path, low_memory=False, index_col=False)
+                if data_format(file_path) == '.csv':
+                    model_df = pd.read_csv(file_path, low_memory=False, index_col=False, **csv_read_options(file_path, model))
 
-                elif file_path.endswith('.xlsx'):
-                    model_df = pd.read_excel(file_path)
+                elif data_format(file_path) == '.xlsx':
+                    model_df = read_xlsx(file_path, sidecar=xlsx_sidecars,
+                                         columns=lambda header, model=model: vendor_column_names(header, column_phrases, model)
+                                         + dedup_columns(model, header))
                 else:
                     # Skip unsupported formats
                     continue
                 model_df.columns = model_df.columns.str.strip()
+                model_df, _ = dedup_vendor_frame(model_df, model, column_phrases)
+                model_df = compact_vendor_frame(model_df, column_phrases, model)
 
                 # Filter to rows that match the AVM Model Name (for some models)
                 # if model in ['SiteXValue', 'RVM', 'ValueSure']:
@@ -61,16 +83,32 @@ def autosize_columns(worksheet):
         # Add a little extra space
         worksheet.column_dimensions[column_letter].width = max_length + 2
 
-def add_histograms_to_excel(file_path, output_file_path):
+def add_histograms_to_excel(file_path, output_file_path, results_df=None):
     """
     Generates KDE histograms (including Model 1/2/3 breakdown) for
     '% Diff between AVM and Benchmark' from the 'Original Data' sheet.
     Inserts a single combined image into a "KDE Curves" sheet.
+
+    When results_df (the frame written to 'Original Data') is given, it is
+    used directly instead of parsing the sheet back out of the workbook.
+
+    matplotlib, seaborn and openpyxl are imported here rather than at module
+    load, so only rendering a report pays for them.
     """
+    from openpyxl import load_workbook
+    from openpyxl.drawing.image import Image
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sheet_name = "Original Data"
 
-    # Read the specific sheet from the updated workbook
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    if results_df is not None:
+        df = results_df[[col for col in ('% Diff between AVM and Benchmark', 'Model Position') if col in results_df.columns]].copy()
+        if '% Diff between AVM and Benchmark' in df.columns:
+            df['% Diff between AVM and Benchmark'] = df['% Diff between AVM and Benchmark'].astype('float64')
+    else:
+        # Read the specific sheet from the updated workbook
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
 
     # Multiply the differences by 100 to treat them as integer-like percentages
     # If you already multiply them earlier in your code, remove or adapt this step.
@@ -175,6 +213,214 @@ def add_histograms_to_excel(file_path, output_file_path):
     workbook.save(output_file_path)
     print("KDE curves with statistical annotations added to the Excel workbook.")
 
+def summary_tables(results_df, min_conf_scores, max_fsd_values):
+    """
+    Computes the statistics sheets of the output workbook from a results
+    DataFrame. Returns a list of (sheet name, DataFrame, write index,
+    {column: number format}) tuples in workbook order.
+
+    -- PPE10 is computed manually by referencing the 'Benchmark Value' and
+       'AVM Value' columns, ignoring any precomputed
+       '% Diff between AVM and Benchmark'.
+    """
+    tables = []
+
+    # ----------------------------------------------------------------------
+    # 2. Model-Specific Statistics
+    # ----------------------------------------------------------------------
+    if '% Diff between AVM and Benchmark' in results_df.columns:
+        overall_avg_error = results_df['% Diff between AVM and Benchmark'].mean(skipna=True)
+        model_stats_df = (
+            results_df
+            .groupby('Model Position', observed=True)['% Diff between AVM and Benchmark']
+            .agg(['mean', 'median', 'std'])
+            .reset_index()
+        )
+        model_stats_df.columns = ['Model Position', 'Average Error', 'Median Error', 'Standard Deviation']
+        diff = results_df['% Diff between AVM and Benchmark'].astype('float64')
+        position_low, position_high = grouped_median_intervals(diff, results_df['Model Position'])
+        overall_low, overall_high = grouped_median_intervals(diff, pd.Series(0, index=diff.index))
+        model_stats_df = finish_model_stats(
+            model_stats_df,
+            overall_avg_error,
+            results_df['% Diff between AVM and Benchmark'].median(),
+            results_df['% Diff between AVM and Benchmark'].std(),
+            median_intervals=(np.append(position_low, overall_low), np.append(position_high, overall_high))
+        )
+        tables.append(('Model Specific Statistics', model_stats_df, False, dict.fromkeys(MODEL_STATS_PERCENT_COLUMNS, '0.00%')))
+
+    # ----------------------------------------------------------------------
+    # 3. Statistics by Location (% Diff)
+    # ----------------------------------------------------------------------
+    if 'AVM Value' in results_df.columns and '% Diff between AVM and Benchmark' in results_df.columns:
+        filtered_results_df = results_df[results_df['AVM Value'].notna()].copy()
+        loc_stats = (
+            filtered_results_df
+            .groupby(['State', 'County'], observed=True)['% Diff between AVM and Benchmark']
+            .agg(['count','mean','min','max'])
+            .reset_index()
+        )
+        # Calculate total records for each (State, County)
+        total_records = (
+            results_df
+            .groupby(['State','County'], observed=True)
+            .size()
+            .reset_index(name='Total Number of Records')
+        )
+        hit_diff = filtered_results_df['% Diff between AVM and Benchmark'].astype('float64')
+        location_medians = hit_diff.groupby([filtered_results_df['State'], filtered_results_df['County']], observed=True).median().reset_index(name='Median Error')
+        add_interval_columns(location_medians, 'Median Error',
+                             *grouped_median_intervals(hit_diff, [filtered_results_df['State'], filtered_results_df['County']]))
+        tables.append(('Statistics by Location', finish_location_stats(loc_stats, total_records, location_medians), False,
+                       dict.fromkeys(LOCATION_STATS_PERCENT_COLUMNS, '0.00%')))
+
+    # ----------------------------------------------------------------------
+    # 4. Model Usage
+    # ----------------------------------------------------------------------
+    if 'Model Position' in results_df.columns:
+        model_usage = results_df['Model Position'].value_counts(normalize=True)
+        model_usage = model_usage[model_usage > 0]
+        model_usage_df = model_usage.reset_index()
+        model_usage_df.columns = ['Model Position', 'Usage Percentage']
+        tables.append(('Model Usage', model_usage_df, False, {'Usage Percentage': '0.0%'}))
+
+    # ----------------------------------------------------------------------
+    # 5. Model Name Counts
+    # ----------------------------------------------------------------------
+    if 'AVM Name' in results_df.columns:
+        model_name_counts = results_df['AVM Name'].value_counts()
+        model_name_counts = model_name_counts[model_name_counts > 0]
+        model_name_counts_df = model_name_counts.reset_index()
+        model_name_counts_df.columns = ['AVM Name', 'Count']
+        tables.append(('Model Name Counts', model_name_counts_df, False, {}))
+
+    # ----------------------------------------------------------------------
+    # 6. Conf & FSD Summary
+    # ----------------------------------------------------------------------
+    tables.append(('Conf & FSD Summary', conf_fsd_summary(min_conf_scores, max_fsd_values), False, {}))
+
+    # ----------------------------------------------------------------------
+    # 7. Manual PPE10 Stats (overall, then by County / State / Model)
+    # ----------------------------------------------------------------------
+    if 'Benchmark Value' in results_df.columns and 'AVM Value' in results_df.columns:
+        df_valid = results_df[
+            results_df['Benchmark Value'].notna() &
+            results_df['AVM Value'].notna() &
+            (results_df['Benchmark Value'] != 0)  # avoid division by zero
+        ].copy()
+
+        # Compute absolute percentage difference and mark within +/-10%
+        df_valid['abs_pct_diff'] = (
+            (df_valid['AVM Value'] - df_valid['Benchmark Value']).abs()
+            / df_valid['Benchmark Value'].abs()
+        ) * 100.0
+        df_valid['Within_10'] = df_valid['abs_pct_diff'] <= 10
+
+        tables.append(('PPE10 Stats', ppe10_overall(len(df_valid), df_valid['Within_10'].sum()), False, dict.fromkeys(PPE10_PERCENT_COLUMNS, '0.00%')))
+
+        county_ppe10 = df_valid.groupby(['State', 'County'], observed=True)['Within_10'].agg(['count', 'sum'])
+        state_ppe10 = df_valid.groupby('State', observed=True)['Within_10'].agg(['count', 'sum'])
+        model_ppe10 = df_valid.groupby('Model Position', observed=True)['Within_10'].agg(['count', 'sum'])
+        for sheet_name, ppe10_df in [('PPE10 by County', county_ppe10), ('PPE10 by State', state_ppe10), ('PPE10 by Model', model_ppe10)]:
+            tables.append((sheet_name, finish_ppe10_table(ppe10_df), True, {}))
+    else:
+        print("Either 'Benchmark Value' or 'AVM Value' is missing; cannot compute manual PPE10.")
+
+    return tables
+
+def finish_model_stats(model_stats_df, overall_avg_error, overall_median, overall_std, median_intervals=None):
+    """
+    Rounds the per-position error statistics and appends the "Overall" row.
+    median_intervals, if given, is a (low, high) pair of arrays with one
+    bootstrap interval of the median per position plus one for Overall.
+    """
+    model_stats_df[['Average Error','Median Error','Standard Deviation']] = \
+        model_stats_df[['Average Error','Median Error','Standard Deviation']].apply(pd.to_numeric, errors='coerce').round(3)
+
+    overall_stats = pd.DataFrame([[
+        'Overall',
+        round(overall_avg_error, 3),
+        round(overall_median, 3),
+        round(overall_std, 3)
+    ]], columns=['Model Position', 'Average Error', 'Median Error', 'Standard Deviation'])
+
+    model_stats_df = pd.concat([model_stats_df, overall_stats], ignore_index=True)
+    if median_intervals is not None:
+        add_interval_columns(model_stats_df, 'Median Error', *median_intervals, digits=3)
+    return model_stats_df
+
+def finish_location_stats(loc_stats, total_records, location_medians):
+    """
+    Turns per-(State, County) hit statistics (count/mean/min/max of the % diff
+    over rows with an AVM value), total record counts and the median error
+    with its bootstrap interval (State, County, Median Error, Median Error
+    CI Low / High) into the "Statistics by Location" table, adding a
+    bootstrap interval of the hit rate.
+    """
+    expected_cols = ['State','County','Hits','Average Error','Minimum Error','Maximum Error']
+    if loc_stats.shape[1] == len(expected_cols):
+        loc_stats.columns = expected_cols
+    else:
+        print("Unexpected column count in loc_stats:", loc_stats.shape[1])
+        print("Columns were:", loc_stats.columns)
+        raise ValueError("Mismatch between actual and expected column count when renaming.")
+
+    loc_stats = pd.merge(total_records, loc_stats, on=['State','County'], how='left')
+    loc_stats = pd.merge(loc_stats, location_medians, on=['State','County'], how='left')
+
+    loc_stats['Hit Rate'] = loc_stats['Hits'] / loc_stats['Total Number of Records']
+    loc_stats['Hit Rate'] = loc_stats['Hit Rate'].round(3)
+    hit_low, hit_high = proportion_intervals(loc_stats['Hits'], loc_stats['Total Number of Records'])
+    has_hits = loc_stats['Hits'].notna().to_numpy()
+    add_interval_columns(loc_stats, 'Hit Rate', np.where(has_hits, hit_low, np.nan), np.where(has_hits, hit_high, np.nan), digits=3)
+    for col in ['Median Error', 'Median Error CI Low', 'Median Error CI High']:
+        loc_stats[col] = pd.to_numeric(loc_stats[col], errors='coerce').round(3)
+    loc_stats['Average Error'] = pd.to_numeric(loc_stats['Average Error'], errors='coerce').round(3)
+    loc_stats['Minimum Error'] = pd.to_numeric(loc_stats['Minimum Error'], errors='coerce').round(3)
+    loc_stats['Maximum Error'] = pd.to_numeric(loc_stats['Maximum Error'], errors='coerce').round(3)
+
+    return loc_stats[
+        ['State','County','Total Number of Records','Hits','Hit Rate','Hit Rate CI Low','Hit Rate CI High',
+         'Average Error','Median Error','Median Error CI Low','Median Error CI High','Minimum Error','Maximum Error']
+    ]
+
+def conf_fsd_summary(min_conf_scores, max_fsd_values):
+    return pd.DataFrame({
+        'Model Name': min_conf_scores.keys(),
+        'Min Conf Score': min_conf_scores.values(),
+        'Max FSD Value': max_fsd_values.values()
+    })
+
+def ppe10_overall(total_records, count_within_10):
+    ppe10 = count_within_10 / total_records if total_records else 0
+    ppe10_df = pd.DataFrame([{
+        'Total Records': total_records,
+        'Count Within 10%': count_within_10,
+        'PPE10': round(ppe10, 3)
+    }])
+    return add_interval_columns(ppe10_df, 'PPE10', *proportion_intervals([count_within_10], [total_records]), digits=3)
+
+def finish_ppe10_table(ppe10_df):
+    """
+    Adds PPE10 and its bootstrap interval to a count / sum (within 10%) table.
+    """
+    ppe10_df['PPE10'] = ppe10_df['sum'] / ppe10_df['count']
+    return add_interval_columns(ppe10_df, 'PPE10', *proportion_intervals(ppe10_df['sum'], ppe10_df['count']))
+
+def write_summary_sheets(writer, tables):
+    """
+    Writes the (sheet name, DataFrame, index, formats) tuples from
+    summary_tables, applying number formats and auto-sizing columns.
+    """
+    for sheet_name, table_df, write_index, formats in tables:
+        table_df.to_excel(writer, sheet_name=sheet_name, index=write_index)
+        worksheet = writer.sheets[sheet_name]
+        for col_name, number_format in formats.items():
+            col_idx = table_df.columns.get_loc(col_name) + 1
+            for row in range(2, len(table_df) + 2):
+                worksheet.cell(row=row, column=col_idx).number_format = number_format
+        autosize_columns(worksheet)
+
 def write_results_to_excel(results_df, output_file, min_conf_scores, max_fsd_values):
     """
     Writes the main DataFrame and various calculated statistics to 'output_file'.
@@ -187,14 +433,13 @@ def write_results_to_excel(results_df, output_file, min_conf_scores, max_fsd_val
        which shows total # of valid rows, how many are within 10%, and
        the resulting proportion.
 
-    -- The rest of the sheets remain as in your original approach.
+    -- The statistics sheets come from summary_tables.
     """
     with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
         # ----------------------------------------------------------------------
         # 1. Original Data
         # ----------------------------------------------------------------------
-        results_df.to_excel(writer, sheet_name='Original Data', index=False)
-        workbook = writer.book
+        widen_floats(results_df).to_excel(writer, sheet_name='Original Data', index=False)
         worksheet = writer.sheets['Original Data']
 
         # Optionally format '% Diff between AVM and Benchmark' if it exists
@@ -205,211 +450,19 @@ def write_results_to_excel(results_df, output_file, min_conf_scores, max_fsd_val
 
         autosize_columns(worksheet)
 
-        # ----------------------------------------------------------------------
-        # 2. Model-Specific Statistics (unchanged)
-        # ----------------------------------------------------------------------
-        if '% Diff between AVM and Benchmark' in results_df.columns:
-            overall_avg_error = results_df['% Diff between AVM and Benchmark'].mean(skipna=True)
-            model_stats_df = (
-                results_df
-                .groupby('Model Position')['% Diff between AVM and Benchmark']
-                .agg(['mean', 'median', 'std'])
-                .reset_index()
-            )
-            model_stats_df.columns = ['Model Position', 'Average Error', 'Median Error', 'Standard Deviation']
-            model_stats_df[['Average Error','Median Error','Standard Deviation']] = \
-                model_stats_df[['Average Error','Median Error','Standard Deviation']].apply(pd.to_numeric, errors='coerce').round(3)
-
-            # Add an "Overall" row
-            overall_stats = pd.DataFrame([[
-                'Overall',
-                round(overall_avg_error, 3),
-                round(results_df['% Diff between AVM and Benchmark'].median(), 3),
-                round(results_df['% Diff between AVM and Benchmark'].std(), 3)
-            ]], columns=['Model Position', 'Average Error', 'Median Error', 'Standard Deviation'])
-
-            model_stats_df = pd.concat([model_stats_df, overall_stats], ignore_index=True)
-            model_stats_df.to_excel(writer, sheet_name='Model Specific Statistics', index=False)
-
-            stats_worksheet = writer.sheets['Model Specific Statistics']
-            for col_name in ['Average Error', 'Median Error', 'Standard Deviation']:
-                col_idx = model_stats_df.columns.get_loc(col_name) + 1
-                for row in range(2, len(model_stats_df) + 2):
-                    stats_worksheet.cell(row=row, column=col_idx).number_format = '0.00%'
-
-            autosize_columns(stats_worksheet)
-
-        # ----------------------------------------------------------------------
-        # 3. Statistics by Location (% Diff) [Optional - unchanged]
-        # ----------------------------------------------------------------------
-        if 'AVM Value' in results_df.columns and '% Diff between AVM and Benchmark' in results_df.columns:
-            filtered_results_df = results_df[results_df['AVM Value'].notna()].copy()
-            loc_stats = (
-                filtered_results_df
-                .groupby(['State', 'County'])['% Diff between AVM and Benchmark']
-                .agg(['count','mean','min','max'])
-                .reset_index()
-            )
-            expected_cols = ['State','County','Hits','Average Error','Minimum Error','Maximum Error']
-            if loc_stats.shape[1] == len(expected_cols):
-                loc_stats.columns = expected_cols
-            else:
-                print("Unexpected column count in loc_stats:", loc_stats.shape[1])
-                print("Columns were:", loc_stats.columns)
-                raise ValueError("Mismatch between actual and expected column count when renaming.")
-
-
-            # Calculate total records for each (State, County)
-            total_records = (
-                results_df
-                .groupby(['State','County'])
-                .size()
-                .reset_index(name='Total Number of Records')
-            )
-            loc_stats = pd.merge(total_records, loc_stats, on=['State','County'], how='left')
-
-            loc_stats['Hit Rate'] = loc_stats['Hits'] / loc_stats['Total Number of Records']
-            loc_stats['Hit Rate'] = loc_stats['Hit Rate'].round(3)
-            print("loc_stats type:", type(loc_stats))
-            print("loc_stats columns:", loc_stats.columns)
-            print("loc_stats head:\n", loc_stats.head())
-            print("loc_stats['Average Error'] type:", type(loc_stats['Average Error']))
-
-            if isinstance(loc_stats['Average Error'], pd.Series):
-                loc_stats['Average Error'] = pd.to_numeric(loc_stats['Average Error'], errors='coerce').round(3)
-            else:
-                loc_stats['Average Error'] = round(float(loc_stats['Average Error']), 3)
-
-            loc_stats['Minimum Error'] = pd.to_numeric(loc_stats['Minimum Error'], errors='coerce').round(3)
-            loc_stats['Maximum Error'] = pd.to_numeric(loc_stats['Maximum Error'], errors='coerce').round(3)
-            
-
-            loc_stats = loc_stats[
-                ['State','County','Total Number of Records','Hits','Hit Rate','Average Error','Minimum Error','Maximum Error']
-            ]
-            loc_stats.to_excel(writer, sheet_name='Statistics by Location', index=False)
-
-            stats_location_worksheet = writer.sheets['Statistics by Location']
-            # Format relevant columns as percentages
-            hit_rate_col = loc_stats.columns.get_loc('Hit Rate') + 1
-            avg_err_col = loc_stats.columns.get_loc('Average Error') + 1
-            min_err_col = loc_stats.columns.get_loc('Minimum Error') + 1
-            max_err_col = loc_stats.columns.get_loc('Maximum Error') + 1
-
-            for row in range(2, len(loc_stats) + 2):
-                stats_location_worksheet.cell(row=row, column=hit_rate_col).number_format = '0.00%'
-                stats_location_worksheet.cell(row=row, column=avg_err_col).number_format = '0.00%'
-                stats_location_worksheet.cell(row=row, column=min_err_col).number_format = '0.00%'
-                stats_location_worksheet.cell(row=row, column=max_err_col).number_format = '0.00%'
-
-            autosize_columns(stats_location_worksheet)
-
-        # ----------------------------------------------------------------------
-        # 4. Model Usage (unchanged)
-        # ----------------------------------------------------------------------
-        if 'Model Position' in results_df.columns:
-            model_usage = results_df['Model Position'].value_counts(normalize=True)
-            model_usage_df = model_usage.reset_index()
-            model_usage_df.columns = ['Model Position', 'Usage Percentage']
-            model_usage_df.to_excel(writer, sheet_name='Model Usage', index=False)
-
-            usage_worksheet = writer.sheets['Model Usage']
-            usage_percentage_col_idx = model_usage_df.columns.get_loc('Usage Percentage') + 1
-            for row in range(2, len(model_usage_df) + 2):
-                usage_worksheet.cell(row=row, column=usage_percentage_col_idx).number_format = '0.0%'
-
-            autosize_columns(usage_worksheet)
-
-        # ----------------------------------------------------------------------
-        # 5. Model Name Counts (unchanged)
-        # ----------------------------------------------------------------------
-        if 'AVM Name' in results_df.columns:
-            model_name_counts = results_df['AVM Name'].value_counts()
-            model_name_counts_df = model_name_counts.reset_index()
-            model_name_counts_df.columns = ['AVM Name', 'Count']
-            model_name_counts_df.to_excel(writer, sheet_name='Model Name Counts', index=False)
-
-            autosize_columns(writer.sheets['Model Name Counts'])
-
-        # ----------------------------------------------------------------------
-        # 6. Conf & FSD Summary (unchanged)
-        # ----------------------------------------------------------------------
-        conf_fsd_summary_df = pd.DataFrame({
-            'Model Name': min_conf_scores.keys(),
-            'Min Conf Score': min_conf_scores.values(),
-            'Max FSD Value': max_fsd_values.values()
-        })
-        conf_fsd_summary_df.to_excel(writer, sheet_name='Conf & FSD Summary', index=False)
-        autosize_columns(writer.sheets['Conf & FSD Summary'])
-
-        # ----------------------------------------------------------------------
-        # 7. Manual PPE10 Stats (ONE sheet)
-        # ----------------------------------------------------------------------
-        if 'Benchmark Value' in results_df.columns and 'AVM Value' in results_df.columns:
-            df_valid = results_df[
-                results_df['Benchmark Value'].notna() &
-                results_df['AVM Value'].notna() &
-                (results_df['Benchmark Value'] != 0)  # avoid division by zero
-            ].copy()
-
-            # Compute absolute percentage difference
-            df_valid['abs_pct_diff'] = (
-                (df_valid['AVM Value'] - df_valid['Benchmark Value']).abs()
-                / df_valid['Benchmark Value'].abs()
-            ) * 100.0
-
-            # Mark within ±10%
-            df_valid['Within_10'] = df_valid['abs_pct_diff'] <= 10
-
-            total_records = len(df_valid)
-            count_within_10 = df_valid['Within_10'].sum()
-            ppe10 = count_within_10 / total_records if total_records else 0
-
-            ppe10_df = pd.DataFrame([{
-                'Total Records': total_records,
-                'Count Within 10%': count_within_10,
-                'PPE10': round(ppe10, 3)
-            }])
-
-            sheet_name = "PPE10 Stats"
-            ppe10_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            ppe10_ws = writer.sheets[sheet_name]
-
-            # Format the "PPE10" column as 0.00%
-            ppe10_col_idx = ppe10_df.columns.get_loc('PPE10') + 1
-            for row_idx in range(2, len(ppe10_df) + 2):
-                ppe10_ws.cell(row=row_idx, column=ppe10_col_idx).number_format = '0.00%'
-
-            autosize_columns(ppe10_ws)
-        else:
-            print("Either 'Benchmark Value' or 'AVM Value' is missing; cannot compute manual PPE10.")
-        # Keep all original sheets intact and add PPE10 breakdowns
-        if 'Benchmark Value' in results_df.columns and 'AVM Value' in results_df.columns:
-            df_valid = results_df.dropna(subset=['Benchmark Value', 'AVM Value'])
-            df_valid = df_valid[df_valid['Benchmark Value'] != 0]
-
-            df_valid['abs_pct_diff'] = (
-                (df_valid['AVM Value'] - df_valid['Benchmark Value']).abs()
-                / df_valid['Benchmark Value'].abs()
-            ) * 100.0
-            df_valid['Within_10'] = df_valid['abs_pct_diff'] <= 10
-
-            county_ppe10 = df_valid.groupby(['State', 'County'])['Within_10'].agg(['count', 'sum'])
-            county_ppe10['PPE10'] = county_ppe10['sum'] / county_ppe10['count']
-            county_ppe10.to_excel(writer, sheet_name='PPE10 by County')
-            autosize_columns(writer.sheets['PPE10 by County'])
-
-            state_ppe10 = df_valid.groupby('State')['Within_10'].agg(['count', 'sum'])
-            state_ppe10['PPE10'] = state_ppe10['sum'] / state_ppe10['count']
-            state_ppe10.to_excel(writer, sheet_name='PPE10 by State')
-            autosize_columns(writer.sheets['PPE10 by State'])
-
-            model_ppe10 = df_valid.groupby('Model Position')['Within_10'].agg(['count', 'sum'])
-            model_ppe10['PPE10'] = model_ppe10['sum'] / model_ppe10['count']
-            model_ppe10.to_excel(writer, sheet_name='PPE10 by Model')
-            autosize_columns(writer.sheets['PPE10 by Model'])
+        write_summary_sheets(writer, summary_tables(results_df, min_conf_scores, max_fsd_values))
 
     # --------------------------------------------------------------------------
     # Add histograms to the final output file
     # --------------------------------------------------------------------------
-    add_histograms_to_excel(output_file, output_file)
+    add_histograms_to_excel(output_file, output_file, results_df)
+
+def write_aggregates_to_excel(aggregates, output_file, min_conf_scores, max_fsd_values):
+    """
+    Writes the statistics sheets of a merged ResultAggregates (from a sharded
+    run) to 'output_file'. There is no per-row data, so the "Original Data"
+    and "KDE Curves" sheets are not produced; medians come from the
+    aggregates' quantile sketches.
+    """
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        write_summary_sheets(writer, aggregates.summary_tables(min_conf_scores, max_fsd_values))
@@ -1,18 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog, ttk
-import pandas as pd
 import glob
-from concurrent.futures import ThreadPoolExecutor
 import os
+import queue
+import threading
 # Import functions from the other modules
+from avm_app.limits import DEFAULT_MEMORY_LIMIT_MB
 from avm_app.profiles import save_profiles, load_profile
-from avm_app.combine_files import combine_files
-from avm_app.avm_utils import read_benchmark_file, read_cascade_file, get_avm_model_files, read_files_once
-from avm_app.data_processing import find_avm_score_parallel, column_phrases  # Ensure this is imported correctly 
-from avm_app.file_operations import write_results_to_excel
 
 class AVMApp:
-    def __init__(self, root, profiles_data, combine_files, read_benchmark_file, read_cascade_file, read_files_once, find_avm_score_parallel, write_results_to_excel, column_phrases):
+    def __init__(self, root, profiles_data, combine_files, read_benchmark_file, read_cascade_file, read_files_once, write_results_to_excel, column_phrases):
         self.root = root
         self.root.title("AVM Application")
         self.root.geometry("1700x800")  # Make the UI larger
@@ -34,10 +31,15 @@ class AVMApp:
         self.read_benchmark_file = read_benchmark_file
         self.read_cascade_file = read_cascade_file
         self.read_files_once = read_files_once
-        self.find_avm_score_parallel = find_avm_score_parallel
         self.write_results_to_excel = write_results_to_excel
         self.column_phrases = column_phrases
 
+        # Background run state: the worker thread posts messages to this queue
+        # and the Tk main loop drains it via root.after
+        self.worker_thread = None
+        self.cancel_event = threading.Event()
+        self.progress_queue = queue.Queue()
+
         self.create_widgets()
         self.load_profile(self.current_profile)
 
@@ -47,8 +49,8 @@ class AVMApp:
             self.root.columnconfigure(col, weight=1)
         self.root.rowconfigure(6, weight=1)  # Allow the main section (row 6) to grow
 
-        # Benchmark File
-        tk.Label(self.root, text="Benchmark File").grid(row=0, column=0, padx=10, pady=5, sticky='w')
+        # Benchmark File(s); several files separated by ';' run as one comparison
+        tk.Label(self.root, text="Benchmark File(s)").grid(row=0, column=0, padx=10, pady=5, sticky='w')
         self.benchmark_file_entry = tk.Entry(self.root)
         self.benchmark_file_entry.grid(row=0, column=1, padx=10, pady=5, sticky='ew')
         tk.Button(self.root, text="Browse", command=self.select_benchmark_file).grid(row=0, column=2, padx=10, pady=5)
@@ -127,8 +129,13 @@ class AVMApp:
         self.new_form_dropdown.pack(side='top', padx=5, pady=5, fill='x')
         tk.Button(self.forms_frame, text="Add Form", command=self.add_form).pack(side='top', padx=5, pady=5)
 
-        # Start button
-        tk.Button(self.root, text="Start Processing", command=self.start_processing).grid(row=7, column=1, padx=10, pady=20, sticky='w')
+        # Start / Cancel buttons
+        self.start_button = tk.Button(self.root, text="Start Processing", command=self.start_processing)
+        self.start_button.grid(row=7, column=1, padx=10, pady=20, sticky='w')
+        self.cancel_button = tk.Button(self.root, text="Cancel", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.grid(row=7, column=2, padx=10, pady=20, sticky='w')
+        self.use_sqlite_store_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Out-of-core vendor store (SQLite)", variable=self.use_sqlite_store_var).grid(row=7, column=3, columnspan=2, padx=10, pady=20, sticky='w')
 
         # Combine files section
         tk.Label(self.root, text="Combine Files - Folder").grid(row=0, column=6, padx=10, pady=5, sticky='w')
@@ -149,11 +156,20 @@ class AVMApp:
         self.combine_output_folder_entry.grid(row=3, column=7, padx=10, pady=5, sticky='ew')
         tk.Button(self.root, text="Browse", command=self.select_combine_output_folder).grid(row=3, column=8, padx=10, pady=5)
 
-        tk.Button(self.root, text="Combine Files", command=self.combine_files).grid(row=4, column=7, padx=10, pady=20, sticky='w')
+        tk.Label(self.root, text="Memory Limit (MB)").grid(row=4, column=6, padx=10, pady=5, sticky='w')
+        self.combine_memory_limit_entry = tk.Entry(self.root, width=10)
+        self.combine_memory_limit_entry.insert(0, str(DEFAULT_MEMORY_LIMIT_MB))
+        self.combine_memory_limit_entry.grid(row=4, column=7, padx=10, pady=5, sticky='w')
+
+        self.combine_sort_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Sort by Ref ID, drop duplicates", variable=self.combine_sort_var).grid(row=5, column=6, padx=10, pady=20, sticky='w')
+        tk.Button(self.root, text="Combine Files", command=self.combine_files).grid(row=5, column=7, padx=10, pady=20, sticky='w')
 
-        # Progress bar
-        # self.progress = ttk.Progressbar(self.root, orient="horizontal", length=400, mode="determinate")
-        # self.progress.grid(row=8, column=1, columnspan=2, pady=10, sticky='ew')
+        # Progress bar and status line for background runs
+        self.progress = ttk.Progressbar(self.root, orient="horizontal", length=400, mode="determinate")
+        self.progress.grid(row=8, column=1, columnspan=2, pady=10, sticky='ew')
+        self.status_var = tk.StringVar(value="Idle")
+        tk.Label(self.root, textvariable=self.status_var, anchor='w').grid(row=9, column=1, columnspan=4, padx=10, pady=5, sticky='w')
 
 
 
@@ -210,8 +226,10 @@ class AVMApp:
             messagebox.showerror("Error", f"Profile '{new_profile_name}' already exists!")
 
     def select_benchmark_file(self):
-        self.benchmark_file = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-        self.benchmark_file_entry.insert(0, self.benchmark_file)
+        benchmark_files = filedialog.askopenfilenames(filetypes=[("CSV files", "*.csv *.csv.gz *.zip *.csv.zst")])
+        if benchmark_files:
+            self.benchmark_file_entry.delete(0, tk.END)
+            self.benchmark_file_entry.insert(0, "; ".join(benchmark_files))
 
     def select_cascade_folder(self):
         self.cascade_folder = filedialog.askdirectory()
@@ -249,56 +267,191 @@ class AVMApp:
             self.new_form_dropdown['values'] = self.available_forms
 
     def start_processing(self):
-        if not self.benchmark_file or not self.cascade_folder or not self.avm_folder or not self.output_directory:
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            messagebox.showinfo("Busy", "A simulation is already running.")
+            return
+
+        self.benchmark_files = [path.strip() for path in self.benchmark_file_entry.get().split(';') if path.strip()]
+        if not self.benchmark_files or not self.cascade_folder or not self.avm_folder or not self.output_directory:
             messagebox.showerror("Error", "Please select all required files and folders.")
             return
 
         self.min_conf_scores = {model: float(entry.get()) for model, entry in self.conf_score_entries.items()}
         self.max_fsd_values = {model: float(entry.get()) for model, entry in self.fsd_entries.items()}
         self.desired_forms = {form for form, var in self.form_vars.items() if var.get()}
+        self.use_sqlite_store = self.use_sqlite_store_var.get()
+
+        self.cancel_event = threading.Event()
+        self.progress_queue = queue.Queue()
+        self.progress['value'] = 0
+        self.status_var.set("Starting...")
+        self.start_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+
+        self.worker_thread = threading.Thread(target=self.run_processing, daemon=True)
+        self.worker_thread.start()
+        self.root.after(100, self.poll_progress)
+
+    def cancel_processing(self):
+        """
+        Asks the background worker to stop. The worker finishes the batch it is
+        currently matching and then exits without writing further output.
+        """
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_var.set("Cancelling after the current batch...")
+
+    def run_processing(self):
+        """
+        Worker thread body: runs every cascade in the cascade folder and writes
+        one workbook per cascade. Cascades go through run_pipeline, so the next
+        cascade's inputs load while the current one matches and the previous
+        workbook renders in a separate process. Never touches Tk widgets
+        directly; all feedback goes through self.progress_queue.
+
+        With several benchmark files, each cascade's vendor data is loaded
+        once and matched once against the union of the benchmarks (see
+        union_benchmark). Every benchmark gets its own workbooks in a
+        sub-folder named after it, and a comparison workbook puts their
+        metrics side by side.
+        """
+        # Imported on first run so that opening the window stays fast
+        from avm_app.comparison import (benchmark_names, comparison_entry, comparison_output_file, split_results,
+                                        union_benchmark, write_comparison_to_excel)
+        from avm_app.pipeline import run_pipeline, write_workbook, write_workbooks
+        from avm_app.simulation import ProcessingCancelled, cascade_models, output_file_for
+        from avm_app.sqlite_store import SqliteVendorStore, store_path_for
 
-        benchmark_df = self.read_benchmark_file(self.benchmark_file, self.desired_forms)
-        cascade_files = glob.glob(os.path.join(self.cascade_folder, '*.csv'))
-        os.makedirs(self.output_directory, exist_ok=True)
-
-        for cascade_path in cascade_files:
-            cascade_df = self.read_cascade_file(cascade_path)
-            available_models = [col for col in ['Model 1', 'Model 2', 'Model 3'] if col in cascade_df.columns]
-            unique_models = pd.unique(cascade_df[available_models].values.ravel('K'))
-            model_file_data = self.read_files_once(unique_models, self.avm_folder)
-            new_excel_file = f"{self.output_directory}/{os.path.basename(self.avm_folder)}_{os.path.basename(cascade_path).replace('.csv', '')}.xlsx"
-
-            results = self.process_benchmark(benchmark_df, cascade_df, model_file_data)
-            self.write_results_to_excel(results, new_excel_file, self.min_conf_scores, self.max_fsd_values)
-
-
-
-
-    def process_benchmark(self, benchmark_df, cascade_df, model_file_data):
-        results = []
-
-        def process_batch(batch):
-            batch_results = []
-            for _, row in batch.iterrows():
-                ref_id, state, county = row['Ref ID'], row['State'], row['County']
-                appraised_value = row['ContractPrice'] if 'ContractPrice' in row and not pd.isna(row['ContractPrice']) and row['ContractPrice'] != 0 else row['AppraisedValue']
-                model_files = get_avm_model_files(cascade_df, state, county)
-                avm_score, conf_score, fsd_value, model_num, model_name = self.find_avm_score_parallel(model_files, ref_id, model_file_data, self.column_phrases, self.min_conf_scores, self.max_fsd_values)
-                batch_results.append((ref_id, state, county, appraised_value, avm_score, (avm_score - appraised_value) / appraised_value if avm_score is not None else None, model_name, conf_score, fsd_value, model_num))
-            return batch_results
-
-        batch_size = 10000
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            futures = []
-            for i in range(0, len(benchmark_df), batch_size):
-                batch = benchmark_df.iloc[i:i + batch_size]
-                futures.append(executor.submit(process_batch, batch))
-
-            for future in futures:
-                results.extend(future.result())
+        try:
+            benchmark_dfs = [self.read_benchmark_file(benchmark_file, self.desired_forms) for benchmark_file in self.benchmark_files]
+            comparing = len(benchmark_dfs) > 1
+            if comparing:
+                names = benchmark_names(self.benchmark_files)
+                benchmark_df, union_rows = union_benchmark(benchmark_dfs)
+                comparison_entries = []
+            else:
+                benchmark_df = benchmark_dfs[0]
+            cascade_files = glob.glob(os.path.join(self.cascade_folder, '*.csv'))
+            os.makedirs(self.output_directory, exist_ok=True)
+
+            def load(entry):
+                cascade_index, cascade_path = entry
+                cascade_name = os.path.basename(cascade_path)
+                self.progress_queue.put(('status', f"Cascade {cascade_index}/{len(cascade_files)} ({cascade_name}): loading AVM files"))
+                cascade_df = self.read_cascade_file(cascade_path)
+                vendor_store = None
+                if self.use_sqlite_store:
+                    # Ingest (or refresh) the vendor files into SQLite and match out of core
+                    model_file_data = {}
+                    vendor_store = SqliteVendorStore.build(store_path_for(self.output_directory, self.avm_folder),
+                                                           cascade_models(cascade_df), self.avm_folder, self.column_phrases)
+                else:
+                    model_file_data = self.read_files_once(cascade_models(cascade_df), self.avm_folder)
+                return cascade_index, cascade_path, cascade_df, model_file_data, vendor_store
+
+            def match(loaded):
+                cascade_index, cascade_path, cascade_df, model_file_data, vendor_store = loaded
+                cascade_name = os.path.basename(cascade_path)
+
+                def report(progress):
+                    progress.update(cascade_index=cascade_index, cascade_count=len(cascade_files), cascade_name=cascade_name)
+                    self.progress_queue.put(('progress', progress))
+
+                results = self.process_benchmark(benchmark_df, cascade_df, model_file_data,
+                                                 progress_callback=report, cancel_event=self.cancel_event,
+                                                 vendor_store=vendor_store)
+                if not comparing:
+                    new_excel_file = output_file_for(self.output_directory, self.avm_folder, cascade_path)
+                    self.progress_queue.put(('status', f"Cascade {cascade_index}/{len(cascade_files)} ({cascade_name}): writing {os.path.basename(new_excel_file)}"))
+                    return self.write_results_to_excel, results, new_excel_file, self.min_conf_scores, self.max_fsd_values
+
+                benchmark_results = [split_results(results, df, rows) for df, rows in zip(benchmark_dfs, union_rows)]
+                comparison_entries.extend(comparison_entry(cascade_name, name, results_df)
+                                          for name, results_df in zip(names, benchmark_results))
+                new_excel_files = []
+                for name in names:
+                    os.makedirs(os.path.join(self.output_directory, name), exist_ok=True)
+                    new_excel_files.append(output_file_for(os.path.join(self.output_directory, name), self.avm_folder, cascade_path))
+                self.progress_queue.put(('status', f"Cascade {cascade_index}/{len(cascade_files)} ({cascade_name}): writing {len(names)} workbooks"))
+                return self.write_results_to_excel, benchmark_results, new_excel_files, self.min_conf_scores, self.max_fsd_values
+
+            def rendered(excel_files):
+                for excel_file in (excel_files if comparing else [excel_files]):
+                    self.progress_queue.put(('status', f"Wrote {os.path.basename(excel_file)}"))
+
+            written = run_pipeline(list(enumerate(cascade_files, start=1)), load, match,
+                                   render=write_workbooks if comparing else write_workbook,
+                                   rendered_callback=rendered, cancel_event=self.cancel_event)
+            if comparing:
+                written = [excel_file for excel_files in written for excel_file in excel_files]
+                comparison_file = comparison_output_file(self.output_directory, self.avm_folder)
+                write_comparison_to_excel(comparison_entries, comparison_file)
+                written.append(comparison_file)
+            self.progress_queue.put(('done', written))
+        except ProcessingCancelled:
+            self.progress_queue.put(('cancelled', None))
+        except Exception as e:
+            self.progress_queue.put(('error', str(e)))
+
+    def poll_progress(self):
+        """
+        Drains worker messages on the Tk main thread and reschedules itself
+        until the worker reports that it has finished.
+        """
+        finished = None
+        while True:
+            try:
+                kind, payload = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'status':
+                self.status_var.set(payload)
+            elif kind == 'progress':
+                self.show_progress(payload)
+            else:
+                finished = (kind, payload)
+
+        if finished is None:
+            self.root.after(100, self.poll_progress)
+            return
 
-        results_df = pd.DataFrame(results, columns=['Ref ID', 'State', 'County', 'Benchmark Value', 'AVM Value', '% Diff between AVM and Benchmark', 'AVM Name', 'AVM Conf Score', 'FSD Value', 'Model Position'])
-        return results_df
+        self.start_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        kind, payload = finished
+        if kind == 'done':
+            self.progress['value'] = 100
+            self.status_var.set(f"Finished: {len(payload)} workbook(s) written")
+            messagebox.showinfo("Processing Complete", f"{len(payload)} workbook(s) written to {self.output_directory}")
+        elif kind == 'cancelled':
+            self.status_var.set("Cancelled")
+        else:
+            self.status_var.set("Failed")
+            messagebox.showerror("Error", f"Processing failed: {payload}")
+
+    def show_progress(self, progress):
+        """
+        Renders a progress dict from process_benchmark: overall percentage across
+        all cascades, plus batches, rows/sec and ETA for the current cascade.
+        """
+        batches_done, batch_count = progress['batches_done'], progress['batch_count']
+        cascade_fraction = progress['rows_done'] / progress['row_count'] if progress['row_count'] else 1.0
+        overall = (progress['cascade_index'] - 1 + cascade_fraction) / progress['cascade_count']
+        self.progress['value'] = overall * 100
+
+        rows_per_sec = progress['rows_per_sec']
+        eta = progress['eta_seconds']
+        eta_text = f"{int(eta // 60)}m {int(eta % 60):02d}s" if eta is not None else "--"
+        self.status_var.set(
+            f"Cascade {progress['cascade_index']}/{progress['cascade_count']} ({progress['cascade_name']}): "
+            f"batch {batches_done}/{batch_count}, {rows_per_sec:,.0f} rows/sec, ETA {eta_text}"
+        )
+
+    def process_benchmark(self, benchmark_df, cascade_df, model_file_data, progress_callback=None, cancel_event=None, vendor_store=None):
+        from avm_app.simulation import process_benchmark
+        return process_benchmark(benchmark_df, cascade_df, model_file_data, self.column_phrases,
+                                 self.min_conf_scores, self.max_fsd_values,
+                                 progress_callback=progress_callback, cancel_event=cancel_event,
+                                 vendor_store=vendor_store)
 
     def combine_files(self):
         folder_path = self.combine_folder_entry.get()
@@ -317,4 +470,12 @@ class AVMApp:
             messagebox.showerror("Error", "Start Number and End Number must be integers.")
             return
 
-        self.combine_files_func(folder_path, start_num, end_num, output_folder)
+        sort_by_ref_id = self.combine_sort_var.get()
+        try:
+            memory_limit_mb = int(self.combine_memory_limit_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Memory Limit must be an integer number of MB.")
+            return
+
+        self.combine_files_func(folder_path, start_num, end_num, output_folder,
+                                sort_by_ref_id=sort_by_ref_id, memory_limit_mb=memory_limit_mb)
@@ -0,0 +1,6 @@
+# Default resource limits shared by the engine and the GUI. Kept free of
+# third-party imports so the GUI can show them without loading pandas.
+
+# Memory budget of a sorted combine (see external_sort_dedup) unless the
+# caller sets one
+DEFAULT_MEMORY_LIMIT_MB = 512
@@ -0,0 +1,137 @@
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from avm_app.simulation import ProcessingCancelled
+
+# Items loaded ahead of the match stage
+PREFETCH_DEPTH = 1
+
+# Matched items allowed to wait for (or be in) the render process
+RENDER_BACKLOG = 1
+
+
+def _init_render_worker():
+    """
+    The render process only draws into workbooks, so it uses the off-screen
+    backend whatever the parent (e.g. the Tk GUI) would pick.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def write_workbook(write, results_df, output_file, *args):
+    """
+    Render-stage entry point: calls write(results_df, output_file, *args)
+    (e.g. write_results_to_excel) and returns output_file.
+    """
+    write(results_df, output_file, *args)
+    return output_file
+
+
+def write_workbooks(write, results_dfs, output_files, *args):
+    """
+    write_workbook for several results frames matched together (e.g. one per
+    benchmark of a comparison run); returns the list of output files.
+    """
+    for results_df, output_file in zip(results_dfs, output_files):
+        write(results_df, output_file, *args)
+    return list(output_files)
+
+
+def run_pipeline(items, load, match, render=write_workbook, prefetch=PREFETCH_DEPTH, render_backlog=RENDER_BACKLOG,
+                 rendered_callback=None, cancel_event=None):
+    """
+    Runs items through three stages connected by bounded queues:
+
+    - load(item) runs on a background thread, at most prefetch items ahead of
+      the match stage (reading a cascade and its vendor files).
+    - match(loaded) runs on the calling thread and returns the argument tuple
+      of the render stage.
+    - render(*args) runs in a separate process, with at most render_backlog
+      matched items waiting for it (writing and charting a workbook).
+
+    Item N+1 therefore loads while N matches and N-1 renders, so the wall time
+    of a run approaches that of its slowest stage rather than the sum of all
+    three, while the queue bounds cap how many items are held in memory.
+
+    - rendered_callback, if given, is called on the calling thread with each
+      render result as it finishes.
+    - cancel_event, if given and set, stops the run between items by raising
+      ProcessingCancelled; a workbook already rendering is finished first.
+
+    An exception in any stage stops the pipeline and is raised here. Returns
+    the render results in item order.
+    """
+    loaded_queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                loaded_queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def load_stage():
+        try:
+            for item in items:
+                if cancelled() or not put(('loaded', load(item))):
+                    return
+        except Exception as e:
+            put(('error', e))
+            return
+        put(('done', None))
+
+    rendered = []
+    pending = deque()
+
+    def finish_oldest():
+        result = pending.popleft().result()
+        rendered.append(result)
+        if rendered_callback is not None:
+            rendered_callback(result)
+
+    loader = threading.Thread(target=load_stage, daemon=True)
+    loader.start()
+    # A fresh interpreter rather than a fork of a process running threads (and possibly Tk)
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_render_worker)
+    try:
+        while True:
+            try:
+                kind, payload = loaded_queue.get(timeout=0.1)
+            except queue.Empty:
+                if cancelled():
+                    raise ProcessingCancelled()
+                continue
+            if kind == 'done':
+                break
+            if kind == 'error':
+                raise payload
+            if cancelled():
+                raise ProcessingCancelled()
+
+            render_args = match(payload)
+            if cancelled():
+                raise ProcessingCancelled()
+            while len(pending) >= render_backlog:
+                finish_oldest()
+            pending.append(executor.submit(render, *render_args))
+
+        while pending:
+            finish_oldest()
+    except BaseException:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    stop.set()
+    executor.shutdown(wait=True)
+    return rendered
@@ -0,0 +1,304 @@
+import glob
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from avm_app.avm_utils import read_benchmark_file, read_cascade_file, find_vendor_file
+from avm_app.compressed import uncompressed_size
+from avm_app.data_processing import column_phrases
+from avm_app.file_operations import read_files_once, write_aggregates_to_excel, write_results_to_excel
+from avm_app.profiles import load_profile
+from avm_app.sharding import run_sharded
+from avm_app.simulation import ProcessingCancelled, cascade_models, output_file_for, process_benchmark
+from avm_app.sqlite_store import SqliteVendorStore, store_path_for
+from avm_app.vendor_store import SharedVendorStore
+
+# Rough ratio between a CSV's size on disk and the DataFrame pandas builds from it
+IN_MEMORY_FACTOR = 3
+
+# matplotlib's pyplot state is global, so workbooks are rendered one at a time
+_render_lock = threading.Lock()
+
+
+def load_job_spec(spec_path):
+    """
+    Reads a JSON job specification. Either give the matrix keys
+
+        {
+            "benchmark_files": ["q1.csv", "q2.csv"],
+            "avm_folders": ["AVM/2024-01", "AVM/2024-02"],
+            "cascade_folders": ["Cascades"],
+            "output_directory": "Output",
+            "profile": "Default",
+            "max_workers": 2,
+            "memory_budget_mb": 8000,
+            "sqlite_store_directory": "Stores",
+            "xlsx_sidecars": true,
+            "shards": 8,
+            "shard_by": "State"
+        }
+
+    which runs every benchmark x AVM folder x cascade combination, or an
+    explicit "jobs" list of {"benchmark_file", "avm_folder", "cascade_file" or
+    "cascade_folder"} entries. "cascade_files" may be used instead of (or with)
+    "cascade_folders". With "sqlite_store_directory", vendor files are
+    ingested into one SQLite store per AVM folder there and matched out of
+    core instead of being loaded into memory. With "xlsx_sidecars", vendor
+    workbooks loaded into memory are cached as CSV sidecars next to them (see
+    read_xlsx) and read from there on later runs. With "shards", each job runs as
+    that many shards (split by "shard_by": "State" or "hash") and its workbook
+    is built from the merged shard aggregates.
+    """
+    with open(spec_path, 'r') as f:
+        return json.load(f)
+
+
+def _cascade_paths(entry):
+    paths = list(entry.get('cascade_files', []))
+    if 'cascade_file' in entry:
+        paths.append(entry['cascade_file'])
+    for folder in entry.get('cascade_folders', []) + ([entry['cascade_folder']] if 'cascade_folder' in entry else []):
+        paths.extend(sorted(glob.glob(os.path.join(folder, '*.csv'))))
+    return paths
+
+
+def expand_jobs(spec):
+    """
+    Expands a job specification into one job dict per benchmark / AVM folder /
+    cascade combination.
+
+    Each job carries its output workbook path, named as start_processing names
+    it. When the spec covers more than one benchmark file, every benchmark gets
+    its own sub-folder of the output directory so names cannot collide.
+    """
+    if 'jobs' in spec:
+        combinations = [
+            (entry['benchmark_file'], entry['avm_folder'], cascade_path)
+            for entry in spec['jobs']
+            for cascade_path in _cascade_paths(entry)
+        ]
+    else:
+        combinations = [
+            (benchmark_file, avm_folder, cascade_path)
+            for benchmark_file in spec['benchmark_files']
+            for avm_folder in spec['avm_folders']
+            for cascade_path in _cascade_paths(spec)
+        ]
+
+    output_directory = spec['output_directory']
+    several_benchmarks = len({benchmark_file for benchmark_file, _, _ in combinations}) > 1
+
+    jobs = []
+    seen_outputs = {}
+    for benchmark_file, avm_folder, cascade_path in combinations:
+        job_output_directory = output_directory
+        if several_benchmarks:
+            benchmark_name = os.path.splitext(os.path.basename(benchmark_file))[0]
+            job_output_directory = os.path.join(output_directory, benchmark_name)
+        output_file = output_file_for(job_output_directory, avm_folder, cascade_path)
+        if output_file in seen_outputs:
+            raise ValueError(f"Jobs {seen_outputs[output_file]} and {(benchmark_file, avm_folder, cascade_path)} would both write {output_file}")
+        seen_outputs[output_file] = (benchmark_file, avm_folder, cascade_path)
+
+        models = [model for model in cascade_models(read_cascade_file(cascade_path)) if isinstance(model, str)]
+        jobs.append({
+            'benchmark_file': benchmark_file,
+            'avm_folder': avm_folder,
+            'cascade_file': cascade_path,
+            'output_file': output_file,
+            'models': models,
+            'estimated_mb': estimate_job_mb(benchmark_file, avm_folder, models),
+        })
+    return jobs
+
+
+def estimate_job_mb(benchmark_file, avm_folder, models):
+    """
+    Estimates the peak memory of one job from the size of the benchmark and
+    of every vendor file the cascade references (decompressed size for
+    compressed files, see uncompressed_size).
+    """
+    total_bytes = uncompressed_size(benchmark_file) if os.path.exists(benchmark_file) else 0
+    for model in models:
+        file_name = find_vendor_file(avm_folder, model)
+        if file_name:
+            total_bytes += uncompressed_size(os.path.join(avm_folder, file_name))
+    return total_bytes * IN_MEMORY_FACTOR / (1024 * 1024)
+
+
+class MemoryBudget:
+    """
+    Admits jobs while their summed memory estimates stay within limit_mb.
+    A job larger than the whole budget is admitted only when nothing else runs.
+    """
+
+    def __init__(self, limit_mb=None):
+        self.limit_mb = limit_mb
+        self.used_mb = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount_mb, cancel_event=None):
+        if self.limit_mb is None:
+            return
+        with self._condition:
+            while self.used_mb > 0 and self.used_mb + amount_mb > self.limit_mb:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ProcessingCancelled()
+                self._condition.wait(timeout=0.5)
+            self.used_mb += amount_mb
+
+    def release(self, amount_mb):
+        if self.limit_mb is None:
+            return
+        with self._condition:
+            self.used_mb -= amount_mb
+            self._condition.notify_all()
+
+
+class SharedDataCache:
+    """
+    Loads each benchmark file and each (AVM folder, model) vendor file once and
+    shares the result between every job that references it. Entries are
+    reference counted against the job list and dropped after their last job.
+    """
+
+    def __init__(self, references):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}
+        self._refcounts = Counter(references)
+
+    def get(self, key, loader):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._entries:
+                self._entries[key] = loader()
+            return self._entries[key]
+
+    def release(self, key):
+        with self._lock:
+            self._refcounts[key] -= 1
+            if self._refcounts[key] <= 0:
+                self._entries.pop(key, None)
+                self._key_locks.pop(key, None)
+
+
+def _job_keys(job):
+    return [('benchmark', job['benchmark_file'])] + [('vendor', job['avm_folder'], model) for model in job['models']]
+
+
+def run_jobs(jobs, min_conf_scores, max_fsd_values, desired_forms, max_workers=None, memory_budget_mb=None,
+             progress_callback=None, cancel_event=None, sqlite_store_directory=None, shard_count=None,
+             shard_by='State', xlsx_sidecars=False):
+    """
+    Runs the jobs from expand_jobs concurrently.
+
+    - max_workers caps how many jobs match at the same time (default: CPU count).
+      The CPU count is split between them: each job matches (or shards) over
+      CPU count // max_workers workers, at least one.
+    - memory_budget_mb caps the summed memory estimates of running jobs.
+    - progress_callback, if given, is called as progress_callback(job, message)
+      when a job starts, finishes or fails.
+    - sqlite_store_directory, if given, matches every job through a
+      SqliteVendorStore per AVM folder in that directory instead of loading
+      vendor frames.
+    - xlsx_sidecars is passed to read_files_once when vendor frames are loaded.
+    - shard_count, if given, runs each job through run_sharded with that many
+      shards split by shard_by, and writes only the summary sheets (no
+      Original Data or KDE Curves, since no per-row results are collected).
+
+    Returns a list of {'job', 'status', 'error'} dicts, one per job, where status
+    is 'done', 'failed' or 'cancelled'.
+    """
+    cpu_budget = os.cpu_count() or 1
+    max_workers = max_workers or cpu_budget
+    per_job_workers = max(1, cpu_budget // max_workers)
+    budget = MemoryBudget(memory_budget_mb)
+    cache = SharedDataCache(key for job in jobs for key in _job_keys(job))
+    store_locks = {job['avm_folder']: threading.Lock() for job in jobs}
+
+    def report(job, message):
+        logging.info(f"{os.path.basename(job['output_file'])}: {message}")
+        if progress_callback is not None:
+            progress_callback(job, message)
+
+    def run_job(job):
+        budget.acquire(job['estimated_mb'], cancel_event)
+        try:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessingCancelled()
+            report(job, "started")
+            benchmark_df = cache.get(('benchmark', job['benchmark_file']),
+                                     lambda: read_benchmark_file(job['benchmark_file'], desired_forms))
+            model_file_data = {}
+            vendor_store = None
+            if sqlite_store_directory:
+                os.makedirs(sqlite_store_directory, exist_ok=True)
+                with store_locks[job['avm_folder']]:
+                    vendor_store = SqliteVendorStore.build(store_path_for(sqlite_store_directory, job['avm_folder']),
+                                                           job['models'], job['avm_folder'], column_phrases)
+            else:
+                for model in job['models']:
+                    model_file_data.update(cache.get(('vendor', job['avm_folder'], model),
+                                                     lambda model=model: read_files_once([model], job['avm_folder'], xlsx_sidecars)))
+
+            cascade_df = read_cascade_file(job['cascade_file'])
+            os.makedirs(os.path.dirname(job['output_file']) or '.', exist_ok=True)
+            if shard_count:
+                shard_store = vendor_store or SharedVendorStore.create(model_file_data, column_phrases)
+                try:
+                    aggregates = run_sharded(benchmark_df, cascade_df, shard_store, min_conf_scores, max_fsd_values,
+                                             shard_count=shard_count, by=shard_by, max_workers=per_job_workers,
+                                             cancel_event=cancel_event)
+                finally:
+                    if shard_store is not vendor_store:
+                        shard_store.close()
+                write_aggregates_to_excel(aggregates, job['output_file'], min_conf_scores, max_fsd_values)
+            else:
+                results = process_benchmark(benchmark_df, cascade_df, model_file_data, column_phrases,
+                                            min_conf_scores, max_fsd_values, cancel_event=cancel_event, vendor_store=vendor_store,
+                                            max_workers=per_job_workers)
+                with _render_lock:
+                    write_results_to_excel(results, job['output_file'], min_conf_scores, max_fsd_values)
+            report(job, "done")
+        finally:
+            for key in _job_keys(job):
+                cache.release(key)
+            budget.release(job['estimated_mb'])
+
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                future.result()
+                outcomes.append({'job': job, 'status': 'done', 'error': None})
+            except ProcessingCancelled:
+                outcomes.append({'job': job, 'status': 'cancelled', 'error': None})
+            except Exception as e:
+                logging.error(f"Job for {job['output_file']} failed: {e}")
+                report(job, f"failed: {e}")
+                outcomes.append({'job': job, 'status': 'failed', 'error': str(e)})
+    return outcomes
+
+
+def run_job_spec(spec, profiles_data, progress_callback=None, cancel_event=None):
+    """
+    Expands and runs a job specification (a dict or a path to a JSON file),
+    using the thresholds and forms of the profile it names.
+    """
+    if isinstance(spec, str):
+        spec = load_job_spec(spec)
+    min_conf_scores, desired_forms, max_fsd_values, _ = load_profile(profiles_data, spec.get('profile', 'Default'))
+    jobs = expand_jobs(spec)
+    return run_jobs(jobs, min_conf_scores, max_fsd_values, desired_forms,
+                    max_workers=spec.get('max_workers'), memory_budget_mb=spec.get('memory_budget_mb'),
+                    progress_callback=progress_callback, cancel_event=cancel_event,
+                    sqlite_store_directory=spec.get('sqlite_store_directory'),
+                    shard_count=spec.get('shards'), shard_by=spec.get('shard_by', 'State'),
+                    xlsx_sidecars=bool(spec.get('xlsx_sidecars', False)))
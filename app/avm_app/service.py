@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from avm_app.avm_utils import find_vendor_file, read_benchmark_file, read_cascade_file
+from avm_app.compact import compact_benchmark, widen_floats
+from avm_app.compressed import data_format
+from avm_app.data_processing import column_phrases
+from avm_app.dedup import dedup_benchmark
+from avm_app.file_operations import read_files_once, summary_tables, write_results_to_excel
+from avm_app.profiles import load_profile
+from avm_app.simulation import cascade_models, iter_match_batches
+from avm_app.vendor_registry import VENDORS
+from avm_app.vendor_store import SharedVendorStore, canonical_vendor_arrays
+
+DEFAULT_PORT = 8765
+
+# Column order of inline benchmark rows given as lists
+INLINE_ROW_COLUMNS = ['Ref ID', 'State', 'County', 'AppraisedValue']
+
+
+class WarmVendorData:
+    """
+    The vendor files of one AVM folder, reduced to canonical arrays (see
+    canonical_vendor_arrays) and kept in memory between jobs.
+
+    refresh() locates each requested model's file the usual way and reads it
+    only when it is new or its mtime or size changed since it was loaded, then
+    returns an in-memory SharedVendorStore over the requested models.
+    """
+
+    def __init__(self, avm_folder, column_phrases):
+        self.avm_folder = avm_folder
+        self.column_phrases = column_phrases
+        self._lock = threading.Lock()
+        self._vendors = {}
+
+    def _source(self, model):
+        file_name = find_vendor_file(self.avm_folder, model)
+        if not file_name or data_format(os.path.join(self.avm_folder, file_name)) not in ('.csv', '.xlsx'):
+            return None
+        return os.path.join(self.avm_folder, file_name)
+
+    def refresh(self, models):
+        with self._lock:
+            for model in models:
+                file_path = self._source(model)
+                if file_path is None:
+                    self._vendors.pop(model, None)
+                    continue
+                stat = os.stat(file_path)
+                current = self._vendors.get(model)
+                if current is not None and (current['file'], current['mtime'], current['size']) == (file_path, stat.st_mtime, stat.st_size):
+                    continue
+
+                model_file_data = read_files_once([model], self.avm_folder)
+                arrays = canonical_vendor_arrays(model_file_data[model], self.column_phrases) if model in model_file_data else None
+                if arrays is None:
+                    self._vendors.pop(model, None)
+                    continue
+                self._vendors[model] = {'file': file_path, 'mtime': stat.st_mtime, 'size': stat.st_size, 'arrays': arrays}
+                logging.info(f"Loaded {len(arrays['ref_id'])} rows of {file_path} for {model}")
+            return SharedVendorStore(None, {model: self._vendors[model]['arrays'] for model in models if model in self._vendors})
+
+    def status(self):
+        with self._lock:
+            return [{'model': model, 'file': entry['file'], 'mtime': entry['mtime'], 'rows': int(len(entry['arrays']['ref_id']))}
+                    for model, entry in self._vendors.items()]
+
+
+def _job_benchmark(job, desired_forms):
+    """
+    The benchmark of a job: "benchmark_file" (filtered to the profile's forms)
+    or inline "rows", either {"Ref ID", "State", "County", "Value"} objects or
+    [Ref ID, State, County, value] lists. Inline rows are not form-filtered
+    but are deduplicated by Ref ID like benchmark files.
+    """
+    if 'benchmark_file' in job:
+        return read_benchmark_file(job['benchmark_file'], desired_forms)
+    rows = job['rows']
+    if not rows:
+        raise ValueError("The job has no benchmark rows")
+    if isinstance(rows[0], (list, tuple)):
+        benchmark_df = pd.DataFrame(rows, columns=INLINE_ROW_COLUMNS)
+    else:
+        benchmark_df = pd.DataFrame(rows).rename(columns={'Value': 'AppraisedValue'})
+    missing = [col for col in INLINE_ROW_COLUMNS if col not in benchmark_df.columns]
+    if missing:
+        raise ValueError(f"Inline rows are missing {missing}")
+    return dedup_benchmark(compact_benchmark(benchmark_df))[0]
+
+
+def _job_cascade(job):
+    """
+    The cascade of a job: "cascade_file" or inline "cascade" rows
+    ({"State", "County", "Model 1", ...} objects).
+    """
+    if 'cascade_file' in job:
+        return read_cascade_file(job['cascade_file'])
+    cascade_df = pd.DataFrame(job['cascade'])
+    for col in ['Zip', 'CBSA']:
+        if col in cascade_df.columns:
+            cascade_df[col] = cascade_df[col].where(cascade_df[col].isna(), cascade_df[col].astype(str))
+    return VENDORS.canonical_names(cascade_df)
+
+
+def _records(table_df, write_index):
+    return json.loads((table_df.reset_index() if write_index else table_df).to_json(orient='records'))
+
+
+def run_service_job(job, warm_data, profiles_data):
+    """
+    Runs one service job against warm vendor data and returns its JSON-ready
+    response: row and hit counts, hit rate, the statistics tables (see
+    summary_tables) and, with "return_rows", the per-row results. With
+    "output_file" the usual workbook is written too.
+    """
+    start_time = time.monotonic()
+    min_conf_scores, desired_forms, max_fsd_values, _ = load_profile(profiles_data, job.get('profile', 'Default'))
+    benchmark_df = _job_benchmark(job, desired_forms)
+    if benchmark_df.empty:
+        raise ValueError("The job has no benchmark rows")
+    cascade_df = _job_cascade(job)
+    store = warm_data.refresh([model for model in cascade_models(cascade_df) if isinstance(model, str)])
+
+    results_df = pd.concat(list(iter_match_batches(benchmark_df, cascade_df, store, min_conf_scores, max_fsd_values)),
+                           ignore_index=True)
+    if job.get('output_file'):
+        write_results_to_excel(results_df, job['output_file'], min_conf_scores, max_fsd_values)
+
+    hits = int(results_df['AVM Value'].notna().sum())
+    response = {
+        'rows': len(results_df),
+        'hits': hits,
+        'hit_rate': hits / len(results_df),
+        'tables': {sheet_name: _records(table_df, write_index)
+                   for sheet_name, table_df, write_index, _ in summary_tables(results_df, min_conf_scores, max_fsd_values)},
+    }
+    if job.get('return_rows'):
+        response['results'] = _records(widen_floats(results_df), False)
+    if job.get('output_file'):
+        response['output_file'] = job['output_file']
+    response['seconds'] = time.monotonic() - start_time
+    return response
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET /status lists the warm vendor data; POST /jobs runs a JSON job (see
+    run_service_job) and answers with its results.
+    """
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        self._send_json(200, {'avm_folder': self.server.warm_data.avm_folder, 'vendors': self.server.warm_data.status()})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            response = run_service_job(job, self.server.warm_data, self.server.profiles_data)
+        except (KeyError, ValueError, OSError) as e:
+            self._send_json(400, {'error': str(e) if not isinstance(e, KeyError) else f"Missing field {e}"})
+            return
+        except Exception as e:
+            logging.exception("Service job failed")
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, response)
+
+    def log_message(self, format, *args):
+        logging.info(format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(avm_folder, profiles_data, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None, preload=None):
+    """
+    Runs the simulation service for one AVM folder until interrupted.
+
+    Listens on host:port, or on the Unix socket socket_path when given. The
+    vendor files of the preload models (default: every model the profiles
+    set thresholds for) are loaded before the first request; other models
+    are loaded on first use. A vendor file is read again only when its mtime
+    or size changes, so jobs pay only for matching.
+    """
+    warm_data = WarmVendorData(avm_folder, column_phrases)
+    if preload is None:
+        preload = sorted({model for profile in profiles_data['profiles'].values() for model in profile.get('min_conf_scores', {})})
+    warm_data.refresh(preload)
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _ServiceHandler)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), _ServiceHandler)
+        address = f"http://{host}:{port}"
+    server.warm_data = warm_data
+    server.profiles_data = profiles_data
+    print(f"Serving {avm_folder} on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
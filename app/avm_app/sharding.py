@@ -0,0 +1,112 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from avm_app.aggregates import ResultAggregates
+from avm_app.simulation import ProcessingCancelled, attached_store, iter_match_batches
+
+# Multiplier of the Ref ID hash used by partition_benchmark(by='hash')
+_HASH_MULTIPLIER = 2654435761
+
+
+def partition_benchmark(benchmark_df, shard_count, by='State'):
+    """
+    Splits the benchmark rows into at most shard_count shards and returns one
+    array of row positions per non-empty shard.
+
+    - by='State' keeps each state in a single shard, assigning the largest
+      states first to the currently smallest shard, so per-state work and the
+      vendor rows it touches stay together.
+    - by='hash' spreads rows evenly by a multiplicative hash of the Ref ID.
+    """
+    row_count = len(benchmark_df)
+    if shard_count <= 1 or row_count == 0:
+        return [np.arange(row_count)]
+
+    if by == 'State':
+        state_codes, states = pd.factorize(benchmark_df['State'].astype(object), use_na_sentinel=False)
+        state_sizes = np.bincount(state_codes, minlength=len(states))
+        shard_of_state = np.empty(len(states), dtype=np.int64)
+        shard_sizes = np.zeros(shard_count, dtype=np.int64)
+        for state in np.argsort(-state_sizes, kind='stable'):
+            shard = int(np.argmin(shard_sizes))
+            shard_of_state[state] = shard
+            shard_sizes[shard] += state_sizes[state]
+        shard_ids = shard_of_state[state_codes]
+    elif by == 'hash':
+        ref_ids = pd.to_numeric(benchmark_df['Ref ID'], errors='coerce').fillna(0).to_numpy(dtype='float64')
+        hashed = (np.trunc(ref_ids).astype('int64').astype('uint64') * np.uint64(_HASH_MULTIPLIER)) % np.uint64(2 ** 32)
+        shard_ids = (hashed % np.uint64(shard_count)).astype(np.int64)
+    else:
+        raise ValueError(f"Unknown shard key {by!r}; use 'State' or 'hash'")
+
+    order = np.argsort(shard_ids, kind='stable')
+    boundaries = np.searchsorted(shard_ids[order], np.arange(1, shard_count))
+    return [rows for rows in np.split(order, boundaries) if len(rows)]
+
+
+def run_shard(store_class, store_path, shard_df, cascade_df, min_conf_scores, max_fsd_values):
+    """
+    Worker entry point for one shard: attaches to the vendor store, matches
+    the shard's rows in-process and folds each batch of results into a
+    ResultAggregates as it comes out of the matcher. Only the aggregates are
+    returned, so no per-row results are held or sent back to the coordinator.
+    """
+    store = attached_store(store_class, store_path)
+    aggregates = ResultAggregates()
+    for results_df in iter_match_batches(shard_df, cascade_df, store, min_conf_scores, max_fsd_values):
+        aggregates.update(results_df)
+    return aggregates
+
+
+def run_sharded(benchmark_df, cascade_df, vendor_store, min_conf_scores, max_fsd_values, shard_count=None,
+                by='State', max_workers=None, progress_callback=None, cancel_event=None):
+    """
+    Runs a simulation as independent shards and merges their partial
+    aggregates into one ResultAggregates.
+
+    vendor_store must be attachable by path (SharedVendorStore or
+    SqliteVendorStore). Shards run on a local process pool, standing in for
+    separate worker nodes: each only needs the store path, its benchmark rows
+    and the cascade, and returns mergeable aggregates.
+
+    - shard_count defaults to the CPU count; by is passed to partition_benchmark.
+    - progress_callback, if given, is called after each finished shard with a
+      dict of shards_done, shard_count, rows_done, row_count and rows_per_sec.
+    - cancel_event, if given and set, stops the run between shards by raising
+      ProcessingCancelled.
+    """
+    shard_count = shard_count or os.cpu_count() or 1
+    benchmark_df = benchmark_df.reset_index(drop=True)
+    shards = partition_benchmark(benchmark_df, shard_count, by=by)
+
+    aggregates = ResultAggregates()
+    start_time = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(shards), os.cpu_count() or 1)) as executor:
+        futures = {
+            executor.submit(run_shard, type(vendor_store), vendor_store.path, benchmark_df.iloc[rows],
+                            cascade_df, min_conf_scores, max_fsd_values): len(rows)
+            for rows in shards
+        }
+        rows_done = 0
+        for shards_done, future in enumerate(as_completed(futures), start=1):
+            aggregates.merge(future.result())
+            rows_done += futures[future]
+            if cancel_event is not None and cancel_event.is_set():
+                for pending in futures:
+                    pending.cancel()
+                raise ProcessingCancelled()
+
+            if progress_callback is not None:
+                elapsed = time.monotonic() - start_time
+                progress_callback({
+                    'shards_done': shards_done,
+                    'shard_count': len(shards),
+                    'rows_done': rows_done,
+                    'row_count': len(benchmark_df),
+                    'rows_per_sec': rows_done / elapsed if elapsed > 0 else 0.0,
+                })
+    return aggregates
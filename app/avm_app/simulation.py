@@ -0,0 +1,335 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from avm_app.cascade_index import CascadeIndex
+from avm_app.compact import compact_float
+from avm_app.data_processing import match_batch
+from avm_app.vendor_store import SharedVendorStore, canonical_vendor_arrays
+
+RESULT_COLUMNS = ['Ref ID', 'State', 'County', 'Benchmark Value', 'AVM Value', '% Diff between AVM and Benchmark', 'AVM Name', 'AVM Conf Score', 'FSD Value', 'Model Position']
+
+# Batch sizing for process_benchmark (see BatchScheduler): bounds on the rows
+# per batch, how many batches each worker should get before anything has been
+# measured, the run time a batch is sized for once throughput is known, and
+# how many batches per worker may be queued or running at once
+MIN_BATCH_ROWS = 500
+MAX_BATCH_ROWS = 50000
+INITIAL_BATCHES_PER_WORKER = 4
+TARGET_BATCH_SECONDS = 1.0
+IN_FLIGHT_PER_WORKER = 2
+
+
+class ProcessingCancelled(Exception):
+    """Raised when a run is cancelled between batches."""
+
+
+def cascade_models(cascade_df):
+    """
+    Returns the unique model names referenced by the 'Model 1'..'Model 3' columns
+    of a cascade DataFrame.
+    """
+    available_models = [col for col in ['Model 1', 'Model 2', 'Model 3'] if col in cascade_df.columns]
+    return pd.unique(cascade_df[available_models].values.ravel('K'))
+
+
+def output_file_for(output_directory, avm_folder, cascade_path):
+    """
+    Builds the workbook path for one AVM folder / cascade combination:
+    <output_directory>/<avm folder name>_<cascade name>.xlsx
+    """
+    return f"{output_directory}/{os.path.basename(avm_folder)}_{os.path.basename(cascade_path).replace('.csv', '')}.xlsx"
+
+
+def resolve_row_models(cascade_df, benchmark_df, model_names):
+    """
+    Resolves the cascade models of every benchmark row at once through a
+    CascadeIndex (ZIP -> CBSA -> County -> State -> default).
+
+    Returns (model_positions, codes) where codes is an int16 array of shape
+    (positions, rows) indexing model_names, -1 for no model.
+    """
+    cascade_index = CascadeIndex(cascade_df)
+    return cascade_index.model_positions, cascade_index.model_codes(cascade_index.resolve(benchmark_df), model_names)
+
+
+# Stores attached by this worker process, keyed by (store class, store path)
+_attached_stores = {}
+
+
+def _match_batch_in_worker(store_class, store_path, ref_ids, valid, codes, model_positions, model_names, min_conf_scores, max_fsd_values):
+    """
+    Process-pool entry point: attaches to the vendor store (once per worker
+    process) and matches one batch.
+    """
+    return _match_codes(attached_store(store_class, store_path), ref_ids, valid, codes, model_positions, model_names,
+                        min_conf_scores, max_fsd_values)
+
+
+def attached_store(store_class, store_path):
+    """
+    Returns this process's attachment to the vendor store at store_path,
+    attaching on first use.
+    """
+    store = _attached_stores.get((store_class, store_path))
+    if store is None:
+        store = _attached_stores[(store_class, store_path)] = store_class.attach(store_path)
+    return store
+
+
+def _match_codes(store, ref_ids, valid, codes, model_positions, model_names, min_conf_scores, max_fsd_values):
+    names = np.array(list(model_names) + [None], dtype=object)
+    row_models = [(position, names[np.where(valid, position_codes, -1)]) for position, position_codes in zip(model_positions, codes)]
+    return match_batch(ref_ids, row_models, store, min_conf_scores, max_fsd_values)
+
+
+def store_matches(columns, start, matched, model_names, model_positions):
+    """
+    Copies one match_batch result into the (avm, conf, fsd, name code,
+    position code) column arrays from row start on. Returns the row count.
+    """
+    avm_values, conf_scores, fsd_values, avm_names, positions = columns
+    hits = ~np.isnan(matched['avm'])
+    stop = start + len(hits)
+    avm_values[start:stop] = matched['avm']
+    conf_scores[start:stop] = matched['conf']
+    fsd_values[start:stop] = matched['fsd']
+    avm_names[start:stop] = np.where(hits, pd.Categorical(matched['model_name'], categories=model_names).codes, -1)
+    positions[start:stop] = np.where(hits, pd.Categorical(matched['model_position'], categories=model_positions).codes, -1)
+    return len(hits)
+
+
+def benchmark_values_for(benchmark_df):
+    """
+    Benchmark value of every row: ContractPrice where present and non-zero,
+    otherwise AppraisedValue.
+    """
+    appraised = pd.to_numeric(benchmark_df['AppraisedValue'], errors='coerce')
+    if 'ContractPrice' in benchmark_df.columns:
+        contract = pd.to_numeric(benchmark_df['ContractPrice'], errors='coerce')
+        return np.where(contract.notna() & (contract != 0), contract, appraised)
+    return appraised.to_numpy()
+
+
+def numeric_ref_ids(benchmark_df):
+    """
+    Returns (ref_ids, valid): the benchmark Ref IDs as truncated int64 (0 where
+    not numeric) and the mask of numeric ones, as the vendor stores expect.
+    """
+    numeric_ids = pd.to_numeric(benchmark_df['Ref ID'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~np.isnan(numeric_ids)
+    return np.where(valid, np.trunc(numeric_ids), 0).astype('int64'), valid
+
+
+def results_frame(benchmark_df, benchmark_values, avm_values, conf_scores, fsd_values, avm_names, positions, model_names, model_positions):
+    """
+    Assembles the results DataFrame (RESULT_COLUMNS) from the per-row match
+    arrays; avm_names and positions are codes into model_names and
+    model_positions, -1 where nothing matched. Confidence scores and FSDs are
+    matched as float64 and narrowed with compact_float, so only exactly
+    representable values (e.g. whole confidence scores) become float32.
+    The % diff is kept as float32; writers widen it with widen_floats.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_diff = ((avm_values - benchmark_values) / benchmark_values).astype(np.float32)
+
+    return pd.DataFrame({
+        'Ref ID': benchmark_df['Ref ID'],
+        'State': benchmark_df['State'],
+        'County': benchmark_df['County'],
+        'Benchmark Value': benchmark_values,
+        'AVM Value': avm_values,
+        '% Diff between AVM and Benchmark': pct_diff,
+        'AVM Name': pd.Categorical.from_codes(avm_names, categories=model_names),
+        'AVM Conf Score': compact_float(pd.Series(conf_scores)).to_numpy(),
+        'FSD Value': compact_float(pd.Series(fsd_values)).to_numpy(),
+        'Model Position': pd.Categorical.from_codes(positions, categories=model_positions),
+    }, columns=RESULT_COLUMNS)
+
+
+def iter_match_batches(benchmark_df, cascade_df, vendor_store, min_conf_scores, max_fsd_values, batch_size=10000):
+    """
+    Matches a benchmark against the cascade in the calling process with
+    match_batch and yields one results DataFrame (RESULT_COLUMNS) per
+    batch_size rows, so callers can aggregate results as they stream out
+    instead of holding every row.
+    """
+    benchmark_df = benchmark_df.reset_index(drop=True)
+    model_names = [model for model in cascade_models(cascade_df) if isinstance(model, str)]
+    model_positions = [col for col in cascade_df.columns if col.startswith('Model')]
+    ref_ids, valid = numeric_ref_ids(benchmark_df)
+    resolved_positions, codes = resolve_row_models(cascade_df, benchmark_df, model_names)
+    benchmark_values = benchmark_values_for(benchmark_df)
+
+    for start in range(0, len(benchmark_df), batch_size):
+        stop = min(start + batch_size, len(benchmark_df))
+        row_count = stop - start
+        columns = (np.full(row_count, np.nan), np.full(row_count, np.nan), np.full(row_count, np.nan),
+                   np.full(row_count, -1, dtype=np.int16), np.full(row_count, -1, dtype=np.int8))
+        matched = _match_codes(vendor_store, ref_ids[start:stop], valid[start:stop], codes[:, start:stop],
+                               resolved_positions, model_names, min_conf_scores, max_fsd_values)
+        store_matches(columns, 0, matched, model_names, model_positions)
+        yield results_frame(benchmark_df.iloc[start:stop], benchmark_values[start:stop], *columns, model_names, model_positions)
+
+
+class BatchScheduler:
+    """
+    Splits row_count rows into batches on the fly and runs them through
+    submit(start, stop), which must return a Future.
+
+    - The first batches are sized from the row count and the worker count so
+      that even small benchmarks spread over every worker.
+    - Later batches are sized from the measured throughput to take about
+      TARGET_BATCH_SECONDS each, and shrink towards the end so the last rows
+      are shared between the workers instead of landing on one of them.
+    - At most IN_FLIGHT_PER_WORKER batches per worker are queued or running,
+      so memory stays bounded; a worker that finishes simply picks up the
+      next batch.
+
+    Iterating yields (start, stop, result) as each batch completes, in
+    completion order, so one slow batch does not hold back the others.
+    """
+
+    def __init__(self, submit, row_count, workers, cancel_event=None):
+        self.submit = submit
+        self.row_count = row_count
+        self.workers = max(1, workers)
+        self.cancel_event = cancel_event
+        self.batch_size = int(np.clip(-(-row_count // (self.workers * INITIAL_BATCHES_PER_WORKER)), MIN_BATCH_ROWS, MAX_BATCH_ROWS))
+        self.next_start = 0
+        self.batches_done = 0
+        self.rows_done = 0
+        self.in_flight = {}
+
+    @property
+    def estimated_batch_count(self):
+        remaining = self.row_count - self.next_start
+        return self.batches_done + len(self.in_flight) + -(-remaining // self.batch_size)
+
+    def _next_size(self):
+        remaining = self.row_count - self.next_start
+        tail = -(-remaining // self.workers)
+        return max(min(self.batch_size, tail), min(MIN_BATCH_ROWS, remaining))
+
+    def _fill(self):
+        while self.next_start < self.row_count and len(self.in_flight) < self.workers * IN_FLIGHT_PER_WORKER:
+            stop = self.next_start + self._next_size()
+            self.in_flight[self.submit(self.next_start, stop)] = (self.next_start, stop)
+            self.next_start = stop
+
+    def __iter__(self):
+        start_time = time.monotonic()
+        self._fill()
+        while self.in_flight:
+            done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, stop = self.in_flight.pop(future)
+                result = future.result()
+                self.batches_done += 1
+                self.rows_done += stop - start
+                yield start, stop, result
+
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                for pending in self.in_flight:
+                    pending.cancel()
+                raise ProcessingCancelled()
+
+            elapsed = time.monotonic() - start_time
+            if elapsed > 0:
+                rows_per_worker_sec = self.rows_done / elapsed / self.workers
+                sized = int(rows_per_worker_sec * TARGET_BATCH_SECONDS)
+                # At most double per step, so one fast batch cannot overshoot
+                self.batch_size = int(np.clip(sized, MIN_BATCH_ROWS, min(MAX_BATCH_ROWS, 2 * self.batch_size)))
+            self._fill()
+
+
+def process_benchmark(benchmark_df, cascade_df, model_file_data, column_phrases,
+                      min_conf_scores, max_fsd_values, progress_callback=None, cancel_event=None,
+                      vendor_store=None, max_workers=None):
+    """
+    Matches every benchmark row against the cascade in batches scheduled by a
+    BatchScheduler over max_workers workers (default: the CPU count).
+
+    Every batch is matched as a whole with match_batch. By default batches
+    run on threads sharing an in-memory SharedVendorStore built once from
+    model_file_data (see canonical_vendor_arrays). When vendor_store (a
+    SharedVendorStore or SqliteVendorStore) is given, batches run on a process
+    pool instead: each worker attaches to the store read-only, so vendor data
+    is never copied into the workers and model_file_data is not used.
+
+    Results are written into preallocated typed column arrays (float64 values,
+    float32 diff, float64 confidence / FSD narrowed with compact_float,
+    categorical AVM Name and Model Position) rather than collected as per-row
+    tuples.
+
+    - progress_callback, if given, is called after each batch with a dict of
+      batches_done, batch_count (an estimate, as batches are sized on the
+      fly), rows_done, row_count, rows_per_sec and eta_seconds.
+    - cancel_event, if given and set, stops the run between batches by raising
+      ProcessingCancelled.
+    """
+    row_count = len(benchmark_df)
+    benchmark_df = benchmark_df.reset_index(drop=True)
+
+    benchmark_values = benchmark_values_for(benchmark_df)
+
+    model_names = [model for model in cascade_models(cascade_df) if isinstance(model, str)]
+    model_positions = [col for col in cascade_df.columns if col.startswith('Model')]
+
+    avm_values = np.full(row_count, np.nan)
+    conf_scores = np.full(row_count, np.nan)
+    fsd_values = np.full(row_count, np.nan)
+    avm_names = np.full(row_count, -1, dtype=np.int16)
+    positions = np.full(row_count, -1, dtype=np.int8)
+
+    numeric_ids, valid = numeric_ref_ids(benchmark_df)
+    resolved_positions, codes = resolve_row_models(cascade_df, benchmark_df, model_names)
+
+    def store_results(start, matched):
+        return store_matches((avm_values, conf_scores, fsd_values, avm_names, positions), start, matched, model_names, model_positions)
+
+    if vendor_store is None:
+        # Registry units, scales and filters are applied per model and batch
+        # by match_batch, never per row
+        vendor_arrays = {model: canonical_vendor_arrays(model_df, column_phrases) for model, model_df in model_file_data.items()}
+        memory_store = SharedVendorStore(None, {model: arrays for model, arrays in vendor_arrays.items() if arrays is not None})
+
+        def process_batch(start, stop):
+            if cancel_event is not None and cancel_event.is_set():
+                return 0
+            return store_results(start, _match_codes(memory_store, numeric_ids[start:stop], valid[start:stop], codes[:, start:stop],
+                                                     resolved_positions, model_names, min_conf_scores, max_fsd_values))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    start_time = time.monotonic()
+    executor_class = ThreadPoolExecutor if vendor_store is None else ProcessPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        def submit(start, stop):
+            if vendor_store is None:
+                return executor.submit(process_batch, start, stop)
+            return executor.submit(_match_batch_in_worker, type(vendor_store), vendor_store.path, numeric_ids[start:stop], valid[start:stop],
+                                   codes[:, start:stop], resolved_positions, model_names, min_conf_scores, max_fsd_values)
+
+        scheduler = BatchScheduler(submit, row_count, max_workers, cancel_event=cancel_event)
+        for batch_start, _, result in scheduler:
+            if vendor_store is not None:
+                store_results(batch_start, result)
+
+            if progress_callback is not None:
+                rows_done = scheduler.rows_done
+                elapsed = time.monotonic() - start_time
+                rows_per_sec = rows_done / elapsed if elapsed > 0 else 0.0
+                progress_callback({
+                    'batches_done': scheduler.batches_done,
+                    'batch_count': scheduler.estimated_batch_count,
+                    'rows_done': rows_done,
+                    'row_count': row_count,
+                    'rows_per_sec': rows_per_sec,
+                    'eta_seconds': (row_count - rows_done) / rows_per_sec if rows_per_sec else None,
+                })
+
+    return results_frame(benchmark_df, benchmark_values, avm_values, conf_scores, fsd_values,
+                         avm_names, positions, model_names, model_positions)
@@ -0,0 +1,250 @@
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from avm_app.avm_utils import find_vendor_file
+from avm_app.compressed import data_format
+from avm_app.data_processing import resolve_model_columns
+from avm_app.dedup import dedup_columns, dedup_sort_key
+from avm_app.vendor_registry import VENDORS, csv_read_options
+from avm_app.xlsx_reader import iter_xlsx_chunks, read_xlsx_header
+
+# Rows read from a vendor file per chunk while ingesting
+INGEST_CHUNK_ROWS = 200000
+
+# Batches with at most this many distinct Ref IDs are fetched with one IN-list
+# query; larger batches go through a temporary table join
+IN_LIST_LIMIT = 900
+
+# Stored as PRAGMA user_version; stores of an older layout are rebuilt
+STORE_VERSION = 1
+
+
+def store_path_for(directory, avm_folder):
+    """
+    Location of the SQLite store for an AVM folder: <directory>/<avm folder name>_vendors.sqlite
+    """
+    return os.path.join(directory, f"{os.path.basename(os.path.normpath(avm_folder))}_vendors.sqlite")
+
+
+def read_vendor_header(file_path, model=None):
+    if data_format(file_path) == '.csv':
+        columns = pd.read_csv(file_path, nrows=0, index_col=False, **csv_read_options(file_path, model)).columns
+    else:
+        columns = read_xlsx_header(file_path)
+    return [str(col).strip() for col in columns]
+
+
+def iter_vendor_chunks(file_path, usecols, chunksize, model=None):
+    """
+    Yields the resolved columns of a vendor file in chunks, streaming both
+    CSV and XLSX files. CSVs (plain or compressed) are read with the vendor
+    registry's options for model (or for the file name when model is None).
+    """
+    if data_format(file_path) == '.csv':
+        reader = pd.read_csv(file_path, index_col=False, chunksize=chunksize, low_memory=False,
+                             usecols=lambda col: col.strip() in usecols, **csv_read_options(file_path, model))
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+    else:
+        yield from iter_xlsx_chunks(file_path, columns=lambda header: [col for col in header if col in usecols],
+                                    chunksize=chunksize)
+
+
+class SqliteVendorStore:
+    """
+    Out-of-core vendor store: each vendor file is ingested in chunks into a
+    local SQLite database holding only the normalized Ref ID, AVM value,
+    confidence and FSD columns, indexed on Ref ID. Duplicated Ref IDs are
+    collapsed after ingest by the model's registry dedup rule, ranked on a
+    dedup_key column computed per chunk (see dedup_sort_key). Lookups fetch
+    one batch of Ref IDs at a time, so vendor files larger than RAM can be
+    simulated.
+
+    Exposes the same `model in store` / lookup() interface as
+    SharedVendorStore and can be attached from worker processes by path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._models = None
+
+    @classmethod
+    def build(cls, path, unique_models, avm_folder, column_phrases, chunksize=INGEST_CHUNK_ROWS):
+        """
+        Creates or updates the database at path with one table per model in
+        unique_models, located through the usual keyword search in avm_folder.
+        A vendor is re-ingested only when its file's size or mtime or its
+        dedup rule changed.
+        """
+        connection = sqlite3.connect(path)
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] < STORE_VERSION:
+                cls._drop_all(connection)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS vendors ("
+                "model TEXT PRIMARY KEY, table_name TEXT, source_file TEXT, "
+                "source_mtime REAL, source_size INTEGER, rows INTEGER, "
+                "dedup TEXT, duplicates INTEGER)"
+            )
+            for model in unique_models:
+                file_name = find_vendor_file(avm_folder, model)
+                if not file_name:
+                    continue
+                file_path = os.path.join(avm_folder, file_name)
+                if data_format(file_path) not in ('.csv', '.xlsx'):
+                    continue
+                cls._ingest(connection, model, file_path, column_phrases, chunksize)
+        finally:
+            connection.close()
+        return cls(path)
+
+    @staticmethod
+    def _drop_all(connection):
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall()]
+        for table_name in tables:
+            connection.execute(f"DROP TABLE {table_name}")
+        connection.execute(f"PRAGMA user_version = {STORE_VERSION}")
+        connection.commit()
+
+    @staticmethod
+    def _ingest(connection, model, file_path, column_phrases, chunksize):
+        stat = os.stat(file_path)
+        dedup = VENDORS.rule(model).dedup
+        current = connection.execute(
+            "SELECT source_file, source_mtime, source_size, dedup FROM vendors WHERE model = ?", (model,)
+        ).fetchone()
+        if current == (file_path, stat.st_mtime, stat.st_size, dedup):
+            return
+
+        header = read_vendor_header(file_path, model)
+        resolved = resolve_model_columns(model, header, column_phrases)
+        if not resolved['Ref ID'] or not resolved['AVM Value']:
+            logging.warning(f"Skipping {file_path}: no Ref ID or AVM Value column")
+            return
+
+        existing = connection.execute("SELECT COUNT(*) FROM vendors").fetchone()[0]
+        table_name = connection.execute("SELECT table_name FROM vendors WHERE model = ?", (model,)).fetchone()
+        table_name = table_name[0] if table_name else f"vendor_{existing}"
+
+        connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+        connection.execute(f"CREATE TABLE {table_name} (ref_id INTEGER, avm REAL, conf REAL, fsd REAL, dedup_key REAL)")
+
+        usecols = {col for col in resolved.values() if col} | set(dedup_columns(model, header))
+        rows = 0
+        for chunk in iter_vendor_chunks(file_path, usecols, chunksize, model):
+            def numeric(field):
+                col = resolved[field]
+                if col is None:
+                    return np.full(len(chunk), np.nan)
+                return pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+            ref_ids = numeric('Ref ID')
+            valid = ~np.isnan(ref_ids)
+            sort_key = dedup_sort_key(model, chunk, resolved)
+            frame = pd.DataFrame({
+                'ref_id': np.trunc(ref_ids[valid]).astype('int64'),
+                'avm': numeric('AVM Value')[valid],
+                'conf': numeric('Conf Score')[valid],
+                'fsd': numeric('FSD')[valid],
+                'dedup_key': sort_key[valid] if sort_key is not None else np.nan,
+            })
+            connection.executemany(
+                f"INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?)",
+                frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+            )
+            rows += len(frame)
+
+        # Keep the best-ranked row of each Ref ID; NULL keys rank last, then file order
+        duplicates = connection.execute(
+            f"DELETE FROM {table_name} WHERE rowid IN (SELECT rowid FROM ("
+            f"SELECT rowid, ROW_NUMBER() OVER (PARTITION BY ref_id ORDER BY dedup_key IS NULL, dedup_key, rowid) AS rank "
+            f"FROM {table_name}) WHERE rank > 1)"
+        ).rowcount
+        rows -= duplicates
+
+        connection.execute(f"CREATE INDEX {table_name}_ref_id ON {table_name} (ref_id)")
+        connection.execute(
+            "INSERT OR REPLACE INTO vendors VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (model, table_name, file_path, stat.st_mtime, stat.st_size, rows, dedup, duplicates)
+        )
+        connection.commit()
+        logging.info(f"Ingested {rows} rows of {file_path} into {table_name}, collapsing {duplicates} duplicate Ref ID rows ({dedup})")
+
+    @classmethod
+    def attach(cls, path):
+        return cls(path)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def tables(self):
+        if self._models is None:
+            self._models = dict(self._connection().execute("SELECT model, table_name FROM vendors").fetchall())
+        return self._models
+
+    @property
+    def models(self):
+        return list(self.tables)
+
+    def __contains__(self, model):
+        return model in self.tables
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def lookup(self, model, ref_ids):
+        """
+        Fetches one batch of int64 Ref IDs from a vendor table. Returns (found,
+        avm, conf, fsd) arrays aligned with ref_ids. Tables hold one row per
+        Ref ID after ingest; should one not, its first ingested row wins.
+        """
+        table_name = self.tables[model]
+        ref_ids = np.asarray(ref_ids, dtype='int64')
+        unique_ids = np.unique(ref_ids)
+        connection = self._connection()
+
+        # SQLite returns the other columns from the row that supplied MIN(rowid)
+        select = f"SELECT t.ref_id, t.avm, t.conf, t.fsd, MIN(t.rowid) FROM {table_name} t"
+        if len(unique_ids) <= IN_LIST_LIMIT:
+            placeholders = ",".join("?" * len(unique_ids))
+            rows = connection.execute(f"{select} WHERE t.ref_id IN ({placeholders}) GROUP BY t.ref_id",
+                                      unique_ids.tolist()).fetchall()
+        else:
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS probe (ref_id INTEGER PRIMARY KEY)")
+            connection.execute("DELETE FROM probe")
+            connection.executemany("INSERT INTO probe VALUES (?)", ((ref_id,) for ref_id in unique_ids.tolist()))
+            rows = connection.execute(f"{select} JOIN probe p ON p.ref_id = t.ref_id GROUP BY t.ref_id").fetchall()
+
+        found = np.zeros(len(ref_ids), dtype=bool)
+        avm, conf, fsd = (np.full(len(ref_ids), np.nan) for _ in range(3))
+        if rows:
+            fetched_ids = np.array([row[0] for row in rows], dtype='int64')
+            fetched = np.array([row[1:4] for row in rows], dtype='float64')
+            order = np.argsort(fetched_ids)
+            fetched_ids, fetched = fetched_ids[order], fetched[order]
+            positions = np.minimum(np.searchsorted(fetched_ids, ref_ids), len(fetched_ids) - 1)
+            found = fetched_ids[positions] == ref_ids
+            for values, column in ((avm, 0), (conf, 1), (fsd, 2)):
+                values[found] = fetched[positions[found], column]
+        return found, avm, conf, fsd
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+from itertools import islice
+
+import numpy as np
+
+from avm_app.compressed import inner_name, open_text
+
+# Default registry shipped with the package
+VENDORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendors.json")
+
+# Canonical vendor fields, as named by column_phrases
+VENDOR_FIELDS = ['AVM Value', 'Conf Score', 'Ref ID', 'FSD']
+
+# Rules for picking one row per Ref ID (see avm_app.dedup)
+DEDUP_RULES = ('first', 'latest', 'highest_confidence', 'lowest_fsd')
+
+
+class VendorRule:
+    """
+    One vendor's entry of the registry, compiled for use on whole columns.
+
+    Registry keys (all optional):
+
+    - keywords: file name keywords, tried in order (default: the model name)
+    - file_patterns: case-sensitive file name parts that mark a CSV as this
+      vendor's when no model is known (combine_files), so that it is read
+      with the options below; keywords are never used for that
+    - aliases: other names cascades use for this model
+    - header_offset: rows before the header row of the vendor's CSVs. With a
+      header_marker they are only skipped when the first line does not start
+      with it and the line after the offset does, so files without the
+      preamble are read whole
+    - delimiter: CSV delimiter (default: '|' when the first line has one,
+      otherwise ',')
+    - columns: {field: column} overriding column_phrases for this vendor
+    - confidence_scale: factor bringing confidence scores to 0-100
+    - fsd_unit: 'auto' (values above 1 are percentages), 'percent' or 'fraction'
+    - filter_exempt: 'confidence' and / or 'fsd'; exempt scores are not
+      filtered on ('confidence' also drops the reported score)
+    - dedup: which row a duplicated Ref ID keeps, one of DEDUP_RULES
+      (default 'first', i.e. file order)
+    - date_column: valuation date column for dedup 'latest' (default: found
+      by name, see avm_app.dedup.DATE_PHRASES)
+    """
+
+    def __init__(self, name, spec=None):
+        spec = spec or {}
+        self.name = name
+        self.keywords = list(spec.get('keywords') or [name])
+        self.file_patterns = list(spec.get('file_patterns', []))
+        self.aliases = list(spec.get('aliases', []))
+        self.header_offset = int(spec.get('header_offset', 0))
+        self.header_marker = spec.get('header_marker')
+        self.delimiter = spec.get('delimiter')
+        self.columns = dict(spec.get('columns', {}))
+        self.confidence_scale = float(spec.get('confidence_scale', 1))
+        self.fsd_unit = spec.get('fsd_unit', 'auto')
+        exempt = set(spec.get('filter_exempt', []))
+        self.filters_confidence = 'confidence' not in exempt
+        self.filters_fsd = 'fsd' not in exempt
+        self.dedup = spec.get('dedup', 'first')
+        self.date_column = spec.get('date_column')
+
+        unknown = set(self.columns) - set(VENDOR_FIELDS)
+        if unknown:
+            raise ValueError(f"Vendor {name!r} maps unknown fields {sorted(unknown)}")
+        if self.fsd_unit not in ('auto', 'percent', 'fraction'):
+            raise ValueError(f"Vendor {name!r} has unknown fsd_unit {self.fsd_unit!r}")
+        if self.dedup not in DEDUP_RULES:
+            raise ValueError(f"Vendor {name!r} has unknown dedup rule {self.dedup!r}")
+
+    def confidence(self, conf):
+        """Confidence scores (scalar or array) on the 0-100 scale."""
+        return conf * self.confidence_scale if self.confidence_scale != 1 else conf
+
+    def fsd(self, fsd):
+        """FSD values (scalar or array) as fractions."""
+        if self.fsd_unit == 'percent':
+            return fsd / 100
+        if self.fsd_unit == 'auto':
+            return np.where(fsd > 1, fsd / 100, fsd)
+        return fsd
+
+    @property
+    def has_read_options(self):
+        return bool(self.header_offset or self.delimiter)
+
+    def csv_options(self, file_path):
+        """
+        pandas.read_csv keyword arguments (skiprows, delimiter) for one of this
+        vendor's CSV files (plain or compressed), looking at its first lines only.
+        """
+        with open_text(file_path) as f:
+            lines = [line.strip() for line in islice(f, self.header_offset + 1)]
+        first_line = lines[0] if lines else ''
+        options = {}
+        if not self.header_offset:
+            skip = False
+        elif self.header_marker:
+            skip = (not first_line.startswith(self.header_marker) and len(lines) > self.header_offset
+                    and lines[self.header_offset].startswith(self.header_marker))
+        else:
+            skip = True
+        if skip:
+            options['skiprows'] = self.header_offset
+        if self.delimiter:
+            options['delimiter'] = self.delimiter
+        elif not skip and '|' in first_line:
+            options['delimiter'] = '|'
+        return options
+
+
+class VendorRegistry:
+    """
+    All vendor rules, keyed by model name, plus the alias map cascades are
+    normalized with. Unknown models get a default rule: their own name as the
+    file keyword and no special handling. Those are cached apart from rules,
+    which only ever holds the registered vendors.
+    """
+
+    def __init__(self, vendors):
+        self.rules = {name: VendorRule(name, spec) for name, spec in vendors.items()}
+        self.aliases = {alias: rule.name for rule in self.rules.values() for alias in rule.aliases}
+        self._unregistered = {}
+        self._unregistered_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=VENDORS_FILE):
+        with open(path, 'r') as f:
+            return cls(json.load(f)['vendors'])
+
+    def rule(self, model):
+        if not isinstance(model, str):
+            return _DEFAULT_RULE
+        rule = self.rules.get(model) or self._unregistered.get(model)
+        if rule is None:
+            with self._unregistered_lock:
+                rule = self._unregistered.setdefault(model, VendorRule(model))
+        return rule
+
+    def canonical_names(self, frame):
+        """Returns frame with model aliases replaced by their registry names."""
+        return frame.replace(self.aliases) if self.aliases else frame
+
+    def rule_for_file(self, file_path):
+        """
+        The rule with custom read options one of whose file_patterns appears
+        in the file name (case-sensitive, like the 'Freddie' check of the
+        original reader; the inner name of compressed files), or None.
+        """
+        file_name = inner_name(file_path)
+        for rule in self.rules.values():
+            if rule.has_read_options and any(pattern in file_name for pattern in rule.file_patterns):
+                return rule
+        return None
+
+
+def csv_read_options(file_path, model=None):
+    """
+    read_csv options for a vendor CSV: from the model's rule when given,
+    otherwise from the rule matching the file name; {} / auto-detected
+    delimiter for vendors without custom options.
+    """
+    rule = VENDORS.rule(model) if model is not None else VENDORS.rule_for_file(file_path)
+    return (rule or _DEFAULT_RULE).csv_options(file_path)
+
+
+# Rule of files and names outside the registry
+_DEFAULT_RULE = VendorRule('default')
+
+# Loaded once per process
+VENDORS = VendorRegistry.load()
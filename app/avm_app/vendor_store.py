@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from avm_app.data_processing import resolve_vendor_columns
+
+MANIFEST_FILE = "manifest.json"
+
+# Canonical per-vendor arrays and their on-disk dtypes
+STORE_FIELDS = {
+    'ref_id': 'int64',
+    'avm': 'float64',
+    'conf': 'float64',
+    'fsd': 'float64',
+}
+
+
+def canonical_vendor_arrays(model_df, column_phrases):
+    """
+    Reduces one vendor DataFrame to sorted canonical arrays: ref_id (int64),
+    avm, conf and fsd (float64, NaN where missing).
+
+    Rows without a numeric Ref ID are dropped. Frames from read_files_once
+    already hold one row per Ref ID (see dedup_vendor_frame); should a Ref
+    ID still appear more than once, its first row is kept, which is the row
+    the matcher's iloc[0] lookup would have used. Returns None when the frame has
+    no resolvable Ref ID or AVM column.
+    """
+    resolved = resolve_vendor_columns(model_df.columns, column_phrases)
+    if not resolved['Ref ID'] or not resolved['AVM Value']:
+        return None
+
+    def numeric(field):
+        col = resolved[field]
+        if col is None:
+            return np.full(len(model_df), np.nan)
+        return pd.to_numeric(model_df[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+    ref_ids = pd.to_numeric(model_df[resolved['Ref ID']], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~np.isnan(ref_ids)
+    ref_ids = ref_ids[valid].astype('int64')
+    arrays = {'ref_id': ref_ids, 'avm': numeric('AVM Value')[valid], 'conf': numeric('Conf Score')[valid], 'fsd': numeric('FSD')[valid]}
+
+    order = np.argsort(ref_ids, kind='stable')
+    sorted_ids = ref_ids[order]
+    first = np.ones(len(sorted_ids), dtype=bool)
+    first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    keep = order[first]
+    return {field: values[keep] for field, values in arrays.items()}
+
+
+class SharedVendorStore:
+    """
+    Vendor tables materialized once as memory-mapped .npy files, one set of
+    canonical arrays per model. Worker processes attach to the store directory
+    read-only; attaching only maps the files, nothing is copied or unpickled.
+
+        store = SharedVendorStore.create(model_file_data, column_phrases)
+        ...                                    # in any process:
+        store = SharedVendorStore.attach(store.path)
+        found, avm, conf, fsd = store.lookup('VeroVALUE', ref_ids)
+    """
+
+    def __init__(self, path, arrays, owner=False):
+        self.path = path
+        self.arrays = arrays
+        self.owner = owner
+
+    @classmethod
+    def create(cls, model_file_data, column_phrases, path=None):
+        """
+        Writes the canonical arrays of every vendor in model_file_data to path
+        (a new temporary directory by default) and returns the attached store.
+        A store created in a temporary directory removes it on close().
+        """
+        owner = path is None
+        if owner:
+            path = tempfile.mkdtemp(prefix="avm_store_")
+        os.makedirs(path, exist_ok=True)
+
+        manifest = {'models': {}}
+        for index, (model, model_df) in enumerate(model_file_data.items()):
+            arrays = canonical_vendor_arrays(model_df, column_phrases)
+            if arrays is None:
+                continue
+            files = {}
+            for field, dtype in STORE_FIELDS.items():
+                file_name = f"{index}_{field}.npy"
+                np.save(os.path.join(path, file_name), arrays[field].astype(dtype))
+                files[field] = file_name
+            manifest['models'][model] = {'rows': int(len(arrays['ref_id'])), 'files': files}
+
+        with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=4)
+
+        store = cls.attach(path)
+        store.owner = owner
+        return store
+
+    @classmethod
+    def attach(cls, path):
+        """
+        Maps an existing store directory read-only.
+        """
+        with open(os.path.join(path, MANIFEST_FILE), 'r') as f:
+            manifest = json.load(f)
+        arrays = {
+            model: {field: np.load(os.path.join(path, file_name), mmap_mode='r') for field, file_name in entry['files'].items()}
+            for model, entry in manifest['models'].items()
+        }
+        return cls(path, arrays)
+
+    @property
+    def models(self):
+        return list(self.arrays)
+
+    def __contains__(self, model):
+        return model in self.arrays
+
+    def lookup(self, model, ref_ids):
+        """
+        Looks up an int64 array of Ref IDs in one vendor. Returns (found, avm,
+        conf, fsd) arrays aligned with ref_ids; values are NaN where not found.
+        """
+        arrays = self.arrays[model]
+        stored_ids = arrays['ref_id']
+        ref_ids = np.asarray(ref_ids, dtype='int64')
+        positions = np.searchsorted(stored_ids, ref_ids)
+        positions = np.minimum(positions, max(len(stored_ids) - 1, 0))
+        found = (stored_ids[positions] == ref_ids) if len(stored_ids) else np.zeros(len(ref_ids), dtype=bool)
+
+        def take(field):
+            values = np.full(len(ref_ids), np.nan)
+            values[found] = arrays[field][positions[found]]
+            return values
+
+        return found, take('avm'), take('conf'), take('fsd')
+
+    def close(self):
+        """
+        Drops the mappings and, for a store created in a temporary directory,
+        deletes its files.
+        """
+        self.arrays = {}
+        if self.owner:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
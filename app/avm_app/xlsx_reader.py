@@ -0,0 +1,286 @@
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Sidecar CSVs written next to converted workbooks, in this sub-folder
+SIDECAR_DIRECTORY = '.avm_cache'
+
+# Built-in number formats that display dates (ECMA-376 18.8.30)
+DATE_FORMAT_IDS = set(range(14, 23)) | {45, 46, 47}
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_CELL_REF = re.compile(r'([A-Z]+)')
+
+
+def _column_index(cell_ref):
+    index = 0
+    for char in _CELL_REF.match(cell_ref).group(1):
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    with archive.open('xl/workbook.xml') as f:
+        for _, element in iterparse(f):
+            if element.tag == MAIN_NS + 'sheet':
+                rel_id = element.get(REL_NS + 'id')
+                break
+    with archive.open('xl/_rels/workbook.xml.rels') as f:
+        for _, element in iterparse(f):
+            if element.tag == PACKAGE_REL_NS + 'Relationship' and element.get('Id') == rel_id:
+                target = element.get('Target')
+                break
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, element in iterparse(f):
+            if element.tag == MAIN_NS + 'si':
+                strings.append(''.join(text.text or '' for text in element.iter(MAIN_NS + 't')))
+                element.clear()
+    return strings
+
+
+def _date_styles(archive):
+    """
+    Returns the set of cell style indexes whose number format displays a date.
+    """
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+    custom_date_formats = set()
+    date_styles = set()
+    in_cell_xfs = False
+    style_index = 0
+    with archive.open('xl/styles.xml') as f:
+        for event, element in iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == MAIN_NS + 'cellXfs':
+                    in_cell_xfs = True
+                continue
+            if element.tag == MAIN_NS + 'numFmt':
+                code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', element.get('formatCode', '')).lower()
+                if 'd' in code or 'y' in code:
+                    custom_date_formats.add(int(element.get('numFmtId')))
+            elif element.tag == MAIN_NS + 'cellXfs':
+                in_cell_xfs = False
+            elif element.tag == MAIN_NS + 'xf' and in_cell_xfs:
+                format_id = int(element.get('numFmtId', 0))
+                if format_id in DATE_FORMAT_IDS or format_id in custom_date_formats:
+                    date_styles.add(style_index)
+                style_index += 1
+    return date_styles
+
+
+def _convert(cell_type, text, style, date_styles):
+    """
+    Converts the raw text of one cell according to its type attribute.
+    """
+    if cell_type == 'inlineStr':
+        return text or None
+    if text is None:
+        return None
+    if cell_type in ('str', 'd'):
+        return text
+    if cell_type == 'b':
+        return text == '1'
+    if cell_type == 'e':
+        return None
+    number = float(text)
+    if style is not None and date_styles and int(style) in date_styles:
+        return EXCEL_EPOCH + timedelta(days=number)
+    return number
+
+
+def _iter_sheet_rows(stream, shared_strings, date_styles, wanted_indexes):
+    """
+    Yields one {column index: value} dict per sheet row. Each row element is
+    detached from <sheetData> as soon as it is read, so the parsed tree never
+    holds more than the current row and memory stays flat for any sheet size.
+    wanted_indexes['indexes'] is a set of column indexes to convert (None for
+    every column) that the caller may fill in after seeing the header row.
+    """
+    row_tag, cell_tag = MAIN_NS + 'row', MAIN_NS + 'c'
+    value_tag, text_tag = MAIN_NS + 'v', MAIN_NS + 't'
+    sheet_data_tag = MAIN_NS + 'sheetData'
+    column_indexes = {}
+    sheet_data = None
+
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == sheet_data_tag:
+                sheet_data = element
+            continue
+        if element.tag != row_tag:
+            continue
+        wanted = wanted_indexes['indexes']
+        cells = {}
+        for position, cell in enumerate(element.iter(cell_tag)):
+            cell_ref = cell.get('r')
+            if cell_ref:
+                letters = cell_ref.rstrip('0123456789')
+                index = column_indexes.get(letters)
+                if index is None:
+                    index = column_indexes[letters] = _column_index(letters)
+            else:
+                index = position
+            if wanted is not None and index not in wanted:
+                continue
+
+            cell_type = cell.get('t', 'n')
+            if cell_type == 'inlineStr':
+                text = ''.join(part.text or '' for part in cell.iter(text_tag))
+            else:
+                value = cell.find(value_tag)
+                text = value.text if value is not None else None
+            if cell_type == 's' and text is not None:
+                cells[index] = shared_strings[int(text)]
+            else:
+                cells[index] = _convert(cell_type, text, cell.get('s'), date_styles)
+        element.clear()
+        if sheet_data is not None:
+            sheet_data.remove(element)
+        yield cells
+
+
+def _typed_column(values):
+    """
+    Turns one column's Python values into a typed array: int64 for whole
+    numbers without gaps, float64 for other numbers, datetime64 for dates and
+    object for everything else.
+    """
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, float) for value in present):
+        array = np.array([np.nan if value is None else value for value in values], dtype='float64')
+        if len(present) == len(values) and np.all(np.mod(array, 1) == 0) and np.all(np.abs(array) < 2 ** 53):
+            return array.astype('int64')
+        return array
+    if present and all(isinstance(value, datetime) for value in present):
+        return pd.to_datetime(pd.Series(values, dtype=object)).to_numpy()
+    return np.array(values, dtype=object)
+
+
+def _header_names(cells):
+    names = []
+    for index in range(max(cells) + 1 if cells else 0):
+        value = cells.get(index)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        names.append(str(value).strip() if value not in (None, '') else f'Unnamed: {index}')
+    return names
+
+
+def iter_xlsx_chunks(file_path, columns=None, chunksize=None, skiprows=0):
+    """
+    Streams the first sheet of an .xlsx file straight from its XML, without
+    building openpyxl cell objects, and yields DataFrames of up to chunksize
+    rows (one DataFrame when chunksize is None).
+
+    - columns: optional callable receiving the list of (stripped) header names
+      and returning the names to keep; other columns are never converted.
+    - skiprows: number of rows before the header row.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        shared_strings = _shared_strings(archive)
+        date_styles = _date_styles(archive)
+        sheet_path = _first_sheet_path(archive)
+
+        header = None
+        wanted = None
+        wanted_indexes = {'indexes': None}
+        rows_seen = 0
+        buffer = []
+
+        def flush():
+            data = {name: _typed_column([row.get(index) for row in buffer]) for index, name in wanted}
+            buffer.clear()
+            return pd.DataFrame(data, columns=[name for _, name in wanted])
+
+        with archive.open(sheet_path) as f:
+            for cells in _iter_sheet_rows(f, shared_strings, date_styles, wanted_indexes):
+                rows_seen += 1
+                if rows_seen <= skiprows:
+                    continue
+
+                if header is None:
+                    header = _header_names(cells)
+                    keep = set(columns(header)) if columns is not None else set(header)
+                    wanted = [(index, name) for index, name in enumerate(header) if name in keep]
+                    wanted_indexes['indexes'] = {index for index, _ in wanted}
+                    continue
+
+                if cells:
+                    buffer.append(cells)
+                if chunksize and len(buffer) >= chunksize:
+                    yield flush()
+
+        if wanted is None:
+            yield pd.DataFrame()
+        elif buffer or not chunksize:
+            yield flush()
+
+
+def read_xlsx(file_path, columns=None, skiprows=0, sidecar=False):
+    """
+    Reads the first sheet of an .xlsx file with iter_xlsx_chunks.
+
+    With sidecar=True the full sheet is also saved as a CSV in a
+    SIDECAR_DIRECTORY sub-folder on first read, and later reads use that CSV
+    for as long as it is newer than the workbook.
+    """
+    if sidecar:
+        sidecar_file = sidecar_path(file_path)
+        if os.path.exists(sidecar_file) and os.path.getmtime(sidecar_file) >= os.path.getmtime(file_path):
+            usecols = None
+            if columns is not None:
+                header = list(pd.read_csv(sidecar_file, nrows=0).columns)
+                usecols = columns(header)
+            return pd.read_csv(sidecar_file, usecols=usecols, low_memory=False, float_precision='round_trip')
+
+        full_df = pd.concat(list(iter_xlsx_chunks(file_path, skiprows=skiprows)), ignore_index=True)
+        os.makedirs(os.path.dirname(sidecar_file), exist_ok=True)
+        # Written aside and renamed, so a concurrent read never sees half a sidecar
+        partial_file = f"{sidecar_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        full_df.to_csv(partial_file, index=False)
+        os.replace(partial_file, sidecar_file)
+        if columns is not None:
+            return full_df[columns(list(full_df.columns))]
+        return full_df
+
+    return pd.concat(list(iter_xlsx_chunks(file_path, columns=columns, skiprows=skiprows)), ignore_index=True)
+
+
+def read_xlsx_header(file_path, skiprows=0):
+    """
+    Returns the stripped header names of the first sheet, parsing only up to
+    the header row.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        shared_strings = _shared_strings(archive)
+        with archive.open(_first_sheet_path(archive)) as f:
+            for rows_seen, cells in enumerate(_iter_sheet_rows(f, shared_strings, set(), {'indexes': None}), start=1):
+                if rows_seen > skiprows:
+                    return _header_names(cells)
+    return []
+
+
+def sidecar_path(file_path):
+    folder, file_name = os.path.split(file_path)
+    return os.path.join(folder, SIDECAR_DIRECTORY, file_name + '.csv')
@@ -1,8 +1,5 @@
-import tkinter as tk
-from avm_app.combine_files import combine_files
+import argparse
 from avm_app.profiles import load_profiles, save_profiles, load_profile
-from avm_app.gui import AVMApp
-from avm_app import read_benchmark_file, read_cascade_file, read_files_once, find_avm_score_parallel, write_results_to_excel, column_phrases
 
 # Load profiles
 profiles = load_profiles(
@@ -54,8 +51,58 @@ profiles = load_profiles(
 
 # Create and run the application
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AVM cascade simulation")
+    parser.add_argument('--jobs', help="Run a JSON job specification headless instead of opening the GUI")
+    parser.add_argument('--coverage', action='store_true',
+                        help="With --jobs, only report vendor Ref ID coverage and best-case hit rates (no matching)")
+    parser.add_argument('--serve', metavar='AVM_FOLDER',
+                        help="Keep an AVM folder's vendor data loaded and run jobs posted to a local HTTP service")
+    parser.add_argument('--port', type=int, default=8765, help="Port of the --serve service on 127.0.0.1")
+    parser.add_argument('--socket', help="Serve on this Unix socket instead of a TCP port")
+    parser.add_argument('--calibrate', nargs=2, metavar=('BENCHMARK_FILE', 'AVM_FOLDER'),
+                        help="Write per-vendor accuracy-vs-confidence/FSD curves to the --output workbook")
+    parser.add_argument('--output', default='calibration.xlsx', help="Workbook written by --calibrate")
+    parser.add_argument('--profile', default='Default', help="Profile whose forms and cutoffs --calibrate uses")
+    parser.add_argument('--target-ppe10', type=float, default=0.70, help="PPE10 the recommended cutoffs must reach")
+    parser.add_argument('--target-hit-rate', type=float, help="Also recommend the strictest cutoffs reaching this hit rate")
+    args = parser.parse_args()
+
+    # The GUI and the job runner import their own dependencies, so each mode
+    # only loads what it uses
+    if args.serve:
+        from avm_app.service import serve
+        serve(args.serve, profiles, port=args.port, socket_path=args.socket)
+        raise SystemExit(0)
+
+    if args.calibrate:
+        from avm_app import run_calibration
+        run_calibration(*args.calibrate, args.output, profiles, profile=args.profile,
+                        target_ppe10=args.target_ppe10, target_hit_rate=args.target_hit_rate)
+        print(f"Calibration curves written to {args.output}")
+        raise SystemExit(0)
+
+    if args.jobs and args.coverage:
+        from avm_app import run_coverage_spec
+        for report in run_coverage_spec(args.jobs, profiles):
+            print(f"\n{report['benchmark_file']} x {report['avm_folder']}")
+            print(report['vendors'].to_string(index=False))
+            print(report['cascades'].to_string(index=False))
+        raise SystemExit(0)
+
+    if args.jobs:
+        from avm_app import run_job_spec
+        outcomes = run_job_spec(args.jobs, profiles)
+        for outcome in outcomes:
+            print(f"{outcome['status']:>9}  {outcome['job']['output_file']}" + (f"  ({outcome['error']})" if outcome['error'] else ""))
+        raise SystemExit(0 if all(outcome['status'] == 'done' for outcome in outcomes) else 1)
+
+    import tkinter as tk
+    from avm_app.combine_files import combine_files
+    from avm_app.gui import AVMApp
+    from avm_app import read_benchmark_file, read_cascade_file, read_files_once, write_results_to_excel, column_phrases
+
     root = tk.Tk()
     app = AVMApp(root, profiles, combine_files,
-                 read_benchmark_file, read_cascade_file, read_files_once, find_avm_score_parallel,
+                 read_benchmark_file, read_cascade_file, read_files_once,
                  write_results_to_excel, column_phrases)
     root.mainloop()
@@ -4,11 +4,16 @@ setup(
     name='avm_app',
     version='0.1',
     packages=find_packages(),
+    package_data={'avm_app': ['vendors.json']},
     install_requires=[
         'pandas',
         'numpy',
         'openpyxl'
     ],
+    extras_require={
+        # Reading .zst compressed vendor and benchmark files
+        'zstd': ['zstandard']
+    },
     entry_points={
         'console_scripts': [
             'avm_app = avm_app.main:main'
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from avm_app.calibration import CURVE_POINTS, MIN_RECOMMENDED_HITS, calibration_curves, cutoff_curve, recommended_cutoffs
+from avm_app.data_processing import column_phrases
+
+ROW_COUNT = 1000
+
+
+def _hits(hit_count=600, distinct_scores=40, seed=11):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, distinct_scores, hit_count).astype('float64')
+    scores[rng.random(hit_count) < 0.1] = np.nan
+    pct_diff = rng.normal(0, 0.12, hit_count)
+    return scores, pct_diff
+
+
+def _brute_force(scores, pct_diff, cutoff, descending):
+    passes = scores >= cutoff if descending else np.isnan(scores) | (scores <= cutoff)
+    diff = pct_diff[passes]
+    within = int((np.abs(diff) <= 0.10).sum())
+    return len(diff), within, within / len(diff), np.median(diff)
+
+
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('distinct_scores', [40, 500])
+def test_curve_matches_brute_force_filter(descending, distinct_scores):
+    scores, pct_diff = _hits(distinct_scores=distinct_scores)
+    curve = cutoff_curve(scores, pct_diff, ROW_COUNT, descending)
+
+    distinct = np.unique(scores[~np.isnan(scores)])
+    assert len(curve) == min(len(distinct), CURVE_POINTS)
+    # Strictest cutoff first, loosest last, even when sampled
+    assert curve['Cutoff'].iloc[0] == (distinct.max() if descending else distinct.min())
+    assert curve['Cutoff'].iloc[-1] == (distinct.min() if descending else distinct.max())
+    assert curve['Hits'].is_monotonic_increasing
+
+    for point in curve.to_dict('records'):
+        hits, within, ppe10, median = _brute_force(scores, pct_diff, point['Cutoff'], descending)
+        assert point['Hits'] == hits
+        assert point['Within 10%'] == within
+        assert point['PPE10'] == pytest.approx(ppe10)
+        assert point['Median Error'] == pytest.approx(median)
+        assert point['Hit Rate'] == pytest.approx(hits / ROW_COUNT)
+
+
+def test_nan_scores_never_pass_confidence_and_always_pass_fsd():
+    scores = np.array([np.nan, 90.0, 80.0, np.nan])
+    pct_diff = np.array([0.0, 0.05, 0.2, 0.0])
+    confidence = cutoff_curve(scores, pct_diff, 4, descending=True)
+    assert confidence['Cutoff'].tolist() == [90.0, 80.0]
+    assert confidence['Hits'].tolist() == [1, 2]
+
+    fsd = cutoff_curve(scores / 1000, pct_diff, 4, descending=False)
+    assert fsd['Cutoff'].tolist() == [0.08, 0.09]
+    assert fsd['Hits'].tolist() == [3, 4]
+    assert fsd['Within 10%'].tolist() == [2, 3]
+
+    assert cutoff_curve(np.array([np.nan]), np.array([0.0]), 1, descending=False).empty
+
+
+def _curve(ppe10, hits):
+    hits = np.asarray(hits)
+    return pd.DataFrame({
+        'Cutoff': np.arange(len(hits), 0, -1, dtype='float64'),
+        'Hits': hits,
+        'Hit Rate': hits / 200,
+        'PPE10': ppe10,
+    })
+
+
+def test_recommended_cutoffs():
+    hits = [10, MIN_RECOMMENDED_HITS - 1, MIN_RECOMMENDED_HITS, 60, 100, 150, 200]
+    curve = _curve([1.0, 0.95, 0.9, 0.75, 0.72, 0.6, 0.71], hits)
+
+    # Loosest cutoff reaching the PPE10 target over enough hits: the strict
+    # cutoffs with too few hits do not count, and a looser cutoff dipping
+    # below the target (0.6) does not hide a still looser one reaching it
+    assert recommended_cutoffs(curve, target_ppe10=0.70) == {'PPE10 >= 70%': 6}
+    assert recommended_cutoffs(curve, target_ppe10=0.73) == {'PPE10 >= 73%': 3}
+    assert recommended_cutoffs(curve, target_ppe10=0.93) == {}
+
+    # Strictest cutoff reaching the hit rate target
+    assert recommended_cutoffs(curve, target_hit_rate=0.5) == {'Hit Rate >= 50%': 4}
+    assert recommended_cutoffs(curve, target_hit_rate=1.01) == {}
+
+    both = recommended_cutoffs(curve, target_ppe10=0.9, target_hit_rate=0.25)
+    assert both == {'PPE10 >= 90%': 2, 'Hit Rate >= 25%': 3}
+    assert recommended_cutoffs(curve) == {}
+
+
+def test_calibration_curves_follow_the_registry():
+    ref_ids = np.arange(1, 201)
+    benchmark_df = pd.DataFrame({'Ref ID': ref_ids, 'AppraisedValue': 100000.0})
+    vendor_df = pd.DataFrame({'Ref ID': ref_ids, 'AVM Value': 100000.0 * (1 + np.linspace(-0.3, 0.3, 200)),
+                              'Confidence Score': np.linspace(0.5, 0.99, 200), 'FSD': np.linspace(5, 25, 200)})
+    curves = calibration_curves(benchmark_df, {'iAVM': vendor_df, 'ClearAVMv3': vendor_df}, column_phrases)
+
+    # iAVM confidences are fractions (confidence_scale 100), FSDs percent
+    assert curves['iAVM']['Confidence']['Cutoff'].max() == pytest.approx(99.0)
+    assert curves['iAVM']['FSD']['Cutoff'].min() == pytest.approx(0.05)
+    assert curves['iAVM']['Confidence']['Hits'].iloc[-1] == 200
+    # ClearAVMv3 is exempt from confidence filtering, so it has no confidence curve
+    assert list(curves['ClearAVMv3']) == ['FSD']
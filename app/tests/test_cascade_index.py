@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from avm_app.avm_utils import get_avm_model_files
+from avm_app.cascade_index import DEFAULT_STATE, CascadeIndex
+
+MODEL_COLUMNS = ['Model 1', 'Model 2']
+
+
+def _legacy_models(cascade_df, state, county):
+    """The two-level resolver get_avm_model_files used before CascadeIndex."""
+    state = str(state).lower() if state else ""
+    county = str(county).lower() if county else ""
+    cascade_df = cascade_df.replace({'Clear Capital': 'ClearAVMv3'})
+    states = cascade_df['State'].fillna("").astype(str).str.lower()
+    county_rows = cascade_df[(states == state) & (cascade_df['County'].fillna("").astype(str).str.lower() == county)]
+    if not county_rows.empty:
+        return {col: county_rows.iloc[0][col] for col in MODEL_COLUMNS}
+    state_rows = cascade_df[(states == state) & cascade_df['County'].isna()]
+    if not state_rows.empty:
+        return {col: state_rows.iloc[0][col] for col in MODEL_COLUMNS}
+    return {col: None for col in MODEL_COLUMNS}
+
+
+def _resolved_models(cascade_df, benchmark_df):
+    index = CascadeIndex(cascade_df)
+    return [index.models_for_row(row) for row in index.resolve(benchmark_df)]
+
+
+def _model_1(cascade_df, benchmark_df):
+    return [models['Model 1'] for models in _resolved_models(cascade_df, benchmark_df)]
+
+
+def test_two_level_cascade_resolves_like_the_legacy_resolver():
+    cascade_df = pd.DataFrame({
+        'State': ['CA', 'CA', 'ca', 'NY', 'NY', 'TX'],
+        'County': ['Kings', np.nan, 'Kings', 'Queens', np.nan, 'Harris'],
+        'Model 1': ['VeroVALUE', 'iAVM', 'Quantarium', 'Clear Capital', 'HouseCanary', 'VeroVALUE'],
+        'Model 2': ['iAVM', np.nan, 'VeroVALUE', 'VeroVALUE', 'iAVM', 'ClearAVMv3'],
+    })
+    locations = [('CA', 'Kings'), ('ca', 'KINGS'), ('CA', 'Orange'), ('NY', 'Queens'), ('NY', 'Bronx'),
+                 ('TX', 'Harris'), ('TX', 'Travis'), ('WA', 'King'), (np.nan, np.nan)]
+    benchmark_df = pd.DataFrame(locations, columns=['State', 'County'])
+
+    expected = [_legacy_models(cascade_df, state, county) for state, county in locations]
+    resolved = _resolved_models(cascade_df, benchmark_df)
+    for location, got, want in zip(locations, resolved, expected):
+        assert {col: (None if pd.isna(model) else model) for col, model in got.items()} == \
+               {col: (None if pd.isna(model) else model) for col, model in want.items()}, location
+
+    # The per-location helper resolves through the same index
+    for (state, county), want in zip(locations, expected):
+        assert get_avm_model_files(cascade_df, state, county)['Model 1'] == want['Model 1']
+
+
+def test_levels_apply_from_zip_to_state():
+    cascade_df = pd.DataFrame({
+        'State': ['CA', 'CA', np.nan, np.nan, DEFAULT_STATE],
+        'County': [np.nan, 'Kings', np.nan, np.nan, np.nan],
+        'Zip': [np.nan, np.nan, np.nan, '90210', np.nan],
+        'CBSA': [np.nan, np.nan, '31080', np.nan, np.nan],
+        'Model 1': ['State', 'County', 'CBSA', 'Zip', 'Default'],
+        'Model 2': [np.nan] * 5,
+    })
+    benchmark_df = pd.DataFrame({
+        'State': ['CA', 'CA', 'CA', 'CA', 'CA', 'NY'],
+        'County': ['Kings', 'Kings', 'Kings', 'Kings', 'Orange', 'Queens'],
+        'Zip': ['90210', '90211', '90211', np.nan, np.nan, '90210'],
+        'CBSA': ['31080', '31080', np.nan, np.nan, np.nan, np.nan],
+    })
+    assert _model_1(cascade_df, benchmark_df) == ['Zip', 'CBSA', 'County', 'County', 'State', 'Zip']
+    assert get_avm_model_files(cascade_df, 'NY', 'Queens', zip_code='90210')['Model 1'] == 'Zip'
+    assert get_avm_model_files(cascade_df, 'CA', 'Kings', cbsa='31080')['Model 1'] == 'CBSA'
+    assert get_avm_model_files(cascade_df, 'WA', 'King')['Model 1'] == 'Default'
+
+
+@pytest.mark.parametrize('zip_code', ['2134', '02134', '02134-1234', ' 02134 ', 2134.0, 2134])
+def test_zip_codes_are_normalized(zip_code):
+    cascade_df = pd.DataFrame({'State': [np.nan], 'County': [np.nan], 'Zip': ['02134'], 'Model 1': ['VeroVALUE'], 'Model 2': [np.nan]})
+    benchmark_df = pd.DataFrame({'State': ['MA'], 'County': ['Suffolk'], 'Zip': pd.Series([zip_code], dtype=object)})
+    assert _model_1(cascade_df, benchmark_df) == ['VeroVALUE']
+
+    # Cascades read ZIPs as numbers lose leading zeros just the same
+    numeric_cascade_df = cascade_df.assign(Zip=[2134.0])
+    assert _model_1(numeric_cascade_df, benchmark_df) == ['VeroVALUE']
+
+
+def test_default_row_needs_an_explicit_star_state():
+    benchmark_df = pd.DataFrame({'State': ['CA', 'WA'], 'County': ['Kings', 'King']})
+    cascade_df = pd.DataFrame({
+        'State': ['CA', DEFAULT_STATE, DEFAULT_STATE],
+        'County': [np.nan, np.nan, np.nan],
+        'Model 1': ['State', 'Default', 'Second Default'],
+        'Model 2': [np.nan] * 3,
+    })
+    assert _model_1(cascade_df, benchmark_df) == ['State', 'Default']
+    assert _model_1(cascade_df.assign(County=[np.nan, DEFAULT_STATE, np.nan]), benchmark_df) == ['State', 'Default']
+
+    without_default = cascade_df.iloc[:1]
+    assert CascadeIndex(without_default).default_row == -1
+    assert _resolved_models(without_default, benchmark_df)[1] == {'Model 1': None, 'Model 2': None}
+
+
+def test_rows_without_a_location_never_match():
+    cascade_df = pd.DataFrame({
+        'State': [np.nan, '', 'CA'],
+        'County': [np.nan, 'Kings', 'Kings'],
+        'Model 1': ['Blank', 'County Only', 'County'],
+        'Model 2': [np.nan] * 3,
+    })
+    benchmark_df = pd.DataFrame({'State': [np.nan, 'NY', '', 'CA'], 'County': [np.nan, 'Kings', 'Kings', 'Kings']})
+    index = CascadeIndex(cascade_df)
+    assert index.resolve(benchmark_df).tolist() == [-1, -1, -1, 2]
+    assert index.default_row == -1
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from avm_app.compact import compact_float, widen_floats
+from avm_app.file_operations import write_results_to_excel
+from avm_app.simulation import results_frame
+
+DIFF_COLUMN = '% Diff between AVM and Benchmark'
+
+
+def _results():
+    benchmark_df = pd.DataFrame({'Ref ID': [1, 2, 3], 'State': ['CA', 'CA', 'NY'], 'County': ['Kings', 'Kings', 'Queens']})
+    return results_frame(benchmark_df, np.array([500000.0, 250000.0, 100000.0]), np.array([538390.0, np.nan, 100000.0]),
+                         np.array([85.0, np.nan, 90.0]), np.array([0.05, np.nan, 0.1]),
+                         np.array([0, -1, 0], dtype=np.int16), np.array([0, -1, 0], dtype=np.int8), ['VeroVALUE'], ['Model 1'])
+
+
+def test_compact_float_narrows_only_exact_values():
+    assert compact_float(pd.Series([85.0, 90.0, np.nan])).dtype == np.float32
+    assert compact_float(pd.Series([0.05, 0.1])).dtype == np.float64
+    assert compact_float(pd.Series(['12', 'n/a'])).isna().tolist() == [False, True]
+
+
+def test_widen_floats_writes_float32_as_its_shortest_decimal():
+    results_df = _results()
+    assert results_df[DIFF_COLUMN].dtype == np.float32
+    widened = widen_floats(results_df)
+    assert widened[DIFF_COLUMN].dtype == np.float64
+    assert widened[DIFF_COLUMN].iloc[0] == 0.07678
+    assert np.isnan(widened[DIFF_COLUMN].iloc[1]) and widened[DIFF_COLUMN].iloc[2] == 0.0
+    assert results_df[DIFF_COLUMN].dtype == np.float32
+    assert json.loads(widened.to_json(orient='records'))[0][DIFF_COLUMN] == 0.07678
+
+    plain = pd.DataFrame({'x': [0.1]})
+    assert widen_floats(plain) is plain
+
+
+def test_original_data_sheet_holds_widened_diffs(tmp_path):
+    output_file = tmp_path / 'results.xlsx'
+    write_results_to_excel(_results(), str(output_file), {'VeroVALUE': 80.0}, {'VeroVALUE': 0.2})
+    sheet = load_workbook(output_file, read_only=True)['Original Data']
+    header = [cell.value for cell in next(sheet.iter_rows(max_row=1))]
+    first_row = [cell.value for cell in next(sheet.iter_rows(min_row=2, max_row=2))]
+    assert first_row[header.index(DIFF_COLUMN)] == 0.07678
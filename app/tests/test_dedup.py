@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from avm_app.data_processing import column_phrases, resolve_model_columns
+from avm_app.dedup import dedup_benchmark, dedup_sort_key, dedup_vendor_frame
+from avm_app.vendor_registry import VENDORS, VendorRule
+
+# (Ref ID, Confidence Score, FSD, Valuation Date) in file order. Ref 1 has a
+# different winner under every rule, Ref 3 has a row with nothing to rank on,
+# Ref 4 ties under every rule, Ref 5 gives one FSD in percent, and the
+# non-numeric / missing Ref IDs repeat but are never collapsed.
+ROWS = [
+    (1, 80, 0.10, '2023-01-01'),
+    (2, 90, 0.05, '2023-01-01'),
+    (1, 95, 0.12, '2023-02-01'),
+    (1, 70, 0.03, '2023-03-01'),
+    (3, np.nan, np.nan, None),
+    ('abc', 90, 0.05, '2023-01-01'),
+    (1, 75, 0.09, '2024-01-01'),
+    (3, 60, 0.20, '2022-01-01'),
+    ('abc', 90, 0.05, '2023-01-01'),
+    (4, 85, 0.07, '2023-05-01'),
+    (4, 85, 0.07, '2023-05-01'),
+    (None, 85, 0.07, '2023-05-01'),
+    (None, 85, 0.07, '2023-05-01'),
+    (5, 88, 0.10, '2023-06-01'),
+    (5, 88, 8, '2023-06-01'),
+]
+
+# Row positions surviving each rule
+EXPECTED_ROWS = {
+    'first': [0, 1, 4, 5, 8, 9, 11, 12, 13],
+    'highest_confidence': [1, 2, 5, 7, 8, 9, 11, 12, 13],
+    'lowest_fsd': [1, 3, 5, 7, 8, 9, 11, 12, 14],
+    'latest': [1, 5, 6, 7, 8, 9, 11, 12, 13],
+}
+
+
+def _vendor_frame():
+    frame = pd.DataFrame(ROWS, columns=['Ref ID', 'Confidence Score', 'FSD', 'Valuation Date'])
+    frame.insert(1, 'AVM Value', 100000.0 + 1000 * np.arange(len(frame)))
+    return frame
+
+
+@pytest.fixture
+def register_rule(monkeypatch):
+    def register(dedup, **spec):
+        name = f'Dedup {dedup}'
+        monkeypatch.setitem(VENDORS.rules, name, VendorRule(name, dict(spec, dedup=dedup)))
+        return name
+    return register
+
+
+@pytest.mark.parametrize('dedup', list(EXPECTED_ROWS))
+def test_each_rule_keeps_its_row_in_file_order(register_rule, dedup):
+    model = register_rule(dedup)
+    frame = _vendor_frame()
+    deduplicated, collapsed = dedup_vendor_frame(frame, model, column_phrases)
+    assert deduplicated.index.tolist() == EXPECTED_ROWS[dedup]
+    assert collapsed == len(frame) - len(EXPECTED_ROWS[dedup]) == 6
+
+
+def test_sort_keys_rank_nan_last(register_rule):
+    frame = _vendor_frame()
+    resolved = resolve_model_columns(None, frame.columns, column_phrases)
+    assert dedup_sort_key(register_rule('first'), frame, resolved) is None
+
+    confidence_key = dedup_sort_key(register_rule('highest_confidence'), frame, resolved)
+    assert confidence_key[2] < confidence_key[0] and np.isnan(confidence_key[4])
+    fsd_key = dedup_sort_key(register_rule('lowest_fsd'), frame, resolved)
+    assert fsd_key[14] == pytest.approx(0.08) and np.isnan(fsd_key[4])
+    date_key = dedup_sort_key(register_rule('latest'), frame, resolved)
+    assert date_key[6] < date_key[0] and np.isnan(date_key[4])
+
+
+def test_registry_date_column_and_missing_rule_columns(register_rule):
+    frame = _vendor_frame().rename(columns={'Valuation Date': 'Run Stamp'})
+    # Without a recognizable date column 'latest' falls back to file order
+    assert dedup_vendor_frame(frame, register_rule('latest'), column_phrases)[0].index.tolist() == EXPECTED_ROWS['first']
+    named = register_rule('latest', date_column='Run Stamp')
+    assert dedup_vendor_frame(frame, named, column_phrases)[0].index.tolist() == EXPECTED_ROWS['latest']
+
+    without_confidence = _vendor_frame().drop(columns='Confidence Score')
+    deduplicated, _ = dedup_vendor_frame(without_confidence, register_rule('highest_confidence'), column_phrases)
+    assert deduplicated.index.tolist() == EXPECTED_ROWS['first']
+
+
+def test_frames_without_duplicates_or_ref_ids_are_returned_as_is(register_rule):
+    frame = _vendor_frame().drop_duplicates('Ref ID').dropna(subset=['Ref ID'])
+    deduplicated, collapsed = dedup_vendor_frame(frame, register_rule('latest'), column_phrases)
+    assert deduplicated is frame and collapsed == 0
+    # Without any column resolving to a Ref ID (note 'Confidence' would)
+    unkeyed = pd.DataFrame({'AVM Value': [1.0, 1.0], 'FSD': [0.1, 0.1]})
+    deduplicated, collapsed = dedup_vendor_frame(unkeyed, register_rule('first'), column_phrases)
+    assert deduplicated is unkeyed and collapsed == 0
+
+
+def test_dedup_benchmark_keeps_first_row_per_ref_id():
+    benchmark_df = pd.DataFrame({'Ref ID': pd.array([1, 2, 1, None, None], dtype='Int64'), 'AppraisedValue': [1, 2, 3, 4, 5]})
+    deduplicated, collapsed = dedup_benchmark(benchmark_df)
+    assert deduplicated['AppraisedValue'].tolist() == [1, 2, 4, 5]
+    assert collapsed == 1
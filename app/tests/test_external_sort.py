@@ -0,0 +1,66 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import avm_app.external_sort as external_sort
+from avm_app.combine_files import combine_files
+
+
+def _write_inputs(folder, file_count=5, row_count=10000, seed=1):
+    """CSV inputs with duplicate, non-numeric and missing-column Ref IDs; returns them concatenated."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for number in range(1, file_count + 1):
+        df = pd.DataFrame({
+            'Ref ID': rng.integers(0, 2 * row_count, row_count).astype(str),
+            'Value': rng.integers(1, 10 ** 6, row_count).astype(str),
+            'Note': f'x{number}',
+        })
+        unkeyed = rng.random(row_count) < 0.1
+        df.loc[unkeyed, 'Ref ID'] = [f'abc{i}' for i in range(unkeyed.sum())]
+        if number == 3:
+            df['Extra'] = 'e'
+        if number == 2:
+            with gzip.open(folder / f'file{number}.csv.gz', 'wt', newline='') as f:
+                df.to_csv(f, index=False)
+        else:
+            df.to_csv(folder / f'file{number}.csv', index=False)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True).fillna('')
+
+
+def _expected(combined, keep):
+    """In-memory reference: numeric Ref IDs sorted and deduplicated, then the others in input order."""
+    keys = np.trunc(pd.to_numeric(combined['Ref ID'], errors='coerce'))
+    numeric = combined[keys.notna()].assign(key=keys[keys.notna()]).sort_values('key', kind='stable')
+    numeric = numeric[~numeric['key'].duplicated(keep=keep)].drop(columns='key')
+    return pd.concat([numeric, combined[keys.isna()]], ignore_index=True)
+
+
+@pytest.mark.parametrize('keep, fanin', [('first', 64), ('last', 64), ('first', 2), ('last', 3)])
+def test_sorted_combine_matches_in_memory_sort(tmp_path, monkeypatch, keep, fanin):
+    input_folder = tmp_path / 'in'
+    input_folder.mkdir()
+    combined = _write_inputs(input_folder)
+    monkeypatch.setattr(external_sort, 'MAX_MERGE_FANIN', fanin)
+
+    merged_run_counts = []
+    original_merge_runs = external_sort._merge_runs
+
+    def merge_runs(run_paths, *args, **kwargs):
+        merged_run_counts.append(len(run_paths))
+        return original_merge_runs(run_paths, *args, **kwargs)
+
+    monkeypatch.setattr(external_sort, '_merge_runs', merge_runs)
+
+    combine_files(str(input_folder), 1, 5, str(tmp_path / 'out'), sort_by_ref_id=True, memory_limit_mb=1, keep=keep)
+    output = pd.read_csv(tmp_path / 'out' / 'in_1-5.csv', dtype=str, keep_default_na=False)
+
+    # The 1 MB budget forces several runs; a small fan-in merges them in passes
+    assert sum(merged_run_counts) > 2
+    if fanin < 10:
+        assert len(merged_run_counts) > 1
+    expected = _expected(combined, keep)[output.columns]
+    pd.testing.assert_frame_equal(output, expected)
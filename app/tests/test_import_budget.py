@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLOTTING_AND_EXCEL = ['matplotlib', 'seaborn', 'openpyxl', 'scipy']
+DATA_LIBRARIES = ['pandas', 'numpy']
+
+# Seconds an import may take in a fresh interpreter. Generous against the
+# ~0.05s (GUI) and ~0.5s (engine with pandas) measured locally, but far below
+# the seconds the eager plotting / Excel imports used to cost.
+LIGHT_IMPORT_BUDGET = 1.0
+ENGINE_IMPORT_BUDGET = 3.0
+
+# (statement, modules that must not be loaded by it, time budget)
+IMPORT_BUDGETS = [
+    ('import avm_app', DATA_LIBRARIES + PLOTTING_AND_EXCEL, LIGHT_IMPORT_BUDGET),
+    ('import main', DATA_LIBRARIES + PLOTTING_AND_EXCEL, LIGHT_IMPORT_BUDGET),
+    ('import avm_app.gui', DATA_LIBRARIES + PLOTTING_AND_EXCEL, LIGHT_IMPORT_BUDGET),
+    ('import avm_app.profiles', DATA_LIBRARIES + PLOTTING_AND_EXCEL, LIGHT_IMPORT_BUDGET),
+    ('import avm_app.file_operations', PLOTTING_AND_EXCEL, ENGINE_IMPORT_BUDGET),
+    ('import avm_app.combine_files', PLOTTING_AND_EXCEL, ENGINE_IMPORT_BUDGET),
+    ('import avm_app.simulation', PLOTTING_AND_EXCEL, ENGINE_IMPORT_BUDGET),
+    ('import avm_app.scheduler', PLOTTING_AND_EXCEL, ENGINE_IMPORT_BUDGET),
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+"""
+
+
+def _probe_import(statement):
+    """Runs statement in a fresh interpreter; returns (seconds, top-level modules loaded)."""
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(statement=statement)], cwd=APP_DIRECTORY,
+                            capture_output=True, text=True, check=True).stdout
+    probe = json.loads(output.strip().splitlines()[-1])
+    return probe['elapsed'], set(probe['modules'])
+
+
+@pytest.mark.parametrize('statement, forbidden, budget', IMPORT_BUDGETS, ids=[statement for statement, _, _ in IMPORT_BUDGETS])
+def test_import_stays_within_budget(statement, forbidden, budget):
+    elapsed, modules = _probe_import(statement)
+    assert not modules & set(forbidden), f"{statement!r} loads {sorted(modules & set(forbidden))}"
+    assert elapsed < budget, f"{statement!r} took {elapsed:.2f}s (budget {budget}s)"
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from avm_app.cascade_index import CascadeIndex
+from avm_app.data_processing import column_phrases, find_avm_score_parallel
+from avm_app.simulation import process_benchmark
+
+# iAVM reports confidence as a fraction (confidence_scale 100) and ClearAVMv3
+# is exempt from the confidence filter; VeroVALUE FSDs are given in percent
+MIN_CONF_SCORES = {'VeroVALUE': 80.0, 'iAVM': 75.0, 'ClearAVMv3': 90.0}
+MAX_FSD_VALUES = {'VeroVALUE': 0.12, 'iAVM': 0.15, 'ClearAVMv3': 0.1}
+
+
+def _inputs(row_count=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    ref_ids = np.arange(5000, 5000 + row_count)
+    benchmark_df = pd.DataFrame({
+        'Ref ID': ref_ids,
+        'State': rng.choice(['CA', 'NY'], row_count),
+        'County': rng.choice(['Kings', 'Orange'], row_count),
+        'AppraisedValue': rng.uniform(1e5, 1e6, row_count).round(2),
+    })
+    cascade_df = pd.DataFrame({
+        'State': ['CA', 'NY'],
+        'County': [np.nan, np.nan],
+        'Model 1': ['VeroVALUE', 'iAVM'],
+        'Model 2': ['iAVM', 'ClearAVMv3'],
+        'Model 3': ['ClearAVMv3', 'VeroVALUE'],
+    })
+
+    def vendor(conf_scale, fsd_scale):
+        covered = rng.random(row_count) < 0.8
+        return pd.DataFrame({
+            'Ref ID': ref_ids[covered],
+            'AVM Value': rng.uniform(1e5, 1e6, covered.sum()).round(),
+            'Confidence Score': rng.uniform(50, 100, covered.sum()).round() * conf_scale,
+            'FSD': rng.uniform(0.02, 0.25, covered.sum()).round(3) * fsd_scale,
+        })
+
+    model_file_data = {'VeroVALUE': vendor(1, 100), 'iAVM': vendor(0.01, 1), 'ClearAVMv3': vendor(1, 1)}
+    return benchmark_df, cascade_df, model_file_data
+
+
+def test_batch_matching_applies_registry_rules_like_the_row_matcher():
+    benchmark_df, cascade_df, model_file_data = _inputs()
+    results_df = process_benchmark(benchmark_df, cascade_df, model_file_data, column_phrases,
+                                   MIN_CONF_SCORES, MAX_FSD_VALUES, max_workers=2)
+
+    cascade_index = CascadeIndex(cascade_df)
+    rows = cascade_index.resolve(benchmark_df)
+    expected = [find_avm_score_parallel(cascade_index.models_for_row(row), ref_id, model_file_data, column_phrases,
+                                        MIN_CONF_SCORES, MAX_FSD_VALUES)
+                for row, ref_id in zip(rows, benchmark_df['Ref ID'])]
+    expected_df = pd.DataFrame(expected, columns=['AVM Value', 'AVM Conf Score', 'FSD Value', 'Model Position', 'AVM Name'])
+
+    assert results_df['AVM Value'].notna().sum() > 1000
+    assert set(results_df['AVM Name'].dropna()) == {'VeroVALUE', 'iAVM', 'ClearAVMv3'}
+    for col in expected_df.columns:
+        np.testing.assert_array_equal(results_df[col].astype(object).isna(), expected_df[col].isna(), err_msg=col)
+    for col in ['AVM Value', 'AVM Conf Score', 'FSD Value']:
+        np.testing.assert_allclose(results_df[col].astype('float64'), expected_df[col].astype('float64'), rtol=1e-6, err_msg=col)
+    for col in ['Model Position', 'AVM Name']:
+        matched = expected_df[col].notna()
+        assert (results_df[col].astype(object)[matched] == expected_df[col][matched]).all(), col
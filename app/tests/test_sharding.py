@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from avm_app.avm_utils import read_benchmark_file, read_cascade_file
+from avm_app.data_processing import column_phrases
+from avm_app.file_operations import read_files_once, summary_tables
+from avm_app.sharding import run_sharded
+from avm_app.simulation import process_benchmark
+from avm_app.vendor_store import SharedVendorStore
+
+MIN_CONF_SCORES = {'VeroVALUE': 80.0, 'ClearAVMv3': 0.0}
+MAX_FSD_VALUES = {'VeroVALUE': 1.0, 'ClearAVMv3': 0.13}
+RELATIVE_ACCURACY = 0.005
+
+LOCATIONS = [('CA', 'Los Angeles'), ('NY', 'Queens'), ('TX', 'Harris')]
+
+
+def _write_inputs(folder, row_count=600, seed=7):
+    rng = np.random.default_rng(seed)
+    ref_ids = np.arange(1000, 1000 + row_count)
+    values = rng.uniform(1e5, 1e6, row_count).round(2)
+    locations = rng.integers(0, len(LOCATIONS), row_count)
+    pd.DataFrame({
+        'Ref ID': ref_ids,
+        'State': [LOCATIONS[i][0] for i in locations],
+        'County': [LOCATIONS[i][1] for i in locations],
+        'FormName': '1004_05',
+        'AppraisedValue': values,
+    }).to_csv(folder / 'bench.csv', index=False)
+
+    pd.DataFrame([
+        ['CA', 'Los Angeles', 'VeroVALUE', 'ClearAVMv3'],
+        ['NY', 'Queens', 'ClearAVMv3', 'VeroVALUE'],
+        ['TX', 'Harris', 'VeroVALUE', ''],
+    ], columns=['State', 'County', 'Model 1', 'Model 2']).to_csv(folder / 'cascade.csv', index=False)
+
+    avm_folder = folder / 'avm'
+    avm_folder.mkdir()
+    for file_name, value_column, conf_column in [('VeroValue_x.csv', 'AVM Value', 'Confidence Score'),
+                                                 ('ClearAVMv3_x.csv', 'AVM_VALUE', None)]:
+        covered = rng.random(row_count) < 0.7
+        vendor_df = pd.DataFrame({
+            'Ref ID': ref_ids[covered],
+            value_column: (values[covered] * rng.normal(1, 0.1, covered.sum())).round(),
+        })
+        if conf_column:
+            vendor_df[conf_column] = rng.integers(60, 100, covered.sum())
+        vendor_df['FSD'] = rng.uniform(0.02, 0.2, covered.sum()).round(3)
+        vendor_df.to_csv(avm_folder / file_name, index=False)
+    return folder / 'bench.csv', folder / 'cascade.csv', avm_folder
+
+
+@pytest.fixture
+def simulation_inputs(tmp_path):
+    benchmark_file, cascade_file, avm_folder = _write_inputs(tmp_path)
+    benchmark_df = read_benchmark_file(benchmark_file, {'1004_05'})
+    cascade_df = read_cascade_file(cascade_file)
+    model_file_data = read_files_once(['VeroVALUE', 'ClearAVMv3'], str(avm_folder))
+    return benchmark_df, cascade_df, model_file_data
+
+
+def _tables(tables):
+    return {sheet_name: df for sheet_name, df, _, _ in tables}
+
+
+def _lower_median(values):
+    values = np.asarray(values, dtype='float64')
+    return np.quantile(values[~np.isnan(values)], 0.5, method='lower')
+
+
+def _assert_sketch_median(estimate, values):
+    # The sketch returns a value within RELATIVE_ACCURACY of the element at
+    # rank floor(0.5 * (count - 1)), i.e. the lower median
+    expected = _lower_median(values)
+    assert abs(estimate - expected) <= RELATIVE_ACCURACY * abs(expected) + 1e-9
+
+
+def test_sharded_aggregates_match_unsharded_run(simulation_inputs):
+    benchmark_df, cascade_df, model_file_data = simulation_inputs
+    results_df = process_benchmark(benchmark_df, cascade_df, model_file_data, column_phrases,
+                                   MIN_CONF_SCORES, MAX_FSD_VALUES, max_workers=2)
+    assert results_df['AVM Value'].notna().sum() > 100
+
+    with SharedVendorStore.create(model_file_data, column_phrases) as store:
+        aggregates = run_sharded(benchmark_df, cascade_df, store, MIN_CONF_SCORES, MAX_FSD_VALUES,
+                                 shard_count=3, max_workers=2)
+
+    expected = _tables(summary_tables(results_df, MIN_CONF_SCORES, MAX_FSD_VALUES))
+    merged = _tables(aggregates.summary_tables(MIN_CONF_SCORES, MAX_FSD_VALUES))
+    assert list(merged) == list(expected)
+
+    # Counts and rates are exact
+    for sheet_name in ['Model Usage', 'Model Name Counts', 'PPE10 Stats', 'PPE10 by County', 'PPE10 by State', 'PPE10 by Model']:
+        pd.testing.assert_frame_equal(merged[sheet_name], expected[sheet_name], check_dtype=False, check_index_type=False,
+                                      check_categorical=False)
+    location_counts = ['State', 'County', 'Total Number of Records', 'Hits', 'Hit Rate']
+    pd.testing.assert_frame_equal(merged['Statistics by Location'][location_counts], expected['Statistics by Location'][location_counts],
+                                  check_dtype=False, check_categorical=False)
+
+    # The summary sheets round errors to three decimals, so the statistics
+    # themselves are compared against the per-row results: counts, minima
+    # and maxima exactly, means and standard deviations up to summation
+    # order, medians within the quantile sketch's relative accuracy
+    diff = results_df['% Diff between AVM and Benchmark'].astype('float64')
+    hits = results_df['AVM Value'].notna()
+    checks = [
+        (aggregates.position_error, diff.groupby(results_df['Model Position'], observed=True)),
+        (aggregates.overall_error, diff.groupby(pd.Series('Overall', index=diff.index))),
+        (aggregates.location_error, diff[hits].groupby([results_df['State'][hits], results_df['County'][hits]], observed=True)),
+    ]
+    for stats, grouped in checks:
+        result = stats.result()
+        assert len(result) == grouped.ngroups
+        for key, values in grouped:
+            row = result.loc[key]
+            assert row['count'] == values.count()
+            assert row['min'] == values.min()
+            assert row['max'] == values.max()
+            assert row['mean'] == pytest.approx(values.mean(), rel=1e-9, abs=1e-12)
+            assert row['std'] == pytest.approx(values.std(), rel=1e-9, abs=1e-12)
+            _assert_sketch_median(row['median'], values)
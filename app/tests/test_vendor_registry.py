@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from avm_app.avm_utils import find_vendor_file, get_keyword_from_model
+from avm_app.combine_files import read_file
+from avm_app.data_processing import column_phrases
+from avm_app.file_operations import read_files_once
+from avm_app.sqlite_store import SqliteVendorStore
+from avm_app.vendor_registry import VENDORS, VendorRegistry, VendorRule, csv_read_options
+
+FREDDIE_HVE = 'Freddie Mac Home Value Explorer'
+PREAMBLE_LINES = 26
+
+
+def _vendor_frame(row_count=100):
+    return pd.DataFrame({
+        'Ref ID': np.arange(100000, 100000 + row_count),
+        'AVM Value': 250000.0,
+        'FSD': 0.05,
+    })
+
+
+def _write_with_preamble(path, frame, header='RefNum,Point Value,Confidence'):
+    preamble = ''.join(f'Freddie Mac export line {i}\n' for i in range(PREAMBLE_LINES))
+    body = frame.rename(columns={'Ref ID': 'RefNum', 'AVM Value': 'Point Value', 'FSD': 'Confidence'}).to_csv(index=False)
+    assert body.startswith(header)
+    path.write_text(preamble + body)
+
+
+def test_plain_hve_file_in_avm_folder_is_read_whole(tmp_path):
+    # 'HVE' finds the Freddie vendor's file, whose first line is already the header
+    _vendor_frame().to_csv(tmp_path / 'HVE_2024.csv', index=False)
+    model_df = read_files_once([FREDDIE_HVE], str(tmp_path))[FREDDIE_HVE]
+    assert len(model_df) == 100
+    assert model_df['Ref ID'].iloc[0] == 100000
+
+
+def test_plain_hve_file_in_sqlite_store_is_read_whole(tmp_path):
+    avm_folder = tmp_path / 'avm'
+    avm_folder.mkdir()
+    _vendor_frame().to_csv(avm_folder / 'HVE_2024.csv', index=False)
+    store = SqliteVendorStore.build(str(tmp_path / 'vendors.sqlite'), [FREDDIE_HVE], str(avm_folder), column_phrases)
+    try:
+        found, avm, _, _ = store.lookup(FREDDIE_HVE, np.array([100000, 100099, 5]))
+    finally:
+        store.close()
+    assert found.tolist() == [True, True, False]
+    assert avm[:2].tolist() == [250000.0, 250000.0]
+
+
+def test_freddie_preamble_is_skipped(tmp_path):
+    _write_with_preamble(tmp_path / 'Freddie_2024.csv', _vendor_frame())
+    model_df = read_files_once([FREDDIE_HVE], str(tmp_path))[FREDDIE_HVE]
+    assert len(model_df) == 100
+
+
+def test_rule_for_file_uses_file_patterns_only():
+    assert VENDORS.rule_for_file('Freddie_2024.csv').name == FREDDIE_HVE
+    assert VENDORS.rule_for_file('exports/Freddie_2024.csv.gz').name == FREDDIE_HVE
+    # 'HVE' is a lookup keyword, not a file pattern; patterns are case-sensitive
+    assert VENDORS.rule_for_file('HVE_2024.csv') is None
+    assert VENDORS.rule_for_file('freddie_2024.csv') is None
+    assert VENDORS.rule_for_file('VeroValue_2024.csv') is None
+
+
+def test_csv_options(tmp_path):
+    rule = VENDORS.rule(FREDDIE_HVE)
+    _write_with_preamble(tmp_path / 'preamble.csv', _vendor_frame())
+    assert rule.csv_options(tmp_path / 'preamble.csv') == {'skiprows': PREAMBLE_LINES}
+
+    (tmp_path / 'header_first.csv').write_text('RefNum,Point Value\n1,2\n')
+    assert rule.csv_options(tmp_path / 'header_first.csv') == {}
+
+    (tmp_path / 'short.csv').write_text('Ref ID,AVM Value\n1,2\n')
+    assert rule.csv_options(tmp_path / 'short.csv') == {}
+
+    (tmp_path / 'pipes.csv').write_text('Ref ID|AVM Value\n1|2\n')
+    assert rule.csv_options(tmp_path / 'pipes.csv') == {'delimiter': '|'}
+    assert VENDORS.rule('VeroVALUE').csv_options(tmp_path / 'pipes.csv') == {'delimiter': '|'}
+    assert csv_read_options(tmp_path / 'pipes.csv') == {'delimiter': '|'}
+
+    delimited = VendorRule('Tabbed', {'delimiter': '\t'})
+    assert delimited.csv_options(tmp_path / 'pipes.csv') == {'delimiter': '\t'}
+
+
+def test_combine_files_reads_hve_files_whole(tmp_path):
+    _vendor_frame().to_csv(tmp_path / 'HVE_2024.csv', index=False)
+    _write_with_preamble(tmp_path / 'Freddie_2024.csv', _vendor_frame())
+    assert len(read_file(str(tmp_path / 'HVE_2024.csv'))) == 100
+    freddie_df = read_file(str(tmp_path / 'Freddie_2024.csv'))
+    assert len(freddie_df) == 100
+    assert list(freddie_df.columns) == ['RefNum', 'Point Value', 'Confidence']
+
+
+def test_aliases_and_keywords():
+    cascade_df = pd.DataFrame({'State': ['CA'], 'Model 1': ['Clear Capital'], 'Model 2': ['VeroVALUE']})
+    assert VENDORS.canonical_names(cascade_df).iloc[0].tolist() == ['CA', 'ClearAVMv3', 'VeroVALUE']
+    assert VENDORS.rule(FREDDIE_HVE).keywords == ['HVE', 'Freddie']
+    assert get_keyword_from_model('Quantarium') == 'QM1'
+    assert get_keyword_from_model(np.nan) is None
+
+
+def test_find_vendor_file_tries_keywords_in_order(tmp_path):
+    (tmp_path / 'freddie_export.csv').write_text('Ref ID\n1\n')
+    assert find_vendor_file(str(tmp_path), FREDDIE_HVE) == 'freddie_export.csv'
+    (tmp_path / 'hve_2024.csv').write_text('Ref ID\n1\n')
+    assert find_vendor_file(str(tmp_path), FREDDIE_HVE) == 'hve_2024.csv'
+    assert find_vendor_file(str(tmp_path), 'VeroVALUE') is None
+
+
+def test_unknown_models_get_an_uncached_default_rule():
+    registered = set(VENDORS.rules)
+    rule = VENDORS.rule('Some New AVM')
+    assert rule.keywords == ['Some New AVM']
+    assert not rule.has_read_options and rule.filters_confidence and rule.filters_fsd
+    assert VENDORS.rule('Some New AVM') is rule
+    assert set(VENDORS.rules) == registered
+    assert VENDORS.rule(None).name == 'default'
+
+
+def test_invalid_vendor_specs_are_rejected():
+    with pytest.raises(ValueError):
+        VendorRegistry({'Bad': {'columns': {'Price': 'x'}}})
+    with pytest.raises(ValueError):
+        VendorRegistry({'Bad': {'fsd_unit': 'basis points'}})
+    with pytest.raises(ValueError):
+        VendorRegistry({'Bad': {'dedup': 'random'}})
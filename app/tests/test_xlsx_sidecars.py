@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import avm_app.xlsx_reader as xlsx_reader
+from avm_app.file_operations import read_files_once
+from avm_app.scheduler import run_job_spec
+from avm_app.xlsx_reader import read_xlsx, sidecar_path
+
+PROFILES = {'profiles': {'Default': {'min_conf_scores': {'VeroVALUE': 0.0}, 'desired_forms': ['1004_05'],
+                                     'max_fsd_values': {'VeroVALUE': 1.0}}}}
+
+
+def _write_vendor_workbook(path, value, row_count=50):
+    pd.DataFrame({
+        'Ref ID': np.arange(1, row_count + 1),
+        'AVM Value': value + 1000.0 * np.arange(row_count),
+        'Confidence Score': 90,
+        'Notes': 'x',
+    }).to_excel(path, index=False)
+
+
+def _forbid_workbook_reads(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the workbook was parsed although its sidecar is current")
+
+    monkeypatch.setattr(xlsx_reader, 'iter_xlsx_chunks', fail)
+
+
+def test_sidecar_round_trip_and_invalidation(tmp_path, monkeypatch):
+    workbook = tmp_path / 'VeroValue_2024.xlsx'
+    _write_vendor_workbook(workbook, 250000.5)
+
+    first = read_xlsx(str(workbook), sidecar=True)
+    assert os.path.exists(sidecar_path(str(workbook)))
+    assert list(first.columns) == ['Ref ID', 'AVM Value', 'Confidence Score', 'Notes']
+
+    with monkeypatch.context() as patch:
+        _forbid_workbook_reads(patch)
+        again = read_xlsx(str(workbook), sidecar=True)
+        columns = read_xlsx(str(workbook), sidecar=True, columns=lambda header: header[:2])
+    pd.testing.assert_frame_equal(again, first, check_dtype=False)
+    assert list(columns.columns) == ['Ref ID', 'AVM Value']
+
+    # A workbook saved after its sidecar is parsed again and replaces it
+    _write_vendor_workbook(workbook, 300000.0)
+    sidecar_mtime = os.path.getmtime(sidecar_path(str(workbook)))
+    os.utime(workbook, (sidecar_mtime + 10, sidecar_mtime + 10))
+    updated = read_xlsx(str(workbook), sidecar=True)
+    assert updated['AVM Value'].iloc[0] == 300000.0
+    assert os.path.getmtime(sidecar_path(str(workbook))) >= sidecar_mtime
+    assert not [name for name in os.listdir(tmp_path / xlsx_reader.SIDECAR_DIRECTORY) if name.endswith('.tmp')]
+
+
+def test_read_files_once_uses_sidecars_only_when_asked(tmp_path, monkeypatch):
+    _write_vendor_workbook(tmp_path / 'VeroValue_2024.xlsx', 250000.0)
+
+    read_files_once(['VeroVALUE'], str(tmp_path))
+    assert not os.path.exists(tmp_path / xlsx_reader.SIDECAR_DIRECTORY)
+
+    loaded = read_files_once(['VeroVALUE'], str(tmp_path), xlsx_sidecars=True)['VeroVALUE']
+    _forbid_workbook_reads(monkeypatch)
+    cached = read_files_once(['VeroVALUE'], str(tmp_path), xlsx_sidecars=True)['VeroVALUE']
+    assert list(cached.columns) == ['Ref ID', 'AVM Value', 'Confidence Score']
+    pd.testing.assert_frame_equal(cached, loaded)
+
+
+@pytest.mark.parametrize('xlsx_sidecars', [False, True])
+def test_job_spec_xlsx_sidecars(tmp_path, xlsx_sidecars):
+    avm_folder = tmp_path / 'avm'
+    avm_folder.mkdir()
+    _write_vendor_workbook(avm_folder / 'VeroValue_2024.xlsx', 250000.0)
+    pd.DataFrame({'Ref ID': np.arange(1, 31), 'State': 'CA', 'County': 'Kings', 'FormName': '1004_05',
+                  'AppraisedValue': 240000.0}).to_csv(tmp_path / 'bench.csv', index=False)
+    pd.DataFrame({'State': ['CA'], 'County': [np.nan], 'Model 1': ['VeroVALUE']}).to_csv(tmp_path / 'cascade.csv', index=False)
+
+    spec = {'benchmark_files': [str(tmp_path / 'bench.csv')], 'avm_folders': [str(avm_folder)],
+            'cascade_files': [str(tmp_path / 'cascade.csv')], 'output_directory': str(tmp_path / 'out'),
+            'xlsx_sidecars': xlsx_sidecars}
+    outcomes = run_job_spec(spec, PROFILES)
+    assert [outcome['status'] for outcome in outcomes] == ['done']
+    assert os.path.exists(sidecar_path(str(avm_folder / 'VeroValue_2024.xlsx'))) == xlsx_sidecars